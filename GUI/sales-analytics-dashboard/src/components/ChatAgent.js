@@ -3,6 +3,45 @@ import React, { useState, useEffect, useRef } from 'react';
 
 // IMPORTANT: Replace with your actual Agent Engine (Cloud Run) API Endpoint
 const AGENT_API_ENDPOINT = "http://localhost:8000/query";
+// Streams the answer as server-sent events while the agent is still working
+const AGENT_STREAM_ENDPOINT = `${AGENT_API_ENDPOINT}/stream`;
+
+// Reads server-sent events from a fetch response and calls onEvent(event, data) for each one
+const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+};
+
+// Identifies this browser to the backend so it keeps its own agent session
+const getUserId = () => {
+    let userId = window.localStorage.getItem('agentUserId');
+    if (!userId) {
+        userId = `web-${window.crypto.randomUUID()}`;
+        window.localStorage.setItem('agentUserId', userId);
+    }
+    return userId;
+};
 
 const ChatAgent = () => {
     const [messages, setMessages] = useState([]);
@@ -37,28 +76,52 @@ const ChatAgent = () => {
             return;
         }
 
+        // Replaces the text of the agent message currently being streamed
+        const updateStreamingMessage = (text) => {
+            setMessages((prev) => {
+                const last = prev[prev.length - 1];
+                if (last && last.sender === 'agent' && last.streaming) {
+                    return [...prev.slice(0, -1), { ...last, text }];
+                }
+                return [...prev, { sender: 'agent', text, streaming: true }];
+            });
+        };
+
         try {
-            const response = await fetch(AGENT_API_ENDPOINT, {
+            const response = await fetch(AGENT_STREAM_ENDPOINT, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'accept': 'application/json'
+                    'accept': 'text/event-stream'
                 },
-                body: JSON.stringify({ question: inputMessage }),
+                body: JSON.stringify({ question: inputMessage, user_id: getUserId() }),
             });
 
             if (!response.ok) {
                 const errorData = await response.json();
-                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+                throw new Error(errorData.detail || errorData.error || `HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
-            // Assuming your agent returns a JSON with an "answer" field
-            setMessages((prev) => [...prev, { sender: 'agent', text: data.answer || "No specific answer received, check agent logs." }]);
+            let answer = '';
+            await readEventStream(response, (event, data) => {
+                if (event === 'error') {
+                    throw new Error(data.detail || 'The agent stream failed.');
+                }
+                if (event === 'message' && data.text) {
+                    answer += data.text;
+                    updateStreamingMessage(answer);
+                }
+            });
+
+            if (!answer) {
+                updateStreamingMessage("No specific answer received, check agent logs.");
+            }
         } catch (error) {
             console.error("Error communicating with agent:", error);
             setMessages((prev) => [...prev, { sender: 'agent', text: `Sorry, there was an error: ${error.message}. Please check console for details.` }]);
         } finally {
+            // Mark the streamed message as complete so the next answer starts a new one
+            setMessages((prev) => prev.map((msg) => (msg.streaming ? { ...msg, streaming: false } : msg)));
             setIsLoading(false);
         }
     };
@@ -78,7 +141,8 @@ const ChatAgent = () => {
                         </div>
                     ))
                 )}
-                {isLoading && (
+                {/* Once the first chunk arrives the streamed answer replaces "Typing..." */}
+                {isLoading && !messages.some((msg) => msg.streaming) && (
                     <div className="message agent loading">
                         <strong>Agent: </strong>Typing...
                     </div>
@@ -0,0 +1,436 @@
+import concurrent.futures
+import json
+import os
+import queue
+import re
+import threading
+from contextlib import contextmanager
+
+from google.api_core.exceptions import GoogleAPIError
+
+from common.schema import BIGQUERY_PROJECT, TABLES
+from common.sql_parsing import mask_literals, parse_select, split_conjuncts, split_top_level
+from common.telemetry import telemetry
+
+
+class QueryBackendError(Exception):
+    """Raised by a backend when the engine rejects or fails a query."""
+
+
+class QueryBackend:
+    """
+    Interface of the engines `execute_bigquery_query` can run against.
+
+    `run` takes BigQuery-dialect SQL and returns `(headers, rows)` where rows is
+    a list of value tuples in header order, holding at most `max_results` rows
+    (all rows when `max_results` is None). With a `timeout` (seconds), a query
+    still running when it passes is cancelled in the engine and
+    QueryBackendError is raised, so it stops using the engine and its worker.
+    """
+    name = "backend"
+
+    def run(self, sql_query: str, max_results: int, timeout: float = None):
+        raise NotImplementedError
+
+    def table_version(self, table_name: str):
+        """Returns a value that changes whenever the data of `table_name` changes, or None if unknown."""
+        return None
+
+    def dry_run(self, sql_query: str):
+        """Returns the bytes `sql_query` would scan, without running it, or None if the engine cannot tell."""
+        return None
+
+
+# --- BigQuery Backend ---
+
+class BigQueryClientPool:
+    """
+    A thread-safe pool of BigQuery clients shared by every tool call in the process.
+
+    Clients are created lazily up to `max_size` and handed back to the pool after
+    each query, so concurrent tool calls never pay for a new client (and its
+    credential lookup) on every invocation.
+    """
+
+    def __init__(self, project: str, max_size: int = 8, client_factory=None):
+        self.project = project
+        self.max_size = max_size
+        self._client_factory = client_factory
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_client(self):
+        if self._client_factory is None:
+            # Imported on first use: the module is slow to import and the local backend never needs it
+            from google.cloud import bigquery
+            self._client_factory = bigquery.Client
+        return self._client_factory(project=self.project)
+
+    @contextmanager
+    def client(self):
+        """Borrows a client from the pool for the duration of the `with` block."""
+        try:
+            bq_client = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                bq_client = self._new_client()
+            else:
+                # Every client is busy, wait for one to be returned
+                bq_client = self._idle.get()
+        try:
+            yield bq_client
+        finally:
+            self._idle.put_nowait(bq_client)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_client_pool(project: str = BIGQUERY_PROJECT) -> BigQueryClientPool:
+    """Returns the process-wide client pool for `project`, creating it on first use."""
+    pool = _pools.get(project)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(project)
+            if pool is None:
+                pool = BigQueryClientPool(project)
+                _pools[project] = pool
+    return pool
+
+
+class BigQueryBackend(QueryBackend):
+    """Runs queries on BigQuery through a pooled client."""
+    name = "bigquery"
+
+    def __init__(self, pool: BigQueryClientPool = None):
+        self.pool = pool or get_client_pool()
+
+    def run(self, sql_query: str, max_results: int, timeout: float = None):
+        # The schema and the rows are fetched from a single `result()` call
+        try:
+            with self.pool.client() as bq_client:
+                query_job = bq_client.query(sql_query)
+                try:
+                    row_iterator = query_job.result(max_results=max_results, timeout=timeout)
+                except concurrent.futures.TimeoutError:
+                    # Waiting stops, but the job would keep running (and billing) without a cancel
+                    query_job.cancel()
+                    telemetry.metrics.inc("bigquery_jobs_cancelled_total")
+                    raise QueryBackendError(f"BigQuery query did not finish within {timeout:g} seconds and was cancelled.")
+                rows = [tuple(row.values()) for row in row_iterator]
+                headers = [field.name for field in row_iterator.schema]
+            bytes_scanned = query_job.total_bytes_processed or 0
+            telemetry.current_span().set(bytes_scanned=bytes_scanned, cache_hit=bool(query_job.cache_hit))
+            telemetry.metrics.inc("bigquery_bytes_processed_total", bytes_scanned)
+        except GoogleAPIError as e:
+            raise QueryBackendError(f"BigQuery API Error: {e}") from e
+        return headers, rows
+
+    def table_version(self, table_name: str):
+        # Table metadata lookups are free and do not scan any data
+        with self.pool.client() as bq_client:
+            return bq_client.get_table(table_name).modified
+
+    def dry_run(self, sql_query: str):
+        # Dry runs are free: BigQuery validates the query and reports the bytes it would bill
+        from google.cloud import bigquery
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        try:
+            with self.pool.client() as bq_client:
+                return bq_client.query(sql_query, job_config=job_config).total_bytes_processed
+        except GoogleAPIError as e:
+            raise QueryBackendError(f"BigQuery API Error: {e}") from e
+
+
+# --- Local (DuckDB) Backend ---
+
+_TYPE_NAMES = {"INT64": "BIGINT", "FLOAT64": "DOUBLE", "STRING": "VARCHAR", "BOOL": "BOOLEAN"}
+_COLUMN_BYTES = {"STRING": 16, "BOOL": 1} # Estimated bytes per value; BigQuery bills 8 for numbers and dates
+
+
+def _rewrite_calls(sql: str, function: str, rewrite) -> str:
+    """
+    Replaces every `function(...)` call in `sql` with `rewrite(args)`.
+
+    Calls are rewritten right to left so nested calls of the same function are
+    handled before the call that contains them.
+    """
+    pattern = re.compile(rf"\b{function}\s*\(", re.IGNORECASE)
+    masked = mask_literals(sql)
+    for match in reversed(list(pattern.finditer(masked))):
+        # Text left of the current match is unchanged, only the end needs recomputing
+        masked = mask_literals(sql)
+        args_start = match.end()
+        depth, end = 1, args_start
+        while depth and end < len(masked):
+            if masked[end] == "(":
+                depth += 1
+            elif masked[end] == ")":
+                depth -= 1
+            end += 1
+        args = split_top_level(sql[args_start:end - 1])
+        sql = sql[:match.start()] + rewrite(args) + sql[end:]
+    return sql
+
+
+def translate_sql(sql_query: str, table_names: dict) -> str:
+    """
+    Translates the BigQuery SQL the agents generate into DuckDB SQL.
+
+    Fully qualified table names are mapped to local tables, and the BigQuery
+    date functions used in the prompts are rewritten to their DuckDB form.
+    """
+    for bq_name, local_name in table_names.items():
+        sql_query = re.sub(rf"`?{re.escape(bq_name)}`?", local_name, sql_query)
+
+    sql_query = _rewrite_calls(sql_query, "PARSE_DATE", lambda a: f"CAST(strptime({a[1]}, {a[0]}) AS DATE)")
+    sql_query = _rewrite_calls(sql_query, "FORMAT_DATE", lambda a: f"strftime({a[1]}, {a[0]})")
+    sql_query = _rewrite_calls(
+        sql_query, "DATE_TRUNC",
+        lambda a: f"CAST(date_trunc('{a[1].lower()}', {a[0]}) AS DATE)" if len(a) == 2 and not a[0].startswith("'") else f"date_trunc({', '.join(a)})",
+    )
+    sql_query = _rewrite_calls(sql_query, "DATE_ADD", lambda a: f"CAST(({a[0]}) + {a[1]} AS DATE)")
+    sql_query = _rewrite_calls(sql_query, "DATE_SUB", lambda a: f"CAST(({a[0]}) - {a[1]} AS DATE)")
+    sql_query = _rewrite_calls(sql_query, "DATE_DIFF", lambda a: f"date_diff('{a[2].lower()}', {a[1]}, {a[0]})")
+    sql_query = _rewrite_calls(sql_query, "SAFE_DIVIDE", lambda a: f"(CASE WHEN ({a[1]}) = 0 THEN NULL ELSE ({a[0]}) / ({a[1]}) END)")
+    sql_query = _rewrite_calls(sql_query, "COUNTIF", lambda a: f"count_if({a[0]})")
+    sql_query = re.sub(r"\bCURRENT_DATE\s*\(\s*\)", "current_date", sql_query, flags=re.IGNORECASE)
+    for bq_type, duckdb_type in _TYPE_NAMES.items():
+        sql_query = re.sub(rf"\bAS\s+{bq_type}\b", f"AS {duckdb_type}", sql_query, flags=re.IGNORECASE)
+    return sql_query
+
+
+def _bigquery_headers(sql_query: str, names: list) -> list:
+    """
+    Renames the result columns DuckDB named after their expression ("max(Date)") to BigQuery's `f<n>_`.
+
+    Unparsed queries (joins, CTEs) fall back to the names: DuckDB only gives
+    a plain identifier to a column or alias.
+    """
+    query = parse_select(sql_query)
+    if query is not None and len(query.items) == len(names) and not any(item.expression.endswith("*") for item in query.items):
+        anonymous = [not item.alias and re.fullmatch(r"f\d+_", output) is not None
+                     for item, output in zip(query.items, query.output_names())]
+    else:
+        anonymous = [not re.fullmatch(r"[A-Za-z_]\w*", name) for name in names]
+    headers, count = [], 0
+    for name, is_anonymous in zip(names, anonymous):
+        if is_anonymous:
+            name, count = f"f{count}_", count + 1
+        headers.append(name)
+    return headers
+
+
+def _partition_filters(query, table) -> list:
+    """Returns the WHERE conjuncts of `query` that compare the table's date column directly with literals."""
+    conjuncts = split_conjuncts(query.where) if query.where else None
+    date_literal = r"(?:(?:DATE\s*)?'[^']*'|DATE_SUB\s*\(\s*CURRENT_DATE\s*\(\s*\)\s*,\s*INTERVAL\s+\d+\s+DAY\s*\))"
+    pattern = re.compile(
+        rf"{table.date_column}\s*(?:(?:>=|<=|=|<|>)\s*{date_literal}|BETWEEN\s+{date_literal}\s+AND\s+{date_literal})",
+        re.IGNORECASE,
+    )
+    return [conjunct for conjunct in conjuncts or [] if pattern.fullmatch(conjunct)]
+
+
+# Version marker of a table's partitioned Parquet store, written last by load_data.py; lists its files in load order
+STORE_MARKER = "_version.json"
+
+
+class LocalBackend(QueryBackend):
+    """
+    Runs queries on an embedded DuckDB database loaded from the local data exports.
+
+    Each table is read from `data_dir`: from its month-partitioned Parquet
+    store (`<local_name>/`, written by load_data.py) when there is one, else
+    from its CSV export. Tables are loaded into memory, or into the database
+    file at `database` (which DuckDB memory-maps), and kept up to date: when a
+    store's version changes only its new part files are appended, and a
+    changed CSV is loaded again.
+    """
+    name = "duckdb"
+
+    def __init__(self, data_dir: str = None, database: str = ":memory:", tables=None):
+        try:
+            # Imported here, not with the module: the local backend is optional, and BigQuery deployments never load it
+            import duckdb
+        except ImportError:
+            raise QueryBackendError("The local query backend requires the 'duckdb' package.")
+        self.data_dir = data_dir or os.environ.get("LOCAL_DATA_DIR", ".")
+        self.tables = tables or list(TABLES.values())
+        self._connection = duckdb.connect(database)
+        self._lock = threading.Lock()
+        self.table_names = {}
+        self._loaded_versions = {}
+        self._loaded_files = {}  # table name -> store part files loaded, in load order
+        self._marker_mtimes = {} # table name -> modification time of the store marker last read
+        for table in self.tables:
+            if os.path.exists(self._marker_path(table)) or os.path.exists(self._path(table)):
+                self.table_names[table.name] = table.local_name
+            else:
+                print(f"Local backend: '{self._path(table)}' not found, skipping table {table.name}.")
+        self._reload_changed_tables()
+
+    def _path(self, table) -> str:
+        return os.path.join(self.data_dir, table.local_file)
+
+    def _marker_path(self, table) -> str:
+        return os.path.join(self.data_dir, table.local_name, STORE_MARKER)
+
+    def _reload_store(self, table, marker_path: str):
+        """Appends the part files added to the table's store since the last load (all of them the first time)."""
+        mtime = os.path.getmtime(marker_path)
+        if self._marker_mtimes.get(table.name) == mtime:
+            return
+        with self._lock:
+            if self._marker_mtimes.get(table.name) == mtime:
+                return
+            with open(marker_path) as f:
+                marker = json.load(f)
+            loaded, files = self._loaded_files.get(table.name), marker["files"]
+            store_dir = os.path.dirname(marker_path)
+            # The month=YYYY-MM directories are only a layout, not a column
+            read_parts = "SELECT * FROM read_parquet(?, hive_partitioning = false)"
+            if loaded and files[:len(loaded)] == loaded:
+                new_files = files[len(loaded):]
+                if new_files:
+                    self._connection.execute(
+                        f"INSERT INTO {table.local_name} BY NAME {read_parts}",
+                        [[os.path.join(store_dir, name) for name in new_files]],
+                    )
+            else:
+                # First load, or the store was rebuilt
+                self._connection.execute(
+                    f"CREATE OR REPLACE TABLE {table.local_name} AS {read_parts}",
+                    [[os.path.join(store_dir, name) for name in files]],
+                )
+            self._loaded_files[table.name] = files
+            self._loaded_versions[table.name] = marker["version"]
+            self._marker_mtimes[table.name] = mtime
+
+    def _reload_changed_tables(self):
+        for table in self.tables:
+            if table.name not in self.table_names:
+                continue
+            marker_path = self._marker_path(table)
+            if os.path.exists(marker_path):
+                self._reload_store(table, marker_path)
+                continue
+            version = os.path.getmtime(self._path(table))
+            if self._loaded_versions.get(table.name) == version:
+                continue
+            with self._lock:
+                if self._loaded_versions.get(table.name) != version:
+                    self._connection.execute(
+                        f"CREATE OR REPLACE TABLE {table.local_name} AS SELECT * FROM read_csv_auto(?)",
+                        [self._path(table)],
+                    )
+                    self._loaded_versions[table.name] = version
+
+    def run(self, sql_query: str, max_results: int, timeout: float = None):
+        import duckdb
+
+        try:
+            self._reload_changed_tables()
+            # DuckDB connections are not safe to share between threads, use a cursor per query
+            with self._lock:
+                cursor = self._connection.cursor()
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, cursor.interrupt)
+                timer.daemon = True
+                timer.start()
+            try:
+                cursor.execute(translate_sql(sql_query, self.table_names))
+                headers = _bigquery_headers(sql_query, [column[0] for column in cursor.description])
+                rows = cursor.fetchall() if max_results is None else cursor.fetchmany(max_results)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                cursor.close()
+        except duckdb.InterruptException as e:
+            raise QueryBackendError(f"DuckDB query did not finish within {timeout:g} seconds and was cancelled.") from e
+        except duckdb.Error as e:
+            raise QueryBackendError(f"DuckDB Error: {e}") from e
+        return headers, rows
+
+    def table_version(self, table_name: str):
+        # The version is the store's version number, or the modification time of the loaded CSV
+        self._reload_changed_tables()
+        return self._loaded_versions.get(table_name)
+
+    def dry_run(self, sql_query: str):
+        """
+        Validates the query and estimates the bytes BigQuery would bill for it.
+
+        Like BigQuery's columnar billing, the estimate is the row count of each
+        referenced table times the width of the columns the query reads. Tables
+        are treated as partitioned by their date column: direct comparisons of
+        the date column with a constant prune the rows counted, filters on
+        functions of it (e.g. `EXTRACT(YEAR FROM date)`) do not.
+        """
+        import duckdb
+
+        self._reload_changed_tables()
+        masked = mask_literals(sql_query)
+        query = parse_select(sql_query)
+        select_star = re.search(r"\bSELECT\s+(?:DISTINCT\s+)?(?:\w+\.)?\*", masked, re.IGNORECASE)
+        try:
+            with self._lock:
+                cursor = self._connection.cursor()
+            try:
+                cursor.execute("EXPLAIN " + translate_sql(sql_query, self.table_names))
+                total = 0
+                for table in self.tables:
+                    if table.name not in self.table_names or table.name not in sql_query:
+                        continue
+                    partition_filters = _partition_filters(query, table) if query and query.table == table.name else []
+                    count_query = f"SELECT COUNT(*) FROM `{table.name}`"
+                    if partition_filters:
+                        count_query += " WHERE " + " AND ".join(partition_filters)
+                    row_count = cursor.execute(translate_sql(count_query, self.table_names)).fetchone()[0]
+                    width = sum(
+                        _COLUMN_BYTES.get(column.type, 8) for column in table.columns
+                        if select_star or re.search(rf"\b{column.name}\b", masked, re.IGNORECASE)
+                    )
+                    total += row_count * width
+            finally:
+                cursor.close()
+        except duckdb.Error as e:
+            raise QueryBackendError(f"DuckDB Error: {e}") from e
+        return total
+
+
+# --- Backend Selection ---
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> QueryBackend:
+    """
+    Returns the process-wide query backend.
+
+    The engine is chosen with the `QUERY_BACKEND` environment variable:
+    `bigquery` (the default) or `duckdb` for the local backend.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = os.environ.get("QUERY_BACKEND", "bigquery").lower()
+                if kind in ("duckdb", "local"):
+                    _backend = LocalBackend(database=os.environ.get("LOCAL_DB_PATH") or ":memory:")
+                else:
+                    _backend = BigQueryBackend()
+    return _backend
+
+
+def set_backend(backend: QueryBackend):
+    """Replaces the process-wide query backend (e.g. with a LocalBackend in tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
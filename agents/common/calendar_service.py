@@ -0,0 +1,164 @@
+import datetime
+import os
+import pickle # To store user credentials
+import threading
+
+# The Google API client and OAuth libraries are imported on first use, so importing an agent stays fast
+
+
+# If modifying these scopes, delete the file token.pickle.
+SCOPES = ['https://www.googleapis.com/auth/calendar.events']
+TOKEN_FILE = 'token.pickle' # Stores user credentials
+CLIENT_SECRET_FILE = 'client_secret.json' # Downloaded from GCP Console
+
+REFRESH_MARGIN_SECONDS = 5 * 60 # Refresh the access token this long before it expires
+RETRY_MIN_SECONDS = 30 # First retry after a failed refresh, doubled after each further failure
+RETRY_MAX_SECONDS = 30 * 60
+
+
+class CalendarServiceProvider:
+    """
+    Process-wide Google Calendar client shared by every calendar tool call.
+
+    Credentials are loaded (and the discovery client built) once, on first use.
+    The access token is refreshed on a background timer `refresh_margin`
+    seconds before it expires, so tool calls never wait for a token refresh.
+    A failed refresh is retried with exponential backoff from `retry_min` up
+    to `retry_max` seconds, and not at all once the grant is revoked.
+    The built client is shared, but httplib2 is not thread-safe, so requests
+    are executed through a per-thread authorized HTTP object (see `execute`).
+    """
+
+    def __init__(self, token_file: str = TOKEN_FILE, client_secret_file: str = CLIENT_SECRET_FILE,
+                 scopes: list = SCOPES, refresh_margin: float = REFRESH_MARGIN_SECONDS,
+                 retry_min: float = RETRY_MIN_SECONDS, retry_max: float = RETRY_MAX_SECONDS):
+        self.token_file = token_file
+        self.client_secret_file = client_secret_file
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self._failures = 0 # Refreshes failed in a row
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creds = None
+        self._service = None
+        self._timer = None
+
+    def _load_credentials(self, interactive: bool = True):
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds = None
+        if os.path.exists(self.token_file):
+            with open(self.token_file, 'rb') as token:
+                creds = pickle.load(token)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                if not os.path.exists(self.client_secret_file):
+                    raise FileNotFoundError(
+                        f"'{self.client_secret_file}' not found. Please download it from GCP Console -> APIs & Services -> Credentials."
+                    )
+                if not interactive:
+                    raise RuntimeError(f"Google Calendar needs an interactive sign-in, '{self.token_file}' has no usable credentials.")
+                flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_file, self.scopes)
+                creds = flow.run_local_server(port=0)
+            self._save_credentials(creds)
+        return creds
+
+    def _save_credentials(self, creds):
+        with open(self.token_file, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def _schedule_refresh(self):
+        if self._creds.expiry is None or not self._creds.refresh_token:
+            return
+        if self._failures:
+            # The token is already due, so back off instead of retrying right away
+            delay = min(self.retry_max, self.retry_min * 2 ** (self._failures - 1))
+        else:
+            # Credentials.expiry is a naive UTC datetime
+            remaining = (self._creds.expiry - datetime.datetime.utcnow()).total_seconds()
+            delay = max(0.0, remaining - self.refresh_margin)
+        self._timer = threading.Timer(delay, self._refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh(self):
+        from google.auth.exceptions import RefreshError
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            try:
+                # Refreshing updates the shared credentials in place, so every thread picks up the new token
+                self._creds.refresh(Request())
+                self._save_credentials(self._creds)
+                self._failures = 0
+            except RefreshError as e:
+                if "invalid_grant" in str(e) or getattr(e, "retryable", True) is False:
+                    # Revoked or invalid: retrying cannot help, the next sign-in replaces the token
+                    print(f"Google Calendar credentials were revoked, not refreshing them again: {e}")
+                    return
+                self._failures += 1
+                print(f"Could not refresh Google Calendar credentials (attempt {self._failures}): {e}")
+            except Exception as e:
+                # The per-request HTTP objects still refresh on demand if this keeps failing
+                self._failures += 1
+                print(f"Could not refresh Google Calendar credentials (attempt {self._failures}): {e}")
+            self._schedule_refresh()
+
+    def service(self, interactive: bool = True):
+        """
+        Returns the shared Calendar API service object, authenticating on first use.
+
+        With `interactive=False` (for background warm-up) a missing or revoked
+        token raises instead of starting the browser sign-in flow.
+        """
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build # Calendar API client
+
+                    self._creds = self._load_credentials(interactive)
+                    self._service = build('calendar', 'v3', credentials=self._creds, cache_discovery=False)
+                    self._schedule_refresh()
+                    print("Google Calendar service initialized successfully.")
+        return self._service
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self._creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def execute(self, request):
+        """Executes a request built from `service()` on the calling thread's own connection."""
+        return request.execute(http=self._http())
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+calendar_provider = CalendarServiceProvider()
+
+
+def get_calendar_service():
+    """
+    Returns the shared Calendar service, or None (after printing why) when it cannot be initialized.
+    """
+    try:
+        return calendar_provider.service()
+    except FileNotFoundError as e:
+        print(f"ERROR: {e}")
+        print("Please make sure you have 'client_secret.json' downloaded from GCP and in the script's directory.")
+    except Exception as e:
+        print(f"Could not initialize Google Calendar service: {e}")
+        print("Check your internet connection or OAuth setup.")
+    return None
@@ -0,0 +1,109 @@
+import datetime
+
+from common.calendar_service import calendar_provider, get_calendar_service
+from common.telemetry import telemetry
+
+
+def list_upcoming_events(max_events: int = 10) -> str:
+    """
+    Lists upcoming events from the authenticated Google Calendar.
+    By default, lists up to 10 events within the next 7 days.
+
+    Args:
+        max_events (int, optional): The maximum number of events to return. Defaults to 10.
+
+    Returns:
+        str: A formatted string of upcoming events, or a message if none found.
+    """
+    calendar_service = get_calendar_service()
+    if not calendar_service:
+        return "ERROR: Google Calendar service not available. Please check authentication setup."
+
+    telemetry.metrics.inc("tool_calls_total", tool="list_upcoming_events", source="calendar")
+    now = datetime.datetime.utcnow().isoformat() + 'Z' # 'Z' indicates UTC time
+    # Events for next 7 days
+    seven_days_later = (datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat() + 'Z'
+
+    try:
+        with telemetry.span("tool.list_upcoming_events", max_events=max_events) as span:
+            events_result = calendar_provider.execute(
+                calendar_service.events().list(calendarId='primary', timeMin=now,
+                                               timeMax=seven_days_later,
+                                               maxResults=max_events, singleEvents=True,
+                                               orderBy='startTime')
+            )
+            events = events_result.get('items', [])
+            span.set(events_returned=len(events))
+
+        if not events:
+            return "No upcoming events found in the next 7 days."
+
+        events_str_list = []
+        for event in events:
+            start = event['start'].get('dateTime', event['start'].get('date'))
+            end = event['end'].get('dateTime', event['end'].get('date'))
+            events_str_list.append(f"- {event['summary']} (Start: {start}, End: {end})")
+        return "Upcoming events:\n" + "\n".join(events_str_list)
+    except Exception as e:
+        return f"Error listing events: {e}. Please ensure service is authenticated."
+
+def create_calendar_event(
+    summary: str,
+    start_time: str, # ISO 8601 format, e.g., "2024-03-25T10:00:00"
+    end_time: str,   # ISO 8601 format, e.g., "2024-03-25T11:00:00"
+    description: str = "",
+    location: str = ""
+) -> str:
+    """
+    Creates a new event on the authenticated Google Calendar.
+    Requires event summary, start time, and end time.
+    Times should be in ISO 8601 format (e.g., "YYYY-MM-DDTHH:MM:SS" for specific time, or "YYYY-MM-DD" for all-day).
+    If no timezone is specified, it assumes UTC. Add 'Z' for UTC or '+HH:MM' for offset.
+    For example: "2024-03-25T09:00:00-07:00" (for PST) or "2024-03-25" (for all-day event).
+
+    Args:
+        summary (str): The title of the event.
+        start_time (str): The start date/time of the event (ISO 8601 string).
+                          Examples: "2024-03-25T10:00:00", "2024-03-25"
+        end_time (str): The end date/time of the event (ISO 8601 string).
+                        Examples: "2024-03-25T11:00:00", "2024-03-26"
+        description (str, optional): A detailed description of the event. Defaults to "".
+        location (str, optional): The physical location of the event. Defaults to "".
+
+    Returns:
+        str: A confirmation message with the event link, or an error message.
+    """
+    calendar_service = get_calendar_service()
+    if not calendar_service:
+        return "ERROR: Google Calendar service not available. Please check authentication setup."
+
+    telemetry.metrics.inc("tool_calls_total", tool="create_calendar_event", source="calendar")
+    event = {
+        'summary': summary,
+        'location': location,
+        'description': description,
+        'start': {
+            'dateTime': start_time if 'T' in start_time else None,
+            'date': start_time if 'T' not in start_time else None,
+            'timeZone': 'UTC', # Or specify a default like 'America/Los_Angeles' or ask user
+        },
+        'end': {
+            'dateTime': end_time if 'T' in end_time else None,
+            'date': end_time if 'T' not in end_time else None,
+            'timeZone': 'UTC',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }
+
+    try:
+        with telemetry.span("tool.create_calendar_event", start_time=start_time, end_time=end_time):
+            event = calendar_provider.execute(calendar_service.events().insert(calendarId='primary', body=event))
+        return f"Event created: {event.get('htmlLink')}"
+    except Exception as e:
+        return f"Error creating event: {e}. Please ensure date/time format is correct (YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD) and service is authenticated."
@@ -0,0 +1,379 @@
+import datetime
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from common.backends import QueryBackendError, get_backend
+from common.result_encoding import encode_rows
+from common.schema import MONTHLY_SALES
+from common.telemetry import telemetry
+
+
+# Fitted models are saved here, so a restarted agent serves forecasts without refitting
+FORECAST_MODEL_PATH = os.environ.get("FORECAST_MODEL_PATH") or os.path.join(tempfile.gettempdir(), "sales_forecast_model.npz")
+
+# How often the table is checked for new months; forecasts are served from memory in between
+FORECAST_REFRESH_SECONDS = float(os.environ.get("FORECAST_REFRESH_SECONDS") or 5 * 60)
+
+MAX_HORIZON = 24
+MAX_ITERATIONS = 50
+
+
+def _add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _month_index(month: datetime.date) -> int:
+    return month.year * 12 + month.month - 1
+
+
+# --- Model ---
+
+def fit_models(history, first_month: datetime.date, growth=None, tolerance: float = 1e-7) -> dict:
+    """
+    Fits sales = level[month of year] * (1 + growth * t) to every product at once.
+
+    `history` is a (products, months) array of monthly sales from
+    `first_month`, NaN where a product has no data; t counts months from
+    `first_month`. This is the trend x seasonality structure the data is
+    generated with (generate_data.py), with the base sales and seasonal factor
+    folded into one level per calendar month.
+
+    The levels start from their closed-form least-squares value given the
+    growth, then all 13 parameters of every product are refined together by
+    Gauss-Newton steps. Their normal equations are diagonal in the levels
+    bordered by the growth, so each step is solved in closed form for all
+    products with a few matrix products. `growth` warm-starts it from a
+    previous fit.
+
+    Returns the levels (products, 12), growth and residual standard deviation
+    (products,), the in-sample mean absolute percentage error, and the
+    iterations used.
+    """
+    import numpy as np
+
+    observed = ~np.isnan(history)
+    sales = np.where(observed, history, 0.0)
+    products, months = history.shape
+    t = np.arange(months, dtype=float)
+    calendar_month = (np.arange(months) + first_month.month - 1) % 12
+    onehot = (calendar_month[:, None] == np.arange(12)).astype(float) # (months, 12)
+    growth = np.zeros(products) if growth is None else np.array(growth, dtype=float)
+    if len(growth) < products:
+        growth = np.concatenate([growth, np.zeros(products - len(growth))])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where(observed, 1 + growth[:, None] * t, 0.0)
+        levels = np.nan_to_num(((sales * trend) @ onehot) / ((trend ** 2) @ onehot))
+        for iteration in range(1, MAX_ITERATIONS + 1):
+            trend = np.where(observed, 1 + growth[:, None] * t, 0.0)
+            base = levels @ onehot.T
+            residuals = sales - base * trend
+            slope = np.where(observed, base, 0.0) * t # Derivative of the fitted values in the growth
+            # Normal equations: diagonal in the levels (each month has its own), bordered by the growth
+            level_curvature = (trend ** 2) @ onehot
+            cross = (trend * slope) @ onehot
+            level_gradient = (trend * residuals) @ onehot
+            # Calendar months a product has no data for keep their level
+            inverse = np.where(level_curvature > 0, 1 / level_curvature, 0.0)
+            growth_step = (((slope * residuals).sum(axis=1) - (cross * level_gradient * inverse).sum(axis=1))
+                           / ((slope ** 2).sum(axis=1) - (cross ** 2 * inverse).sum(axis=1)))
+            growth_step = np.nan_to_num(growth_step)
+            levels = levels + (level_gradient - cross * growth_step[:, None]) * inverse
+            growth = growth + growth_step
+            if np.max(np.abs(growth_step), initial=0.0) < tolerance:
+                break
+        # Calendar months a product has no data for take its average level
+        seen = (observed.astype(float) @ onehot) > 0
+        levels = np.where(seen, levels, (levels * seen).sum(axis=1, keepdims=True) / np.maximum(seen.sum(axis=1, keepdims=True), 1))
+        fitted = (levels @ onehot.T) * (1 + growth[:, None] * t)
+        residuals = np.where(observed, sales - fitted, 0.0)
+        counts = observed.sum(axis=1)
+        sigma = np.sqrt((residuals ** 2).sum(axis=1) / np.maximum(counts - 13, 1))
+        mape = (np.abs(residuals) / np.where(observed & (sales != 0), np.abs(sales), np.inf)).sum(axis=1) / np.maximum(counts, 1)
+    return {"levels": levels, "growth": growth, "sigma": sigma, "mape": mape, "iterations": iteration}
+
+
+# --- Forecaster ---
+
+class SalesForecaster:
+    """
+    Keeps a fitted forecasting model for every product of the monthly sales table.
+
+    The monthly history of all products is read once and every model is
+    fitted in one vectorized pass (`fit_models`). The history and parameters
+    are saved to FORECAST_MODEL_PATH and reloaded on start. When the table's
+    data version changes and new months arrived, only the months from the
+    last fitted one on are read: if the overlapping month and the totals of
+    the earlier months still match and no product was added, the new months
+    are appended and the models refitted from their previous growth;
+    otherwise (data restated, a new product's history) everything is reread
+    and refitted.
+
+    Forecasts are computed from the parameters in memory. The table is
+    checked at most every FORECAST_REFRESH_SECONDS, in the background once a
+    model exists.
+    """
+
+    def __init__(self, backend_getter=get_backend, table=MONTHLY_SALES, path: str = FORECAST_MODEL_PATH,
+                 refresh_interval: float = FORECAST_REFRESH_SECONDS, confidence: float = 0.95):
+        self._backend_getter = backend_getter
+        self.table = table
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+        self._model = None # dict: products, index, first_month, history, version, and fit_models' parameters
+        self._lock = threading.Lock()
+        self._last_check = None
+        self._refreshing = False
+        self.fits = {"full": 0, "incremental": 0}
+
+    # --- Loading ---
+
+    def _monthly_rows(self, since: datetime.date = None) -> list:
+        table = self.table
+        where = f"WHERE {table.date_column} >= DATE '{since.isoformat()}' " if since else ""
+        sql_query = (
+            f"SELECT {table.product_column}, DATE_TRUNC({table.date_column}, MONTH) AS month, SUM({table.value_column}) "
+            f"FROM `{table.name}` {where}GROUP BY {table.product_column}, month"
+        )
+        _, rows = self._backend_getter().run(sql_query, None)
+        return [(product, month if isinstance(month, datetime.date) else datetime.date.fromisoformat(str(month)[:10]), value)
+                for product, month, value in rows if product is not None and month is not None]
+
+    @staticmethod
+    def _to_history(rows: list, products: list, first_month: datetime.date, months: int):
+        import numpy as np
+
+        index = {product: i for i, product in enumerate(products)}
+        history = np.full((len(products), months), np.nan)
+        start = _month_index(first_month)
+        for product, month, value in rows:
+            history[index[product], _month_index(month) - start] = float(value or 0)
+        return history
+
+    def _full_fit(self, version):
+        rows = self._monthly_rows()
+        if not rows:
+            return None
+        products = sorted({product for product, _, _ in rows})
+        first_month = min(month for _, month, _ in rows)
+        months = _month_index(max(month for _, month, _ in rows)) - _month_index(first_month) + 1
+        history = self._to_history(rows, products, first_month, months)
+        self.fits["full"] += 1
+        return self._fitted(products, first_month, history, version)
+
+    def _history_changed(self, model: dict, last_month: datetime.date) -> bool:
+        """Whether any product's months before `last_month` differ in number or total from the fitted history."""
+        import numpy as np
+
+        table = self.table
+        _, rows = self._backend_getter().run(
+            f"SELECT {table.product_column}, COUNT(DISTINCT DATE_TRUNC({table.date_column}, MONTH)), SUM({table.value_column}) "
+            f"FROM `{table.name}` WHERE {table.date_column} < DATE '{last_month.isoformat()}' GROUP BY {table.product_column}",
+            None,
+        )
+        earlier = model["history"][:, :-1]
+        fitted = {product: (int((~np.isnan(earlier[i])).sum()), float(np.nansum(earlier[i])))
+                  for i, product in enumerate(model["products"]) if (~np.isnan(earlier[i])).any()}
+        current = {product: (int(count), float(total or 0)) for product, count, total in rows if product is not None}
+        if current.keys() != fitted.keys():
+            return True
+        return any(current[product][0] != count or abs(current[product][1] - total) > 1e-6 * max(1.0, abs(total))
+                   for product, (count, total) in fitted.items())
+
+    def _incremental_fit(self, model: dict, version):
+        """Appends the months after the last fitted one; returns None when the data was restated or products added instead."""
+        import numpy as np
+
+        last_month = _add_months(model["first_month"], model["history"].shape[1] - 1)
+        rows = self._monthly_rows(since=last_month)
+        if not any(month > last_month for _, month, _ in rows):
+            return None
+        known = model["index"]
+        # A new product comes with its whole history, which only a full read picks up
+        if any(product not in known for product, _, _ in rows):
+            return None
+        overlap = {product: float(value or 0) for product, month, value in rows if month == last_month}
+        fitted = {product: model["history"][i, -1] for i, product in enumerate(model["products"])
+                  if not np.isnan(model["history"][i, -1])}
+        if overlap.keys() != fitted.keys():
+            return None
+        for product, value in overlap.items():
+            if abs(fitted[product] - value) > 1e-6 * max(1.0, abs(value)):
+                return None
+        if self._history_changed(model, last_month):
+            return None
+        products = model["products"]
+        months = _month_index(max(month for _, month, _ in rows)) - _month_index(model["first_month"]) + 1
+        history = np.full((len(products), months), np.nan)
+        history[:, :model["history"].shape[1]] = model["history"]
+        new_rows = [row for row in rows if row[1] > last_month]
+        history[:, model["history"].shape[1]:] = self._to_history(new_rows, products, _add_months(last_month, 1),
+                                                                  months - model["history"].shape[1])
+        self.fits["incremental"] += 1
+        return self._fitted(products, model["first_month"], history, version, growth=model["growth"])
+
+    def _fitted(self, products: list, first_month: datetime.date, history, version, growth=None) -> dict:
+        with telemetry.span("forecast.fit", products=len(products), months=history.shape[1], warm=growth is not None) as span:
+            parameters = fit_models(history, first_month, growth)
+            span.set(iterations=parameters["iterations"])
+        return {"products": products, "index": {product: i for i, product in enumerate(products)},
+                "first_month": first_month, "history": history, "version": version, **parameters}
+
+    # --- Persistence ---
+
+    def save(self, model: dict):
+        import numpy as np
+
+        if not self.path:
+            return
+        temporary = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, products=np.array(model["products"]), first_month=model["first_month"].isoformat(),
+                 history=model["history"], version=str(model["version"]), table=self.table.name,
+                 **{key: model[key] for key in ("levels", "growth", "sigma", "mape")})
+        os.replace(temporary, self.path)
+
+    def load(self):
+        """Loads the saved model, if there is one for this table; returns it or None."""
+        import numpy as np
+
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path) as saved:
+                if str(saved["table"]) != self.table.name:
+                    return None
+                products = saved["products"].tolist()
+                model = {"products": products, "index": {product: i for i, product in enumerate(products)},
+                         "first_month": datetime.date.fromisoformat(str(saved["first_month"])),
+                         "history": saved["history"], "version": str(saved["version"]), "iterations": 0,
+                         **{key: saved[key] for key in ("levels", "growth", "sigma", "mape")}}
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Forecasting: could not load {self.path}: {e}")
+            return None
+        self._model = model
+        return model
+
+    # --- Refresh ---
+
+    def refresh(self):
+        """Brings the models up to date with the table: nothing, an incremental refit or a full one."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            version = self._backend_getter().table_version(self.table.name)
+            model = self._model if self._model is not None else self.load()
+            # Versions are compared as strings: that is how they are saved
+            if model is not None and version is not None and str(version) == model["version"]:
+                return model
+            updated = self._incremental_fit(model, version) if model is not None else None
+            if updated is None and (model is None or version is not None):
+                updated = self._full_fit(version)
+            if updated is not None:
+                updated["version"] = str(version)
+                self._model = updated
+                self.save(updated)
+            return self._model
+
+    def refresh_in_background(self):
+        """Starts a refresh thread when the table was last checked more than `refresh_interval` ago."""
+        if self._refreshing or (self._last_check is not None and time.monotonic() - self._last_check < self.refresh_interval):
+            return
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Forecasting: could not refresh {self.table.name}: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="forecast-refresh", daemon=True).start()
+
+    def model(self) -> dict:
+        """The current model: fitted (or loaded) now the first time, refreshed in the background later."""
+        if self._model is None:
+            return self.refresh()
+        self.refresh_in_background()
+        return self._model
+
+    # --- Forecasts ---
+
+    def forecast(self, product: str, horizon: int):
+        """
+        Returns (rows, total, fit) for the `horizon` months after the product's last fitted month.
+
+        rows are (month, forecast, low, high); total is (forecast, low, high)
+        for the whole horizon, with the interval assuming independent monthly
+        errors; fit holds the growth per month, in-sample MAPE and months fitted.
+        Returns None for an unknown product.
+        """
+        model = self.model()
+        if model is None or product not in model["index"]:
+            return None
+        i = model["index"][product]
+        levels, growth, sigma = model["levels"][i], float(model["growth"][i]), float(model["sigma"][i])
+        observed = (model["history"][i] == model["history"][i]).nonzero()[0] # Months that are not NaN
+        last = int(observed[-1])
+        rows = []
+        for step in range(1, horizon + 1):
+            month = _add_months(model["first_month"], last + step)
+            value = max(float(levels[month.month - 1]) * (1 + growth * (last + step)), 0.0)
+            rows.append((month.strftime("%Y-%m"), value, max(value - self.z * sigma, 0.0), value + self.z * sigma))
+        total = sum(row[1] for row in rows)
+        spread = self.z * sigma * horizon ** 0.5
+        fit = {"growth": growth, "mape": float(model["mape"][i]), "months": len(observed),
+               "last_month": _add_months(model["first_month"], last).strftime("%Y-%m")}
+        return rows, (total, max(total - spread, 0.0), total + spread), fit
+
+    def stats(self) -> dict:
+        model = self._model
+        return {
+            "products": len(model["products"]) if model else 0,
+            "months": model["history"].shape[1] if model else 0,
+            "version": model["version"] if model else None,
+            "fits": dict(self.fits),
+        }
+
+
+sales_forecaster = SalesForecaster()
+
+
+# --- Define the Forecasting Tool ---
+
+def forecast_sales(product: str, horizon: int = 3) -> str:
+    """
+    Forecasts a product's monthly sales revenue for the coming months.
+    Use this for questions about future sales ("what will Smartwatch sell next quarter") instead of
+    querying past months and extrapolating them yourself. The forecast follows the product's trend and
+    monthly seasonality, fitted on its whole history, and starts after the last month with data.
+
+    Args:
+        product (str): The product name, e.g. 'Smartwatch'.
+        horizon (int, optional): How many months to forecast, 1 to 24. Defaults to 3 (a quarter).
+
+    Returns:
+        str: One row per month with the forecast and its 95% interval (low, high), a total row for the
+             whole horizon, and the model's trend and in-sample error; or an error message.
+    """
+    if not 1 <= horizon <= MAX_HORIZON:
+        return f"ERROR: The horizon must be between 1 and {MAX_HORIZON} months, got {horizon}."
+    name = MONTHLY_SALES.product_names().get(product.strip().lower(), product.strip())
+    with telemetry.span("tool.forecast_sales", product=name, horizon=horizon) as span:
+        try:
+            result = sales_forecaster.forecast(name, horizon)
+        except QueryBackendError as e:
+            span.set(error=str(e))
+            telemetry.metrics.inc("tool_calls_total", tool="forecast_sales", source="error")
+            return str(e)
+    telemetry.metrics.inc("tool_calls_total", tool="forecast_sales", source="forecast")
+    if result is None:
+        return f"ERROR: No sales history for '{product}'. Known products include: {', '.join(MONTHLY_SALES.products)}."
+    rows, total, fit = result
+    text = encode_rows(["month", "forecast", "low", "high"], rows + [("total", *total)])
+    return (f"{text.rstrip()}\nModel: {fit['growth']:+.2%} of the seasonal level per month, fitted on {fit['months']} months "
+            f"up to {fit['last_month']}; in-sample error {fit['mape']:.1%} (MAPE).\n")
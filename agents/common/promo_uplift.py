@@ -0,0 +1,236 @@
+import os
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+
+from common.backends import QueryBackendError, get_backend
+from common.result_encoding import encode_rows
+from common.schema import WEEKLY_PROMO_SALES
+from common.telemetry import telemetry
+
+
+# Without a table version, the uplift table is recomputed after this many seconds
+UPLIFT_MAX_AGE_SECONDS = float(os.environ.get("UPLIFT_MAX_AGE_SECONDS") or 15 * 60)
+# The table version is looked up at most this often; calls in between reuse the current table
+UPLIFT_REFRESH_SECONDS = float(os.environ.get("UPLIFT_REFRESH_SECONDS") or 5 * 60)
+
+# Promotion flags, in the bit order of a combination index (1 = TPR, 2 = feature, 4 = display)
+PROMO_FLAGS = (("is_tpr", "TPR"), ("is_feature", "FEATURE"), ("is_display", "DISPLAY"))
+ALL_GEOGRAPHIES = "ALL"
+EACH_GEOGRAPHY = "EACH" # Tool argument for the rows of every geography
+
+HEADERS = ["product", "geography", "promotion", "promo_weeks", "base_weeks", "base_avg", "promo_avg",
+           "lift_pct", "ci_low_pct", "ci_high_pct", "significant"]
+
+
+def promotion_label(combination: int) -> str:
+    """'TPR', 'FEATURE+DISPLAY'... for a combination index (0 is the baseline: no promotion)."""
+    return "+".join(label for bit, (_, label) in enumerate(PROMO_FLAGS) if combination >> bit & 1) or "NONE"
+
+
+_LABELS = [promotion_label(combination) for combination in range(8)]
+
+
+# --- Computation ---
+
+@dataclass(frozen=True)
+class UpliftTable:
+    """Lift of every promotion combination over the no-promotion baseline, per product and geography."""
+    rows: list     # One row per HEADERS, for every combination with enough weeks on both sides
+    version: object
+    computed_at: float
+    cells: int     # (product, geography, combination) cells read from the warehouse
+
+
+def compute_uplift(cells: list, confidence: float = 0.95, min_weeks: int = 3) -> list:
+    """
+    Computes the lift rows from per-cell sufficient statistics, in one vectorized pass.
+
+    `cells` are (product, geography, is_tpr, is_feature, is_display, weeks,
+    sum, sum of squares) tuples. Every (product, geography) pair, and every
+    product over all geographies, gets a row per promotion combination with
+    at least `min_weeks` weeks both with it and without any promotion,
+    sorted by product, geography (ALL first) and lift.
+
+    The lift is promo_avg / base_avg - 1. Its confidence interval comes from
+    the delta-method standard error of the log ratio of the two means,
+    sqrt(var_promo / (n_promo * promo_avg^2) + var_base / (n_base * base_avg^2)),
+    so it stays above -100%. A lift is significant when the interval excludes 0.
+    """
+    import numpy as np
+
+    if not cells:
+        return []
+    products = sorted({cell[0] for cell in cells})
+    geographies = sorted({cell[1] for cell in cells})
+    product_positions = {product: i for i, product in enumerate(products)}
+    geography_positions = {geography: i + 1 for i, geography in enumerate(geographies)} # 0 is ALL_GEOGRAPHIES
+    product_index = np.array([product_positions[cell[0]] for cell in cells])
+    geography_index = np.array([geography_positions[cell[1]] for cell in cells])
+    flags = np.array([cell[2:5] for cell in cells], dtype=float)
+    combination = (np.nan_to_num(flags) > 0).astype(int) @ np.array([1, 2, 4])
+    stats = np.array([cell[5:8] for cell in cells], dtype=float)
+
+    # Sufficient statistics per (product, geography incl. ALL, combination): weeks, sum, sum of squares
+    groups = len(geographies) + 1
+    totals = np.zeros((len(products), groups, 8, 3))
+    np.add.at(totals, (product_index, geography_index, combination), stats)
+    np.add.at(totals, (product_index, 0, combination), stats)
+
+    weeks, sums, squares = totals[..., 0], totals[..., 1], totals[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / weeks
+        variances = np.maximum(squares - sums * means, 0) / (weeks - 1)
+        base_weeks, base_mean, base_var = weeks[..., :1], means[..., :1], variances[..., :1]
+        ratio = means / base_mean
+        log_se = np.sqrt(variances / (weeks * means ** 2) + base_var / (base_weeks * base_mean ** 2))
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    low, high = ratio * np.exp(-z * log_se), ratio * np.exp(z * log_se)
+    valid = (weeks >= min_weeks) & (base_weeks >= min_weeks) & (base_mean > 0) & (means > 0)
+    valid[..., 0] = False
+
+    p, g, c = np.nonzero(valid)
+    names = [ALL_GEOGRAPHIES] + geographies
+    lift, lift_low, lift_high = (ratio[p, g, c] - 1) * 100, (low[p, g, c] - 1) * 100, (high[p, g, c] - 1) * 100
+    rows = [list(row) for row in zip(
+        [products[i] for i in p.tolist()], [names[i] for i in g.tolist()], [_LABELS[i] for i in c.tolist()],
+        weeks[p, g, c].astype(int).tolist(), base_weeks[p, g, 0].astype(int).tolist(),
+        base_mean[p, g, 0].tolist(), means[p, g, c].tolist(),
+        lift.tolist(), lift_low.tolist(), lift_high.tolist(), ((lift_low > 0) | (lift_high < 0)).tolist(),
+    )]
+    # Per product: all geographies first, then each geography, best lift first
+    rows.sort(key=lambda row: (row[0], row[1] != ALL_GEOGRAPHIES, row[1], -row[7]))
+    return rows
+
+
+# --- Engine ---
+
+class UpliftEngine:
+    """
+    Keeps the promotion lift table of the weekly promo table, recomputing it when the table changes.
+
+    The warehouse does the heavy part in one scan, grouping the table into
+    per-cell weeks, sums and sums of squares; `compute_uplift` derives every
+    lift and interval from those. The result is kept until the table's data
+    version changes (or for `max_age` seconds when the backend reports no
+    version). The version is looked up at most every `refresh_interval`
+    seconds, like the rollups and forecasts, so most calls make no warehouse
+    round trip at all.
+    """
+
+    def __init__(self, backend_getter=get_backend, table=WEEKLY_PROMO_SALES, confidence: float = 0.95,
+                 min_weeks: int = 3, max_age: float = UPLIFT_MAX_AGE_SECONDS,
+                 refresh_interval: float = UPLIFT_REFRESH_SECONDS):
+        self._backend_getter = backend_getter
+        self.table = table
+        self.confidence = confidence
+        self.min_weeks = min_weeks
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self._current = None
+        self._checked_at = None # When the table version was last looked up
+        self._lock = threading.Lock()
+        self.computations = 0
+
+    def _cells_sql(self) -> str:
+        flags = ", ".join(flag for flag, _ in PROMO_FLAGS)
+        value = self.table.value_column
+        return (
+            f"SELECT {self.table.product_column}, {self.table.geography_column}, {flags}, "
+            f"COUNT({value}), SUM({value}), SUM({value} * {value}) "
+            f"FROM `{self.table.name}` GROUP BY {self.table.product_column}, {self.table.geography_column}, {flags}"
+        )
+
+    def _is_current(self, version) -> bool:
+        current = self._current
+        if current is None:
+            return False
+        if version is not None:
+            return version == current.version
+        return time.monotonic() - current.computed_at < self.max_age
+
+    def uplift(self) -> UpliftTable:
+        """Returns the lift table, computing it first if the promo table changed since."""
+        checked_at = self._checked_at
+        if self._current is not None and checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+            telemetry.metrics.inc("promo_uplift_lookups_total", source="cache")
+            return self._current
+        backend = self._backend_getter()
+        version = backend.table_version(self.table.name)
+        self._checked_at = time.monotonic()
+        if self._is_current(version):
+            telemetry.metrics.inc("promo_uplift_lookups_total", source="cache")
+            return self._current
+        with self._lock:
+            # Another caller may have computed it while this one waited
+            if self._is_current(version):
+                telemetry.metrics.inc("promo_uplift_lookups_total", source="cache")
+                return self._current
+            with telemetry.span("promo_uplift.compute", table=self.table.name) as span:
+                _, cells = backend.run(self._cells_sql(), None)
+                rows = compute_uplift(cells, self.confidence, self.min_weeks)
+                span.set(cells=len(cells), rows=len(rows))
+            self._current = UpliftTable(rows, version, time.monotonic(), len(cells))
+            self.computations += 1
+        telemetry.metrics.inc("promo_uplift_lookups_total", source="computed")
+        return self._current
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "computations": self.computations,
+            "rows": len(current.rows) if current else 0,
+            "cells": current.cells if current else 0,
+            "version": str(current.version) if current else None,
+        }
+
+
+uplift_engine = UpliftEngine()
+
+
+# --- Define the Promotion Uplift Tool ---
+
+def analyze_promotion_uplift(product: str = "", geography: str = "", promotion: str = "") -> str:
+    """
+    Returns how much each promotion type lifts weekly sales over weeks without any promotion.
+    Use this for promotion strategy, "which promotion works best" and uplift questions instead of
+    writing queries that compare AVG(daily_weekly_value_sales) by is_tpr, is_feature and is_display.
+    Covers every product (promoted_group) over all geographies together (geography 'ALL') and in each
+    geography (retailer_banner_geography), for every combination of TPR, FEATURE and DISPLAY.
+
+    Args:
+        product (str, optional): Only this product, e.g. 'FACE CREAM'. Defaults to all products.
+        geography (str, optional): 'ALL' (the default) for all geographies together, one geography
+                                   e.g. 'LONDON', or 'EACH' for every geography separately.
+        promotion (str, optional): Only combinations including this promotion: 'TPR', 'FEATURE' or
+                                   'DISPLAY'. Defaults to all combinations.
+
+    Returns:
+        str: CSV rows of product, geography, promotion, promo_weeks, base_weeks, base_avg, promo_avg,
+             lift_pct with its 95% confidence interval (ci_low_pct, ci_high_pct) and whether the lift is
+             significant, sorted by lift; or an error message.
+    """
+    with telemetry.span("tool.analyze_promotion_uplift", product=product, geography=geography, promotion=promotion) as span:
+        try:
+            table = uplift_engine.uplift()
+        except QueryBackendError as e:
+            span.set(error=str(e))
+            telemetry.metrics.inc("tool_calls_total", tool="analyze_promotion_uplift", source="error")
+            return str(e)
+
+        product_name = uplift_engine.table.product_names().get(product.strip().lower(), product.strip()) if product else ""
+        # One row per product and promotion by default: every geography of every product does not fit a tool result
+        geography = geography.strip().upper() or ALL_GEOGRAPHIES
+        rows = [
+            row for row in table.rows
+            if (not product_name or row[0].lower() == product_name.lower())
+            and (geography == EACH_GEOGRAPHY or row[1].upper() == geography)
+            and (not promotion or promotion.strip().upper() in row[2].split("+"))
+        ]
+        span.set(rows_returned=len(rows))
+    telemetry.metrics.inc("tool_calls_total", tool="analyze_promotion_uplift", source="uplift")
+    if not rows:
+        return (f"No promotion uplift found for the given filters. Products: {', '.join(uplift_engine.table.products)}; "
+                f"promotions: TPR, FEATURE, DISPLAY. Combinations with fewer than {uplift_engine.min_weeks} weeks are left out.")
+    return encode_rows(HEADERS, rows)
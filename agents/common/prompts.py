@@ -0,0 +1,223 @@
+import hashlib
+import os
+from dataclasses import dataclass
+
+from google.genai import types
+
+from common.routing import CALENDAR_KEYWORDS, KeywordAutomaton
+from common.telemetry import telemetry
+
+
+# Send only the guideline sections a conversation needs (set PROMPT_TRIMMING_ENABLED=false to always send all of them)
+PROMPT_TRIMMING_ENABLED = os.environ.get("PROMPT_TRIMMING_ENABLED", "true").lower() != "false"
+
+
+# --- Sections ---
+
+@dataclass(frozen=True)
+class Section:
+    """Guidance sent only when the conversation mentions one of its keywords (or several products, if `multi_product`)."""
+    name: str
+    text: str
+    keywords: tuple = ()
+    multi_product: bool = False
+
+
+SQL_GUIDELINES = (
+    "Always use the fully qualified table name: `{table}`.",
+    "For date filtering, use `PARSE_DATE('%Y-%m-%d', 'YYYY-MM-DD')` or date functions like `DATE_TRUNC`, `CURRENT_DATE()`, `EXTRACT`.",
+    "Always `GROUP BY` and `ORDER BY` appropriately when using aggregate functions.",
+    "Assume you are always asking about revenue, if not specified.",
+    "Consider the user's question, and respond concisely based on the query results.",
+    "If the query result is empty, clearly state that no data was found.",
+)
+
+SQL_SECTIONS = (
+    Section("sum", 'If a question asks for "total" or "sum", use `SUM()`.',
+            ("total", "totals", "sum", "overall", "combined", "altogether")),
+    Section("average", 'If a question asks for "average", use `AVG()`.',
+            ("average", "averages", "avg", "mean", "typical", "per month", "per week")),
+    Section("count", 'If a question asks for "count", use `COUNT()`.',
+            ("count", "how many", "number of")),
+    Section("top", 'If a question asks for "top" or "highest", use `ORDER BY` and `LIMIT`.',
+            ("top", "highest", "best", "most", "largest", "biggest", "lowest", "least", "worst", "bottom", "rank", "ranking")),
+    Section("batch", "When a question needs several independent queries, run them in one `execute_bigquery_queries` call instead of one after another.",
+            ("compare", "comparison", "versus", "vs", "both", "each", "respectively", "difference", "breakdown"),
+            multi_product=True),
+)
+
+UPLIFT_SECTION = Section(
+    "uplift",
+    "For promotion strategy and uplift questions, call `analyze_promotion_uplift` once instead of comparing "
+    "`AVG()` of sales by `is_tpr`, `is_feature` and `is_display` with your own queries. Recommend only lifts "
+    "marked significant, and mention their confidence intervals. It reports all geographies together unless you "
+    "pass one geography, or 'EACH' for a per-geography breakdown.",
+    ("promotion", "promotions", "promo", "promos", "uplift", "lift", "strategy", "tpr", "feature", "display",
+     "price reduction", "works best", "plan"),
+)
+
+FORECAST_SECTION = Section(
+    "forecast",
+    "For questions about future sales, call `forecast_sales` instead of querying past months and "
+    "extrapolating them yourself. Give the forecast with its interval, and say which month the data ends with.",
+    ("forecast", "forecasts", "predict", "prediction", "projection", "expect", "expected",
+     "next month", "next quarter", "next year", "coming months", "will sell", "future"),
+)
+
+CALENDAR_SECTION = Section(
+    "calendar",
+    "You can also **Manage Google Calendar:** You can `create_calendar_event` and `list_upcoming_events`.\n"
+    "    -   When creating events, ensure you get all necessary details (summary, start time, end time).\n"
+    '    -   Tell the user the exact formats for dates and times (ISO 8601: "YYYY-MM-DDTHH:MM:SS" or "YYYY-MM-DD").\n'
+    "    -   Assume event times are in UTC unless specified.",
+    CALENDAR_KEYWORDS + ("book", "remind", "invite", "slot", "available", "availability"),
+)
+
+RESPONSE_GUIDELINES = """When responding:
+-   Be helpful and informative.
+-   If you perform a task (like creating an event or listing details), confirm it to the user.
+-   If you need more information, ask clarifying questions."""
+
+
+# --- Compiler ---
+
+class PromptCompiler:
+    """
+    Builds an agent's instructions from its table in the schema registry.
+
+    The instruction (`prefix`) holds what every request needs: the table, its
+    columns and the core SQL guidelines. It is the same on every turn, and
+    ADK's identity and transfer instructions and the tool declarations that
+    follow it are too, so the system instruction and tools form a stable
+    prefix the model provider can cache across requests.
+
+    The optional sections (aggregate hints, batching, calendar) are added by
+    `before_model_callback` only when the conversation calls for them, and
+    after the user's question rather than in the system instruction, so they
+    never break that prefix.
+    """
+
+    def __init__(self, agent_name: str, table, sections: tuple = SQL_SECTIONS, closing: str = "",
+                 trim: bool = PROMPT_TRIMMING_ENABLED):
+        self.agent_name = agent_name
+        self.table = table
+        self.sections = tuple(sections)
+        self.trim = trim
+        self.prefix = self._compile_prefix(closing)
+        self.prefix_id = hashlib.sha256(self.prefix.encode()).hexdigest()[:12]
+        self._keywords = KeywordAutomaton(
+            {keyword: section.name for section in self.sections for keyword in section.keywords}
+        )
+        self._products = KeywordAutomaton(table.product_names())
+
+    def _compile_prefix(self, closing: str) -> str:
+        columns = "\n".join(f"  - `{column.name}` ({column.type}): {column.description}" for column in self.table.columns)
+        guidelines = "\n".join(f"{i}. {text.format(table=self.table.name)}" for i, text in enumerate(SQL_GUIDELINES, 1))
+        prefix = (
+            f"You have access to the following BigQuery table:\n"
+            f"Table: `{self.table.name}`\n\n"
+            f"Columns:\n{columns}\n\n"
+            f"Guidelines for generating SQL:\n{guidelines}"
+        )
+        return f"{prefix}\n\n{closing}" if closing else prefix
+
+    def select(self, text: str) -> list:
+        """The optional sections `text` calls for, in their declared order (all of them when trimming is off)."""
+        if not self.trim:
+            return list(self.sections)
+        names = {name for _, name, _ in self._keywords.find(text)}
+        products = {product for _, product, _ in self._products.find(text)}
+        return [section for section in self.sections
+                if section.name in names or (section.multi_product and len(products) > 1)]
+
+    def guidance(self, text: str) -> str:
+        """The optional guidance for `text`, or an empty string when it needs none."""
+        return self._render(self.select(text))
+
+    @staticmethod
+    def _render(sections: list) -> str:
+        if not sections:
+            return ""
+        return "Additional guidelines for this question:\n" + "\n".join(
+            section.text if "\n" in section.text else f"- {section.text}" for section in sections
+        )
+
+    def compile(self, text: str) -> str:
+        """The full instruction text for `text`: the prefix followed by its guidance."""
+        guidance = self.guidance(text)
+        return f"{self.prefix}\n\n{guidance}" if guidance else self.prefix
+
+    def instruction(self, readonly_context) -> str:
+        """ADK `InstructionProvider`: the stable prefix (which also skips session state injection into it)."""
+        return self.prefix
+
+    def before_model_callback(self, callback_context, llm_request):
+        """
+        ADK `before_model_callback`: adds the guidance the conversation needs after the user's question.
+
+        The sections are chosen from every user message in the request, so a
+        follow-up ("yes, book it for Monday") keeps the guidance of the turns
+        before it. Only this request is changed, never the session history.
+        """
+        user_texts = [
+            part.text
+            for content in llm_request.contents if content.role == "user"
+            for part in content.parts or [] if part.text
+        ]
+        sections = self.select(" ".join(user_texts))
+        for section in sections:
+            telemetry.metrics.inc("prompt_sections_total", agent=self.agent_name, section=section.name)
+        if not sections:
+            return None
+        guidance = types.Part(text=self._render(sections))
+        question = _question_content(llm_request.contents, callback_context.user_content)
+        if question is not None:
+            question.parts = list(question.parts) + [guidance]
+        elif llm_request.contents and llm_request.contents[-1].role == "user":
+            llm_request.contents[-1].parts = list(llm_request.contents[-1].parts or []) + [guidance]
+        else:
+            llm_request.contents.append(types.Content(role="user", parts=[guidance]))
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "prefix_id": self.prefix_id,
+            "prefix_chars": len(self.prefix),
+            "sections": [section.name for section in self.sections],
+            "trim": self.trim,
+        }
+
+
+def _question_content(contents: list, user_content):
+    """The content in `contents` holding this turn's question (the last user content with its text), or None."""
+    if user_content is None or not user_content.parts:
+        return None
+    question = [part.text for part in user_content.parts if part.text]
+    for content in reversed(contents):
+        if content.role == "user" and [part.text for part in content.parts or [] if part.text] == question:
+            return content
+    return None
+
+
+# --- Descriptions and Routing ---
+
+def table_agent_description(summary: str, table, extra: str = "") -> str:
+    """An agent description naming the products of its table, used by the steering agent to route."""
+    description = f"{summary} You have the access to data of following products: {', '.join(table.products)}."
+    return f"{description} {extra}" if extra else description
+
+
+def steering_instruction(calendar_agent: str) -> str:
+    """
+    The steering agent's instruction.
+
+    Products are not listed here: ADK already sends the sub-agents'
+    descriptions, which name them, with every steering request.
+    """
+    return f"""
+You have the access to the sub-agents listed below; each one has the data of the products named in its description.
+Depending on which product the user asks about, forward the task to the agent that has its data.
+Additionally, {calendar_agent} has the access to calendar so any asks concerning calendar should be forwarded to {calendar_agent}.
+Return only the final answer from the agent that contain the response to the user question.
+If the task requires planning, execute all the steps and only return the final answer.
+"""
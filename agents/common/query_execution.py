@@ -0,0 +1,197 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.backends import QueryBackendError, get_backend
+from common.query_guard import QueryGuard, QueryRejectedError
+from common.result_cache import ResultCache, normalize_sql
+from common.result_encoding import encode_rows
+from common.rollups import RollupRouter, RollupStore
+from common.singleflight import SingleFlight
+from common.telemetry import telemetry
+
+
+# Rows fetched per query; encode_rows fits them into the result token budget, summarising when needed
+MAX_RESULT_ROWS = int(os.environ.get("RESULT_MAX_ROWS") or 1000)
+
+# `execute_bigquery_queries` limits: statements per call, queries running at once, seconds per query
+MAX_BATCH_QUERIES = int(os.environ.get("QUERY_BATCH_MAX") or 10)
+QUERY_CONCURRENCY = int(os.environ.get("QUERY_CONCURRENCY") or 8)
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("QUERY_TIMEOUT_SECONDS") or 60)
+
+# Shared by all batch calls, so concurrent sessions together never run more than QUERY_CONCURRENCY queries
+_query_pool = ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix="bigquery-query")
+
+# Formatted results of repeated queries, invalidated when a table's data version changes
+result_cache = ResultCache(version_source=lambda table_name: get_backend().table_version(table_name))
+
+# Identical queries arriving while one runs wait for it instead of starting their own job
+# (set SINGLEFLIGHT_ENABLED=false to disable)
+query_flight = None
+if os.environ.get("SINGLEFLIGHT_ENABLED", "true").lower() != "false":
+    query_flight = SingleFlight("bigquery_query")
+
+# Rewrites warehouse queries to scan less and rejects those over the GUARD_* cost budgets
+query_guard = QueryGuard.from_env(max_rows=MAX_RESULT_ROWS)
+
+# Aggregates the rollup cubes can answer never reach the warehouse (set ROLLUPS_ENABLED=false to disable)
+rollup_router = None
+if os.environ.get("ROLLUPS_ENABLED", "true").lower() != "false":
+    rollup_router = RollupRouter(RollupStore(get_backend))
+
+
+# --- Result Formatting ---
+
+def format_rows(headers: list, rows: list) -> str:
+    """
+    Formats query results as CSV text for the LLM.
+
+    The output lines are written into a list sized up front and joined once,
+    instead of growing a string row by row.
+    """
+    lines = [None] * (len(rows) + 1)
+    lines[0] = ",".join(headers)
+    for i, row in enumerate(rows, start=1):
+        lines[i] = ",".join([str(value) for value in row])
+    return "\n".join(lines) + "\n"
+
+
+# --- Define the BigQuery Tool ---
+
+def execute_bigquery_query(sql_query: str) -> str:
+    """
+    Executes a BigQuery SQL query and returns the results.
+    The query must be a valid BigQuery SELECT statement.
+    Results are returned as CSV. Numbers are rounded, and values shared by all rows or repeated
+    across rows are written once with a legend. Large results are summarised: the row count,
+    statistics of each numeric column, and the first and last rows.
+
+    Args:
+        sql_query (str): The BigQuery SQL query to execute. MUST be a SELECT statement.
+                         Always include the full table path, e.g., `your-gcp-project-id.sales_analyst_mvp.monthly_sales_data`.
+
+    Returns:
+        str: A compact representation of the query results, or an error message.
+    """
+    return _traced_query(sql_query, "execute_bigquery_query")
+
+
+async def execute_bigquery_queries(sql_queries: list[str]) -> str:
+    """
+    Executes several independent BigQuery SQL queries at the same time and returns all their results.
+    Use this instead of calling `execute_bigquery_query` repeatedly when a question needs more than
+    one query (e.g. one query per product, period or promotion being compared).
+    Each query must be a valid BigQuery SELECT statement; results have the same format as
+    `execute_bigquery_query`.
+
+    Args:
+        sql_queries (list[str]): The BigQuery SQL queries to execute, at most 10. Each MUST be a SELECT statement
+                                 with the full table path.
+
+    Returns:
+        str: The result of each query in order, under a "Query <n>:" heading. A failed or timed out query
+             reports its error without affecting the others.
+    """
+    if not sql_queries:
+        return "ERROR: No queries were given."
+    if len(sql_queries) > MAX_BATCH_QUERIES:
+        return f"ERROR: At most {MAX_BATCH_QUERIES} queries can be run in one call, got {len(sql_queries)}."
+
+    with telemetry.span("tool.execute_bigquery_queries", queries=len(sql_queries)):
+        # Identical statements run once
+        unique = list(dict.fromkeys(sql_queries))
+        results = await asyncio.gather(*(_run_with_timeout(sql_query) for sql_query in unique))
+    by_query = dict(zip(unique, results))
+    return "\n".join(f"Query {i}:\n{by_query[sql_query].rstrip()}\n" for i, sql_query in enumerate(sql_queries, start=1))
+
+
+async def _run_with_timeout(sql_query: str) -> str:
+    """Runs one batch query on the shared pool; the timeout counts from submission, so it includes any wait for a worker."""
+    deadline = time.monotonic() + QUERY_TIMEOUT_SECONDS
+    # Run in a copy of the caller's context, so the query span nests under the batch span
+    future = _query_pool.submit(contextvars.copy_context().run, _traced_query, sql_query, "execute_bigquery_queries",
+                                deadline)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), QUERY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # A query still waiting for a worker is cancelled; a running one is cancelled by its backend at the
+        # same deadline, which frees its worker
+        telemetry.metrics.inc("tool_calls_total", tool="execute_bigquery_queries", source="timeout")
+        return f"ERROR: The query did not finish within {QUERY_TIMEOUT_SECONDS:g} seconds."
+
+
+def _traced_query(sql_query: str, tool: str, deadline: float = None) -> str:
+    with telemetry.span("tool.execute_bigquery_query", sql=sql_query) as span:
+        if query_flight is None:
+            result_str, source = _execute_query(sql_query, span, deadline)
+        else:
+            (result_str, source), shared = query_flight.do(normalize_sql(sql_query), _execute_query, sql_query, span,
+                                                           deadline)
+            if shared:
+                span.set(coalesced=True, source=source)
+    telemetry.metrics.inc("tool_calls_total", tool=tool, source=source)
+    return result_str
+
+
+def _execute_query(sql_query: str, span, deadline: float = None):
+    """
+    Runs `execute_bigquery_query`; returns the result text and where it came from (cache, rollup, backend or error).
+
+    Cached answers scan nothing; the rest go through `fetch_rows`, cancelled
+    at `deadline` (a `time.monotonic()` value) if given.
+    """
+    try:
+        # Basic validation to ensure it's a SELECT statement for safety
+        if not sql_query.strip().upper().startswith("SELECT"):
+            return "ERROR: Only SELECT queries are allowed for security reasons.", "rejected"
+
+        cached_result = result_cache.get(sql_query)
+        if cached_result is not None:
+            span.set(source="cache", result_bytes=len(cached_result))
+            return cached_result, "cache"
+
+        headers, rows, notes, source = fetch_rows(sql_query, deadline)
+        if not rows:
+            result_str = "Query executed successfully, but no results were found."
+        else:
+            result_str = encode_rows(headers, rows, truncated=len(rows) >= MAX_RESULT_ROWS)
+        if notes:
+            result_str = "\n".join([result_str.rstrip("\n")] + notes) + "\n"
+
+        result_cache.put(sql_query, result_str)
+        span.set(source=source, rows_returned=len(rows), result_bytes=len(result_str))
+        telemetry.metrics.inc("query_rows_returned_total", len(rows), source=source)
+        return result_str, source
+
+    except QueryRejectedError as e:
+        span.set(error=str(e))
+        return str(e), "rejected"
+    except QueryBackendError as e:
+        span.set(error=str(e))
+        return str(e), "error"
+    except Exception as e:
+        span.set(error=str(e))
+        return f"An unexpected error occurred during query execution: {e}", "error"
+
+
+def fetch_rows(sql_query: str, deadline: float = None):
+    """
+    Runs a query from the rollup cubes or, failing that, the warehouse; returns (headers, rows, notes, source).
+
+    Only queries that reach the warehouse go through the query guard: rollup
+    answers scan nothing. `notes` lists the guard's rewrites. A warehouse
+    query still running at `deadline` (a `time.monotonic()` value) is
+    cancelled. Raises QueryRejectedError or QueryBackendError.
+    """
+    rollup_result = rollup_router.answer(sql_query, MAX_RESULT_ROWS) if rollup_router else None
+    if rollup_result is not None:
+        headers, rows = rollup_result
+        return headers, rows, [], "rollup"
+    guarded_sql, notes = query_guard.rewrite(sql_query)
+    query_guard.check_cost(guarded_sql)
+    backend = get_backend()
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    headers, rows = backend.run(guarded_sql, MAX_RESULT_ROWS, timeout)
+    return headers, rows, notes, backend.name
@@ -0,0 +1,165 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from common.backends import get_backend
+from common.schema import find_table
+from common.sql_parsing import SelectItem, mask_literals, parse_select, split_conjuncts, strip_comments
+from common.telemetry import telemetry
+
+
+DEFAULT_MAX_BYTES = 1 << 30 # 1 GiB per query
+
+_AGGREGATE = re.compile(r"\b(?:SUM|COUNT|COUNTIF|AVG|MIN|MAX|ANY_VALUE|STRING_AGG|ARRAY_AGG)\s*\(", re.IGNORECASE)
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+\d+(?:\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+
+
+class QueryRejectedError(Exception):
+    """Raised when a query would scan more than the configured budgets allow."""
+    pass
+
+
+def format_bytes(count: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if count < 1024 or unit == "GiB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+class QueryGuard:
+    """
+    Rewrites generated queries to scan less, and rejects those over the cost budgets.
+
+    `rewrite` expands `SELECT *` to the registered columns, adds a `LIMIT`, adds
+    a date range next to `EXTRACT(YEAR FROM date) = N` filters so BigQuery can
+    prune date partitions and, when `date_window_days` is set, restricts
+    unbounded row listings without a date filter to the last N days. `check_cost` dry-runs
+    the query and enforces `max_bytes` per query and `max_bytes_per_hour` over
+    a rolling hour.
+    """
+
+    def __init__(self, backend_getter=get_backend, max_rows: int = 1000, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_bytes_per_hour: int = None, date_window_days: int = None, dry_run: bool = True):
+        self.backend_getter = backend_getter
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_bytes_per_hour = max_bytes_per_hour
+        self.date_window_days = date_window_days
+        self.dry_run = dry_run
+        self._scanned = deque() # (time, estimated bytes) of the queries run in the last hour
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, max_rows: int = 1000):
+        optional_int = lambda name: int(os.environ[name]) if os.environ.get(name) else None
+        return cls(
+            max_rows=max_rows,
+            max_bytes=optional_int("GUARD_MAX_BYTES") or DEFAULT_MAX_BYTES,
+            max_bytes_per_hour=optional_int("GUARD_MAX_BYTES_PER_HOUR"),
+            date_window_days=optional_int("GUARD_DATE_WINDOW_DAYS"),
+            dry_run=os.environ.get("GUARD_DRY_RUN", "true").lower() != "false",
+        )
+
+    # --- Rewrites ---
+
+    def rewrite(self, sql_query: str):
+        """
+        Returns the rewritten query and notes for the model about rewrites that change the result.
+
+        Queries the parser does not understand only get a `LIMIT`. Comments are
+        dropped, so none can swallow the clauses the guard adds.
+        """
+        sql_query = strip_comments(sql_query).strip().rstrip(";").strip()
+        query = parse_select(sql_query)
+        table = find_table(query.table) if query else None
+        if table is None:
+            if _TRAILING_LIMIT.search(mask_literals(sql_query)):
+                return sql_query, []
+            telemetry.current_span().set(rewrites=["limit"])
+            return f"{sql_query}\nLIMIT {self.max_rows}", []
+
+        rewrites, notes = [], []
+        items = []
+        for item in query.items:
+            star = re.fullmatch(r"(?:(\w+)\.)?\*", item.expression)
+            if star:
+                prefix = f"{star.group(1)}." if star.group(1) else ""
+                items.extend(SelectItem(prefix + name) for name in table.column_names)
+                rewrites.append("expand_star")
+            else:
+                items.append(item)
+        query.items = items
+
+        date_column = table.date_column
+        conjuncts = []
+        if query.where:
+            # A condition with a top-level OR is kept whole
+            conjuncts = split_conjuncts(query.where) or [f"({query.where})"]
+        years = [
+            int(match.group(1)) for match in (
+                re.fullmatch(rf"EXTRACT\s*\(\s*YEAR\s+FROM\s+{date_column}\s*\)\s*=\s*(\d{{4}})", conjunct, re.IGNORECASE)
+                for conjunct in conjuncts
+            ) if match
+        ]
+        if len(years) == 1:
+            year = years[0]
+            conjuncts.append(f"{date_column} BETWEEN '{year}-01-01' AND '{year}-12-31'")
+            rewrites.append("partition_filter")
+
+        mentions_date = any(re.search(rf"\b{date_column}\b", mask_literals(c), re.IGNORECASE) for c in conjuncts)
+        aggregated = query.group_by or any(_AGGREGATE.search(mask_literals(item.expression)) for item in query.items)
+        # Only unbounded row listings are windowed: a top-N or an aggregate needs every period
+        if self.date_window_days and not mentions_date and not aggregated and query.limit is None:
+            conjuncts.append(f"{date_column} >= DATE_SUB(CURRENT_DATE(), INTERVAL {self.date_window_days} DAY)")
+            rewrites.append("date_window")
+            notes.append(f"Note: only rows from the last {self.date_window_days} days were read; "
+                         f"filter on {date_column} to query other periods.")
+        query.where = " AND ".join(conjuncts) or None
+
+        # A global aggregate returns a single row and needs no LIMIT
+        if (query.group_by or not aggregated) and (query.limit is None or query.limit > self.max_rows):
+            query.limit = self.max_rows
+            rewrites.append("limit")
+
+        if rewrites:
+            telemetry.current_span().set(rewrites=rewrites)
+        return query.to_sql(), notes
+
+    # --- Cost Budgets ---
+
+    def check_cost(self, sql_query: str):
+        """
+        Dry-runs the query and raises QueryRejectedError when it is over a budget.
+
+        Returns the estimated bytes, or None when the backend cannot estimate them.
+        """
+        if not self.dry_run:
+            return None
+        estimated = self.backend_getter().dry_run(sql_query)
+        if estimated is None:
+            return None
+        telemetry.current_span().set(estimated_bytes=estimated)
+
+        if estimated > self.max_bytes:
+            telemetry.metrics.inc("query_guard_rejections_total", reason="query_budget")
+            raise QueryRejectedError(
+                f"ERROR: Query would scan {format_bytes(estimated)}, over the {format_bytes(self.max_bytes)} limit per query. "
+                "Select only the columns you need and filter on a date range or product."
+            )
+
+        with self._lock:
+            now = time.monotonic()
+            while self._scanned and self._scanned[0][0] < now - 3600:
+                self._scanned.popleft()
+            scanned = sum(count for _, count in self._scanned)
+            if self.max_bytes_per_hour and scanned + estimated > self.max_bytes_per_hour:
+                telemetry.metrics.inc("query_guard_rejections_total", reason="hourly_budget")
+                raise QueryRejectedError(
+                    f"ERROR: Query would scan {format_bytes(estimated)}, but only "
+                    f"{format_bytes(max(0, self.max_bytes_per_hour - scanned))} of the hourly scan budget is left. "
+                    "Answer from earlier results, or narrow the query to fewer columns and a shorter date range."
+                )
+            self._scanned.append((now, estimated))
+        return estimated
@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from common.schema import MONTHLY_SALES, WEEKLY_PROMO_SALES
+
+
+DEFAULT_TTL_SECONDS = 15 * 60
+# Both tables are refreshed rarely (monthly / weekly loads), so results can live for hours
+TABLE_TTL_SECONDS = {
+    MONTHLY_SALES.name: 6 * 60 * 60,
+    WEEKLY_PROMO_SALES.name: 60 * 60,
+}
+MAX_ENTRIES = 512
+VERSION_CHECK_INTERVAL_SECONDS = 60
+
+_TOKEN = re.compile(
+    r"(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)"
+    r"|(?P<string>'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")"
+    r"|(?P<quoted>`[^`]*`)"
+    r"|(?P<number>\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b)"
+    r"|(?P<word>\w+)"
+    r"|(?P<space>\s+)"
+    r"|(?P<symbol>.)",
+    re.DOTALL,
+)
+_TABLE_NAME = re.compile(r"`([\w-]+\.\w+\.\w+)`")
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Returns a canonical form of `sql_query` used as the cache key.
+
+    Comments and redundant whitespace are dropped, keywords and unquoted
+    identifiers are lower-cased, string literals use single quotes and numeric
+    literals are written in a single format (so `2023.0` and `2023` match).
+    Backticked names and string contents keep their case.
+    """
+    tokens = []
+    for match in _TOKEN.finditer(sql_query.strip().rstrip(";")):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind == "string":
+            text = "'" + text[1:-1].replace("'", "\\'") + "'" if text[0] == '"' else text
+        elif kind == "number":
+            text = format(Decimal(text).normalize(), "f")
+        elif kind == "word":
+            text = text.lower()
+        tokens.append(text)
+    return " ".join(tokens)
+
+
+def referenced_tables(sql_query: str) -> set:
+    """Returns the fully qualified (backticked) table names a query reads."""
+    return set(_TABLE_NAME.findall(sql_query))
+
+
+class ResultCache:
+    """
+    A bounded LRU cache of formatted query results.
+
+    Entries expire after the shortest TTL of the tables they read, and are
+    dropped as soon as the data version of one of those tables changes.
+    `version_source(table_name)` returns the current data version of a table
+    (or None when unknown); it is called at most once per table every
+    `version_check_interval` seconds, and never while holding the lock, so a
+    slow lookup (a network call) does not stall other threads' lookups.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, table_ttls: dict = None,
+                 default_ttl: float = DEFAULT_TTL_SECONDS, version_source=None,
+                 version_check_interval: float = VERSION_CHECK_INTERVAL_SECONDS):
+        self.max_entries = max_entries
+        self.table_ttls = TABLE_TTL_SECONDS if table_ttls is None else table_ttls
+        self.default_ttl = default_ttl
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _table_version(self, table: str, now: float):
+        """Called without the lock; only storing the looked up version takes it."""
+        if self.version_source is None:
+            return None
+        with self._lock:
+            version, checked_at = self._versions.get(table, (None, None))
+        if checked_at is None or now - checked_at >= self.version_check_interval:
+            try:
+                version = self.version_source(table)
+            except Exception as e:
+                print(f"Could not read data version of {table}: {e}")
+                version = None
+            with self._lock:
+                self._versions[table] = (version, now)
+        return version
+
+    def _current_versions(self, tables, now: float) -> dict:
+        return {table: self._table_version(table, now) for table in tables}
+
+    def get(self, sql_query: str):
+        """Returns the cached result for `sql_query`, or None on a miss."""
+        key = normalize_sql(sql_query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, versions = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+        current = self._current_versions(versions, now)
+        with self._lock:
+            # The entry may have been replaced or dropped while the versions were looked up
+            still_cached = self._entries.get(key) is entry
+            if current != versions:
+                if still_cached:
+                    del self._entries[key]
+                    self.invalidations += 1
+                self.misses += 1
+                return None
+            if still_cached:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, sql_query: str, value: str):
+        """Stores the formatted result of `sql_query`."""
+        key = normalize_sql(sql_query)
+        tables = referenced_tables(sql_query)
+        ttl = min((self.table_ttls.get(table, self.default_ttl) for table in tables), default=self.default_ttl)
+        now = time.monotonic()
+        versions = self._current_versions(tables, now)
+        with self._lock:
+            self._entries[key] = (value, now + ttl, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_table(self, table: str):
+        """Drops every cached result that reads `table` (e.g. after a data load)."""
+        table = table.strip("`")
+        with self._lock:
+            self._versions.pop(table, None)
+            stale = [key for key, (_, _, versions) in self._entries.items() if table in versions]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,180 @@
+import csv
+import datetime
+import io
+import math
+import os
+import re
+from decimal import Decimal
+
+
+RESULT_TOKEN_BUDGET = int(os.environ.get("RESULT_TOKEN_BUDGET") or 800) # Tokens a tool result may use
+SIGNIFICANT_DIGITS = 4 # Digits kept for fractional numbers; integer digits are never dropped
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+_CODES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Identifiers are kept verbatim: the model quotes them back in SQL and answers
+_ID_COLUMN = re.compile(r"(?:^|_)id$|[a-z]Id$|ID$")
+_ID_VALUE = re.compile(r"[A-Za-z]{1,3}-?\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the model tokens of `text`: one per word, per group of up to three digits and per symbol.
+
+    This tracks how Gemini-style tokenizers split numbers, which dominate
+    query results, far better than a characters / 4 rule.
+    """
+    return len(_TOKEN.findall(text))
+
+
+# --- Values ---
+
+def format_number(value: float, significant_digits: int = SIGNIFICANT_DIGITS) -> str:
+    """Rounds `value` to `significant_digits`, keeping every integer digit, and drops trailing zeros."""
+    if value == 0:
+        return "0"
+    if not math.isfinite(value):
+        return str(value)
+    decimals = max(0, significant_digits - int(math.floor(math.log10(abs(value)))) - 1)
+    text = f"{value:.{decimals}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+class _Column:
+    """One result column as display strings, with the numbers behind them for statistics."""
+
+    def __init__(self, name: str, values: list, significant_digits: int):
+        self.name = name
+        self.numbers = None
+        self.is_text = all(isinstance(v, str) for v in values if v is not None)
+        if values and all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in values if v is not None):
+            present = [float(v) for v in values if v is not None]
+            if present:
+                self.numbers = present
+        self.values = [self._text(v, significant_digits) for v in values]
+        self.legend = None # code -> value, when dictionary encoded
+
+    @staticmethod
+    def _text(value, significant_digits: int) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return str(value).lower()
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, (float, Decimal)):
+            if isinstance(value, Decimal) and value == value.to_integral_value():
+                return str(int(value))
+            return format_number(float(value), significant_digits)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return str(value)
+
+    def is_constant(self) -> bool:
+        return len(set(self.values)) == 1
+
+    def is_identifier(self) -> bool:
+        return bool(_ID_COLUMN.search(self.name)) or all(_ID_VALUE.fullmatch(value) for value in self.values if value)
+
+    def dictionary_encode(self, free_codes: list):
+        """
+        Replaces repeated strings with one-letter codes when that makes the column shorter.
+
+        Only values longer than a code (more than one token) are replaced; the
+        others, and identifier columns ("ProductId", "P01"), stay as they are.
+        Codes are taken from (and removed from) `free_codes`, shared by every
+        column of a result, so one code never stands for two values, and none
+        is used that the column holds verbatim.
+        """
+        if not self.is_text or self.is_identifier():
+            return
+        value_tokens = {value: estimate_tokens(value) for value in set(self.values)}
+        encoded = sorted(value for value, tokens in value_tokens.items() if tokens > 1)
+        available = [code for code in free_codes if code not in value_tokens]
+        occurrences = [value for value in self.values if value_tokens[value] > 1]
+        if not encoded or len(encoded) > len(available) or len(encoded) * 2 > len(occurrences):
+            return
+        codes = dict(zip(encoded, available))
+        legend_cost = sum(value_tokens[value] + 3 for value in encoded) # 'A=value, '
+        saved = sum(value_tokens[value] - 1 for value in occurrences)
+        if saved <= legend_cost:
+            return
+        self.legend = {code: value for value, code in codes.items()}
+        self.values = [codes.get(value, value) for value in self.values]
+        for code in self.legend:
+            free_codes.remove(code)
+
+
+# --- Encoding ---
+
+def _csv_lines(headers: list, rows) -> list:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return buffer.getvalue().splitlines()
+
+
+def _stats_lines(columns: list) -> list:
+    lines = []
+    for column in columns:
+        if column.numbers is None:
+            continue
+        numbers = column.numbers
+        total = math.fsum(numbers)
+        lines.append(
+            f"{column.name}: min={format_number(min(numbers))}, max={format_number(max(numbers))}, "
+            f"mean={format_number(total / len(numbers))}, sum={format_number(total)}"
+        )
+    return lines
+
+
+def encode_rows(headers: list, rows: list, token_budget: int = None, truncated: bool = False,
+                significant_digits: int = SIGNIFICANT_DIGITS) -> str:
+    """
+    Encodes query results as compact text for the LLM, within `token_budget` tokens where possible.
+
+    Numbers are rounded to `significant_digits`, columns holding one value are
+    stated once, and repeated strings (e.g. product names) are replaced by
+    letter codes with a legend. Results that still do not fit are summarised:
+    row count, per-column statistics, then as many first and last rows as fit.
+    `truncated` says that `rows` is only the first part of the result.
+    """
+    token_budget = token_budget or RESULT_TOKEN_BUDGET
+    columns = [_Column(name, [row[i] for row in rows], significant_digits) for i, name in enumerate(headers)]
+
+    preamble = []
+    if len(rows) > 1:
+        constant = [column for column in columns if column.is_constant()]
+        if constant and len(constant) < len(columns):
+            preamble.append("All rows have " + ", ".join(f"{c.name}={c.values[0]}" for c in constant) + ".")
+            columns = [column for column in columns if column not in constant]
+    free_codes = list(_CODES)
+    for column in columns:
+        column.dictionary_encode(free_codes)
+        if column.legend:
+            preamble.append(f"{column.name} codes: " + ", ".join(f"{code}={value}" for code, value in column.legend.items()))
+
+    table = _csv_lines([column.name for column in columns], zip(*[column.values for column in columns]))
+    row_count = f"at least {len(rows)} rows (only the first {len(rows)} were fetched)" if truncated else f"{len(rows)} rows"
+    text = "\n".join(preamble + table) + "\n"
+    if not truncated and estimate_tokens(text) <= token_budget:
+        return text
+
+    # Summary: statistics over every fetched row, then the head and tail that fit
+    header_lines = preamble + [f"The result has {row_count}."] + _stats_lines(columns)
+    body = table[1:]
+    shown = min(len(body) // 2, 25)
+    while True:
+        lines = list(header_lines)
+        if shown:
+            lines += [f"First and last {shown} rows:", table[0]] + body[:shown]
+            if shown * 2 < len(body):
+                lines.append("...")
+            lines += body[len(body) - shown:]
+        text = "\n".join(lines) + "\n"
+        if shown == 0 or estimate_tokens(text) <= token_budget:
+            return text
+        shown = shown // 2
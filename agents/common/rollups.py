@@ -0,0 +1,563 @@
+import datetime
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from common.schema import MONTHLY_SALES, WEEKLY_PROMO_SALES, TABLES
+from common.sql_parsing import parse_select, split_conjuncts, split_top_level, strip_parentheses
+from common.telemetry import telemetry
+
+
+REFRESH_INTERVAL_SECONDS = 5 * 60
+
+# Time dimensions computed from the `month` base dimension ('year' can also be a base dimension)
+_MONTH_DERIVED = {
+    "month": lambda month: month,
+    "year": lambda month: month.year,
+    "quarter": lambda month: (month.month - 1) // 3 + 1,
+    "month_of_year": lambda month: month.month,
+    "year_start": lambda month: datetime.date(month.year, 1, 1),
+    "quarter_start": lambda month: datetime.date(month.year, (month.month - 1) // 3 * 3 + 1, 1),
+    "year_month": lambda month: month.strftime("%Y-%m"),
+}
+_YEAR_DERIVED = {
+    "year": lambda year: year,
+    "year_start": lambda year: datetime.date(year, 1, 1),
+}
+
+
+# --- Cube Definitions ---
+
+@dataclass(frozen=True)
+class CubeSpec:
+    """A rollup of one table: SUM/COUNT/MIN/MAX of the value column grouped by `dims`."""
+    name: str
+    table: object
+    dims: tuple # Table columns, plus the time dimension 'month' or 'year'
+
+    @property
+    def time_dim(self):
+        return next((dim for dim in self.dims if dim in ("month", "year")), None)
+
+
+CUBES = (
+    CubeSpec("sales_product_month", MONTHLY_SALES, ("ProductId", "ProductName", "month")),
+    CubeSpec("sales_product_year", MONTHLY_SALES, ("ProductId", "ProductName", "year")),
+    CubeSpec("promo_product_month", WEEKLY_PROMO_SALES, ("promoted_group", "month")),
+    CubeSpec("promo_product_year", WEEKLY_PROMO_SALES, ("promoted_group", "year")),
+    # Geography x product x promo flags, kept per year so year filters stay answerable
+    CubeSpec(
+        "promo_geography_product_flags",
+        WEEKLY_PROMO_SALES,
+        ("retailer_banner_geography", "promoted_group", "is_tpr", "is_feature", "is_display", "year"),
+    ),
+)
+
+
+def _merge_measures(target: list, source):
+    """Merges [rows, count, sum, min, max] measures of `source` into `target`."""
+    target[0] += source[0]
+    target[1] += source[1]
+    if source[2] is not None:
+        target[2] = source[2] if target[2] is None else target[2] + source[2]
+    if source[3] is not None and (target[3] is None or source[3] < target[3]):
+        target[3] = source[3]
+    if source[4] is not None and (target[4] is None or source[4] > target[4]):
+        target[4] = source[4]
+
+
+def _merged_copy(target: list, source: list) -> list:
+    measures = list(target)
+    _merge_measures(measures, source)
+    return measures
+
+
+class RollupStore:
+    """
+    Holds the materialized cubes in memory and keeps them in sync with the tables.
+
+    Each table is scanned once at its finest rollup grain (every cube dimension
+    plus the month); all cubes of the table are aggregated from that result.
+    Later refreshes only read the periods after the last loaded date and merge
+    them in, as long as the rows up to that date still have the row count and
+    sum they were loaded with. Rows added or changed at or before it (a new
+    product's history, a restated period) trigger a full rebuild.
+    """
+
+    def __init__(self, backend_getter, cubes=CUBES):
+        self._backend_getter = backend_getter
+        self.specs = {spec.name: spec for spec in cubes}
+        self._cubes = {}
+        # table name -> (data version, latest loaded date, row count and value sum up to that date)
+        self._table_state = {}
+        self._failing = set() # Tables whose last refresh failed, so the failure is printed once
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = None
+        self._refreshing = False
+
+    def cube(self, name: str):
+        """Returns the rows of a cube as {dimension values: measures}, or None if not built yet."""
+        return self._cubes.get(name)
+
+    def _base_dims(self, table) -> list:
+        dims = []
+        for spec in self.specs.values():
+            if spec.table is table:
+                dims += [dim for dim in spec.dims if dim not in ("month", "year") and dim not in dims]
+        return dims
+
+    def _load_base_rows(self, table, after=None, until=None) -> list:
+        dims = self._base_dims(table)
+        date, value = table.date_column, table.value_column
+        conditions = []
+        if after is not None:
+            conditions.append(f"{date} > DATE '{after.isoformat()}'")
+        if until is not None:
+            conditions.append(f"{date} <= DATE '{until.isoformat()}'")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql_query = (
+            f"SELECT {', '.join(dims)}, DATE_TRUNC({date}, MONTH) AS month, "
+            f"COUNT(*), COUNT({value}), SUM({value}), MIN({value}), MAX({value}) "
+            f"FROM `{table.name}` {where} GROUP BY {', '.join(dims)}, month"
+        )
+        _, rows = self._backend_getter().run(sql_query, None)
+        return [(dict(zip(dims + ["month"], row[:len(dims) + 1])), list(row[len(dims) + 1:])) for row in rows]
+
+    def _aggregate(self, spec: CubeSpec, base_rows: list, cube: dict) -> dict:
+        """Merges `base_rows` into `cube`. Entries it already had are copied before the merge, never changed in place."""
+        merged = set()
+        for dims, measures in base_rows:
+            month = dims["month"]
+            key = tuple((month.year if month is not None else None) if dim == "year" else dims[dim] for dim in spec.dims)
+            if key in merged:
+                _merge_measures(cube[key], measures)
+            else:
+                cube[key] = list(measures) if key not in cube else _merged_copy(cube[key], measures)
+                merged.add(key)
+        return cube
+
+    def _loaded_rows_changed(self, table, state) -> tuple:
+        """(latest date in the table, whether the rows up to the latest loaded date differ from those loaded)."""
+        date, value = table.date_column, table.value_column
+        loaded = f"{date} <= DATE '{state[1].isoformat()}'"
+        _, rows = self._backend_getter().run(
+            f"SELECT MAX({date}), SUM(CASE WHEN {loaded} THEN 1 ELSE 0 END), SUM(CASE WHEN {loaded} THEN {value} END) "
+            f"FROM `{table.name}`", 1
+        )
+        latest, count, total = rows[0] if rows else (None, 0, None)
+        # Sums are compared with a tolerance: the warehouse may add the same floats in another order
+        changed = (count or 0) != state[2] or not math.isclose(float(total or 0), state[3], rel_tol=1e-9, abs_tol=1e-6)
+        return latest, changed
+
+    def refresh_table(self, table):
+        backend = self._backend_getter()
+        version = backend.table_version(table.name)
+        state = self._table_state.get(table.name)
+        if state is not None and version is not None and version == state[0]:
+            return
+
+        specs = [spec for spec in self.specs.values() if spec.table is table]
+        if state is not None and state[1] is not None:
+            latest, changed = self._loaded_rows_changed(table, state)
+            if not changed and latest == state[1]:
+                # A new version without new or changed rows
+                self._table_state[table.name] = (version,) + state[1:]
+                return
+            incremental = not changed and latest is not None and latest > state[1]
+        else:
+            _, rows = backend.run(f"SELECT MAX({table.date_column}) FROM `{table.name}`", 1)
+            latest = rows[0][0] if rows else None
+            incremental = False
+
+        if incremental:
+            base_rows = self._load_base_rows(table, after=state[1], until=latest)
+            # Shallow copies: the entries the new periods touch are replaced, so readers of the old cubes are unaffected
+            cubes = {spec.name: dict(self._cubes.get(spec.name, {})) for spec in specs}
+        else:
+            base_rows = self._load_base_rows(table, until=latest)
+            cubes = {spec.name: {} for spec in specs}
+        for spec in specs:
+            self._cubes[spec.name] = self._aggregate(spec, base_rows, cubes[spec.name])
+        count = sum(measures[0] for _, measures in base_rows)
+        total = math.fsum(float(measures[2]) for _, measures in base_rows if measures[2] is not None)
+        if incremental:
+            count, total = count + state[2], total + state[3]
+        self._table_state[table.name] = (version, latest, count, total)
+        print(f"Rollups: {'appended' if incremental else 'rebuilt'} {len(base_rows)} base rows of {table.name}.")
+
+    def refresh(self):
+        """Brings every cube up to date with its table."""
+        with self._refresh_lock:
+            for table in {spec.table.name: spec.table for spec in self.specs.values()}.values():
+                try:
+                    self.refresh_table(table)
+                    self._failing.discard(table.name)
+                except Exception as e:
+                    # Printed once, not on every interval while the table stays missing or broken
+                    if table.name not in self._failing:
+                        self._failing.add(table.name)
+                        print(f"Rollups: could not refresh {table.name}: {e}")
+            self._last_refresh = time.monotonic()
+
+    def refresh_in_background(self, interval: float = REFRESH_INTERVAL_SECONDS):
+        """Starts a refresh thread when the last refresh is older than `interval` seconds."""
+        if self._refreshing or (self._last_refresh is not None and time.monotonic() - self._last_refresh < interval):
+            return
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="rollup-refresh", daemon=True).start()
+
+
+# --- Query Router ---
+
+_DATE_LITERAL = re.compile(
+    r"^(?:DATE\s*\(?\s*|CAST\s*\(\s*)?'(\d{4}-\d{2}-\d{2})'\s*(?:AS\s+DATE\s*)?\)?$"
+    r"|^PARSE_DATE\s*\(\s*'%Y-%m-%d'\s*,\s*'(\d{4}-\d{2}-\d{2})'\s*\)$",
+    re.IGNORECASE,
+)
+_AGGREGATE = re.compile(
+    r"^(?:ROUND\s*\(\s*)?(SUM|AVG|COUNT|MIN|MAX)\s*\(\s*(\*|[\w.`]+)\s*\)(?:\s*,\s*(\d+)\s*\))?$",
+    re.IGNORECASE,
+)
+_COMPARISON = re.compile(r"^(.+?)\s*(<=|>=|<>|!=|=|<|>)\s*(.+)$", re.DOTALL)
+_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def _month_start(date: datetime.date) -> datetime.date:
+    return date.replace(day=1)
+
+
+def _next_month(date: datetime.date) -> datetime.date:
+    return datetime.date(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def _is_month_end(date: datetime.date) -> bool:
+    return (date + datetime.timedelta(days=1)).day == 1
+
+
+def _round(value, digits: int):
+    """Rounds half away from zero, as BigQuery's ROUND does."""
+    if value is None:
+        return None
+    exponent = Decimal(1).scaleb(-digits)
+    if isinstance(value, Decimal):
+        return value.quantize(exponent, rounding=ROUND_HALF_UP)
+    return float(Decimal(repr(value)).quantize(exponent, rounding=ROUND_HALF_UP))
+
+
+def _parse_literal(text: str):
+    text = strip_parentheses(text)
+    if re.fullmatch(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", text):
+        return text[1:-1]
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    if re.fullmatch(r"-?\d+\.\d*", text):
+        return float(text)
+    raise ValueError(f"Unsupported literal: {text}")
+
+
+def _parse_date(text: str):
+    match = _DATE_LITERAL.match(strip_parentheses(text))
+    if not match:
+        return None
+    return datetime.date.fromisoformat(match.group(1) or match.group(2))
+
+
+@dataclass
+class _Predicate:
+    dim: str
+    test: object
+
+    def __call__(self, values: dict) -> bool:
+        value = values[self.dim]
+        return value is not None and self.test(value)
+
+
+class _Unroutable(Exception):
+    """The query needs something the cubes do not hold."""
+
+
+class _QueryPlan:
+    def __init__(self, query, table):
+        self.query = query
+        self.table = table
+        self.columns = {column.name.lower(): column.name for column in table.columns}
+
+    # Expressions
+
+    def _column(self, expression: str):
+        expression = strip_parentheses(expression).strip("`")
+        prefix = f"{self.query.table_alias}." if self.query.table_alias else None
+        if prefix and expression.lower().startswith(prefix.lower()):
+            expression = expression[len(prefix):]
+        return self.columns.get(expression.lower())
+
+    def _is_date(self, expression: str) -> bool:
+        return self._column(expression) == self.table.date_column
+
+    def dim(self, expression: str):
+        """Maps a grouping expression to a cube dimension."""
+        expression = strip_parentheses(expression)
+        column = self._column(expression)
+        if column == self.table.date_column:
+            if self.table.grain == "month":
+                return "month" # Monthly dates are already the first day of the month
+            raise _Unroutable("weekly dates are not kept in the rollups")
+        if column is not None:
+            if column == self.table.value_column:
+                raise _Unroutable("the value column is not a dimension")
+            return column
+
+        match = re.fullmatch(r"EXTRACT\s*\(\s*(YEAR|QUARTER|MONTH)\s+FROM\s+(.+)\)", expression, re.IGNORECASE | re.DOTALL)
+        if match and self._is_date(match.group(2)):
+            return {"YEAR": "year", "QUARTER": "quarter", "MONTH": "month_of_year"}[match.group(1).upper()]
+        match = re.fullmatch(r"DATE_TRUNC\s*\(\s*(.+?)\s*,\s*(YEAR|QUARTER|MONTH)\s*\)", expression, re.IGNORECASE | re.DOTALL)
+        if match and self._is_date(match.group(1)):
+            return {"YEAR": "year_start", "QUARTER": "quarter_start", "MONTH": "month"}[match.group(2).upper()]
+        match = re.fullmatch(r"FORMAT_DATE\s*\(\s*'%Y-%m'\s*,\s*(.+)\)", expression, re.IGNORECASE | re.DOTALL)
+        if match and self._is_date(match.group(1)):
+            return "year_month"
+        raise _Unroutable(f"unsupported expression: {expression}")
+
+    def aggregate(self, expression: str):
+        match = _AGGREGATE.match(strip_parentheses(expression))
+        if not match:
+            return None
+        function, argument, digits = match.group(1).upper(), match.group(2), match.group(3)
+        if argument != "*" and self._column(argument) != self.table.value_column:
+            raise _Unroutable("aggregates must read the value column")
+        if argument == "*" and function != "COUNT":
+            raise _Unroutable(f"{function}(*) is not valid")
+        return function, argument == "*", int(digits) if digits is not None else None
+
+    # Filters
+
+    def _time_bounds(self, operator: str, date: datetime.date) -> list:
+        """Turns `date_column <op> date` into predicates on whole months."""
+        if self.table.grain == "month":
+            # Every row is dated on the first of a month, so any bound maps to a month boundary
+            ceil = lambda d: d if d.day == 1 else _next_month(d)
+            bounds = {
+                ">=": [(">=", ceil(date))],
+                ">": [(">=", ceil(date + datetime.timedelta(days=1)))],
+                "<": [("<", ceil(date))],
+                "<=": [("<", ceil(date + datetime.timedelta(days=1)))],
+                "=": [(">=", date), ("<", date)] if date.day != 1 else [(">=", date), ("<", _next_month(date))],
+            }.get(operator)
+        elif date.day == 1 and operator in (">=", "<"):
+            bounds = [(operator, date)]
+        elif _is_month_end(date) and operator in ("<=", ">"):
+            bounds = [("<" if operator == "<=" else ">=", _next_month(date))]
+        else:
+            bounds = None
+        if bounds is None:
+            raise _Unroutable("date filter does not fall on a month boundary")
+        predicates = []
+        for op, month in bounds:
+            if month.month == 1:
+                # Year boundaries can also be answered from the yearly cubes
+                predicates.append(_Predicate("year", lambda v, op=op, year=month.year: _OPERATORS[op](v, year)))
+            else:
+                predicates.append(_Predicate("month", lambda v, op=op, month=month: _OPERATORS[op](v, month)))
+        return predicates
+
+    def predicates(self) -> list:
+        if not self.query.where:
+            return []
+        conjuncts = split_conjuncts(self.query.where)
+        if conjuncts is None:
+            raise _Unroutable("OR conditions are not supported")
+        predicates = []
+        for conjunct in conjuncts:
+            conjunct = strip_parentheses(conjunct)
+            between = re.fullmatch(r"(.+?)\s+BETWEEN\s+(.+?)\s+AND\s+(.+)", conjunct, re.IGNORECASE | re.DOTALL)
+            in_list = re.fullmatch(r"(.+?)\s+IN\s*\((.+)\)", conjunct, re.IGNORECASE | re.DOTALL)
+            comparison = _COMPARISON.match(conjunct)
+            if between:
+                left, low, high = between.groups()
+                if self._is_date(left) and _parse_date(low) and _parse_date(high):
+                    predicates += self._time_bounds(">=", _parse_date(low)) + self._time_bounds("<=", _parse_date(high))
+                    continue
+                dim, low, high = self.dim(left), _parse_literal(low), _parse_literal(high)
+                predicates.append(_Predicate(dim, lambda v, low=low, high=high: low <= v <= high))
+            elif in_list:
+                dim = self.dim(in_list.group(1))
+                values = {_parse_literal(value) for value in split_top_level(in_list.group(2))}
+                predicates.append(_Predicate(dim, lambda v, values=values: v in values))
+            elif comparison:
+                left, operator, right = comparison.groups()
+                if self._is_date(left):
+                    date = _parse_date(right)
+                    if date is None:
+                        raise _Unroutable(f"unsupported date filter: {conjunct}")
+                    predicates += self._time_bounds(operator, date)
+                    continue
+                dim, value = self.dim(left), _parse_literal(right)
+                predicates.append(_Predicate(dim, lambda v, op=operator, value=value: _OPERATORS[op](v, value)))
+            else:
+                raise _Unroutable(f"unsupported filter: {conjunct}")
+        return predicates
+
+    # Planning
+
+    def build(self):
+        query = self.query
+        if query.distinct or query.having:
+            raise _Unroutable("DISTINCT and HAVING are not supported")
+
+        self.outputs = [] # ('dim', name) or ('agg', function, count_star, digits)
+        for item in query.items:
+            aggregate = self.aggregate(item.expression)
+            self.outputs.append(("agg",) + aggregate if aggregate else ("dim", self.dim(item.expression)))
+        if not any(output[0] == "agg" for output in self.outputs):
+            raise _Unroutable("the query has no aggregate")
+
+        names = [name.lower() for name in query.output_names()]
+        self.group_dims = []
+        for entry in query.group_by:
+            if entry.isdigit():
+                output = self.outputs[int(entry) - 1]
+            elif entry.lower() in names:
+                output = self.outputs[names.index(entry.lower())]
+            else:
+                output = ("dim", self.dim(entry))
+            if output[0] != "dim":
+                raise _Unroutable("cannot group by an aggregate")
+            self.group_dims.append(output[1])
+        if any(output[0] == "dim" and output[1] not in self.group_dims for output in self.outputs):
+            raise _Unroutable("selected dimension is not grouped")
+
+        self.filters = self.predicates()
+
+        expressions = [re.sub(r"\s+", "", item.expression.lower()) for item in query.items]
+        self.order = []
+        for entry, descending in query.order_by:
+            if entry.isdigit():
+                index = int(entry) - 1
+            elif entry.lower() in names:
+                index = names.index(entry.lower())
+            elif re.sub(r"\s+", "", entry.lower()) in expressions:
+                index = expressions.index(re.sub(r"\s+", "", entry.lower()))
+            else:
+                raise _Unroutable(f"cannot order by {entry}")
+            self.order.append((index, descending))
+        self.names = query.output_names()
+        return self
+
+    def choose_cube(self, specs, store):
+        used = set(self.group_dims) | {predicate.dim for predicate in self.filters}
+        columns = {dim for dim in used if dim in self.columns.values()}
+        time_dims = used - columns
+        candidates = []
+        for spec in specs:
+            if spec.table is not self.table or not columns <= set(spec.dims):
+                continue
+            available = _YEAR_DERIVED if spec.time_dim == "year" else _MONTH_DERIVED
+            if not time_dims <= set(available):
+                continue
+            cube = store.cube(spec.name)
+            if cube is not None:
+                candidates.append((len(cube), spec, cube))
+        if not candidates:
+            raise _Unroutable("no built cube covers the query")
+        return min(candidates, key=lambda candidate: candidate[0])[1:]
+
+    def evaluate(self, spec, cube, max_results):
+        available = _YEAR_DERIVED if spec.time_dim == "year" else _MONTH_DERIVED
+        needed = set(self.group_dims) | {predicate.dim for predicate in self.filters}
+        derived = {name: derive for name, derive in available.items() if name in needed}
+        time_index = spec.dims.index(spec.time_dim)
+        groups = {}
+        for key, measures in cube.items():
+            values = dict(zip(spec.dims, key))
+            time_value = key[time_index]
+            for name, derive in derived.items():
+                values[name] = derive(time_value) if time_value is not None else None
+            if not all(predicate(values) for predicate in self.filters):
+                continue
+            group_key = tuple(values[dim] for dim in self.group_dims)
+            if group_key in groups:
+                _merge_measures(groups[group_key], measures)
+            else:
+                groups[group_key] = list(measures)
+        if not self.group_dims and not groups:
+            groups[()] = [0, 0, None, None, None] # Aggregates without GROUP BY always return one row
+
+        rows = []
+        for group_key, (row_count, count, total, minimum, maximum) in groups.items():
+            group_values = dict(zip(self.group_dims, group_key))
+            row = []
+            for output in self.outputs:
+                if output[0] == "dim":
+                    row.append(group_values[output[1]])
+                    continue
+                _, function, count_star, digits = output
+                if function == "COUNT":
+                    value = row_count if count_star else count
+                elif function == "AVG":
+                    value = None if not count else (total / count if isinstance(total, Decimal) else float(total) / count)
+                else:
+                    value = {"SUM": total, "MIN": minimum, "MAX": maximum}[function]
+                row.append(_round(value, digits) if digits is not None else value)
+            rows.append(tuple(row))
+
+        # BigQuery sorts NULLs first ascending and last descending
+        for index, descending in reversed(self.order):
+            rows.sort(key=lambda row: (row[index] is not None, row[index]), reverse=descending)
+        start = self.query.offset or 0
+        limit = max_results if self.query.limit is None else min(self.query.limit, max_results)
+        return self.names, rows[start:start + limit]
+
+
+class RollupRouter:
+    """
+    Answers aggregate queries from the rollup cubes instead of scanning the table.
+
+    Only simple single-table SUM/AVG/COUNT/MIN/MAX queries whose dimensions and
+    filters are covered by a cube are answered; `answer` returns None for
+    everything else so the query goes to the backend unchanged.
+    """
+
+    def __init__(self, store: RollupStore, refresh_interval: float = REFRESH_INTERVAL_SECONDS):
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self.routed = 0
+        self.fallbacks = 0
+
+    def answer(self, sql_query: str, max_results: int):
+        self.store.refresh_in_background(self.refresh_interval)
+        query = parse_select(sql_query)
+        table = TABLES.get(query.table) if query else None
+        if table is None:
+            self.fallbacks += 1
+            return None
+        try:
+            plan = _QueryPlan(query, table).build()
+            spec, cube = plan.choose_cube(self.store.specs.values(), self.store)
+            result = plan.evaluate(spec, cube, max_results)
+        except (_Unroutable, ValueError, TypeError, IndexError):
+            self.fallbacks += 1
+            return None
+        self.routed += 1
+        telemetry.current_span().set(rollup=spec.name, rollup_cells=len(cube))
+        return result
+
+    def stats(self) -> dict:
+        return {"routed": self.routed, "fallbacks": self.fallbacks}
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+
+from google.genai import types
+from google.adk.models import LlmResponse
+
+from common.telemetry import telemetry
+
+
+# --- Keyword Automaton ---
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that finds every keyword occurrence in one pass over the text.
+
+    Matching is case-insensitive and only whole words count, so 'mug' does not
+    match inside 'smuggle'.
+    """
+
+    def __init__(self, keywords: dict):
+        # keywords: {keyword: payload}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword, payload in keywords.items():
+            self._add(keyword.lower(), payload)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, payload):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((keyword, payload))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> list:
+        """Returns (keyword, payload, start) for every whole-word keyword occurrence in `text`."""
+        text = text.lower()
+        matches, state = [], 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword, payload in self._output[state]:
+                start = i - len(keyword) + 1
+                before = text[start - 1] if start > 0 else " "
+                after = text[i + 1] if i + 1 < len(text) else " "
+                if not (before.isalnum() or after.isalnum()):
+                    matches.append((keyword, payload, start))
+        return matches
+
+
+# --- Pre-Router ---
+
+class PreRouter:
+    """
+    Picks the sub-agent for a question from the products and topics it mentions.
+
+    `routes` maps a sub-agent name to the keywords that belong to it. A question
+    is routed only when all its matches point to one sub-agent; questions with
+    no match, or matches for several sub-agents, are left to the LLM router.
+    """
+
+    def __init__(self, routes: dict):
+        self._automaton = KeywordAutomaton(
+            {keyword: agent_name for agent_name, keywords in routes.items() for keyword in keywords}
+        )
+        self._lock = threading.Lock()
+        self.decisions = {agent_name: 0 for agent_name in routes}
+        self.ambiguous = 0
+        self.unmatched = 0
+        self.total_seconds = 0.0
+
+    def route(self, text: str):
+        """Returns the sub-agent name for `text`, or None when the LLM should decide."""
+        start = time.perf_counter()
+        agents = {agent_name for _, agent_name, _ in self._automaton.find(text)}
+        target = next(iter(agents)) if len(agents) == 1 else None
+        with self._lock:
+            self.total_seconds += time.perf_counter() - start
+            if target is not None:
+                self.decisions[target] += 1
+            elif agents:
+                self.ambiguous += 1
+            else:
+                self.unmatched += 1
+        telemetry.metrics.inc("prerouter_decisions_total", target=target or ("ambiguous" if agents else "unmatched"))
+        return target
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = sum(self.decisions.values())
+            total = routed + self.ambiguous + self.unmatched
+            return {
+                "routed": dict(self.decisions),
+                "ambiguous": self.ambiguous,
+                "unmatched": self.unmatched,
+                "fast_path_ratio": routed / total if total else 0.0,
+                "avg_decision_us": self.total_seconds / total * 1e6 if total else 0.0,
+            }
+
+    def before_model_callback(self, callback_context, llm_request):
+        """
+        ADK `before_model_callback` for the steering agent.
+
+        On the first model call of a turn it transfers straight to the matched
+        sub-agent, answering the call with a `transfer_to_agent` function call
+        instead of asking the model.
+        """
+        if not llm_request.contents or llm_request.contents[-1].role != "user":
+            return None
+        parts = llm_request.contents[-1].parts or []
+        if any(part.function_response for part in parts):
+            return None
+        text = " ".join(part.text for part in parts if part.text)
+        target = self.route(text) if text else None
+        if target is None:
+            return None
+        return LlmResponse(
+            content=types.Content(
+                role="model",
+                parts=[types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": target}))],
+            )
+        )
+
+
+CALENDAR_KEYWORDS = ("calendar", "event", "events", "meeting", "meetings", "schedule", "appointment", "reminder")
+
+
+def product_keywords(table) -> list:
+    """The product names and aliases of a table, as routing keywords."""
+    return list(table.product_names())
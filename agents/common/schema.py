@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+
+
+BIGQUERY_PROJECT = "hacker2025-team-199-dev"
+
+
+# --- Table Registry ---
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str
+    description: str
+
+
+@dataclass(frozen=True)
+class Table:
+    """Describes one analytics table the agents are allowed to query."""
+    name: str                # Fully qualified BigQuery name, without backticks
+    local_name: str          # Table name used by the local backend
+    local_file: str          # CSV file the local backend loads the table from
+    date_column: str         # Column holding the first day of the period
+    grain: str               # 'month' or 'week'
+    product_column: str
+    value_column: str
+    columns: tuple
+    products: tuple = field(default_factory=tuple)
+    product_aliases: tuple = field(default_factory=tuple) # (alias, product) pairs
+    geography_column: str = None
+    geographies: tuple = field(default_factory=tuple)
+
+    @property
+    def column_names(self) -> list:
+        return [column.name for column in self.columns]
+
+    def product_names(self) -> dict:
+        """Maps every lower-cased product name and alias to the product's name in the table."""
+        names = {product.lower(): product for product in self.products}
+        names.update({alias: product for alias, product in self.product_aliases})
+        return names
+
+
+MONTHLY_SALES = Table(
+    name=f"{BIGQUERY_PROJECT}.sales_analyst.artificial_sales",
+    local_name="artificial_sales",
+    local_file="monthly_retail_sales_data.csv",
+    date_column="Date",
+    grain="month",
+    product_column="ProductName",
+    value_column="SalesRevenue",
+    columns=(
+        Column("Date", "DATE", "The first day of the month for sales data (e.g., '2023-01-01')."),
+        Column("ProductId", "STRING", "Unique identifier for a product (e.g., 'P01', 'P02')."),
+        Column("ProductName", "STRING", "Name of the product (e.g., 'Basic T-Shirt', 'Wireless Headphones')."),
+        Column("SalesRevenue", "NUMERIC", "Total sales revenue for the month for this product."),
+    ),
+    products=(
+        "Basic T-Shirt", "Camping Tent", "Coffee Maker", "Cookware Set", "Denim Jeans",
+        "Novelty Mug", "Running Shoes", "Smartwatch", "Weighted Blanket", "Wireless Headphones",
+    ),
+    product_aliases=(
+        ("t-shirt", "Basic T-Shirt"), ("tshirt", "Basic T-Shirt"), ("t shirt", "Basic T-Shirt"),
+        ("tent", "Camping Tent"), ("coffee machine", "Coffee Maker"), ("cookware", "Cookware Set"),
+        ("jeans", "Denim Jeans"), ("mug", "Novelty Mug"), ("mugs", "Novelty Mug"),
+        ("running shoe", "Running Shoes"), ("smart watch", "Smartwatch"), ("smartwatches", "Smartwatch"),
+        ("blanket", "Weighted Blanket"), ("headphones", "Wireless Headphones"),
+    ),
+)
+
+WEEKLY_PROMO_SALES = Table(
+    name=f"{BIGQUERY_PROJECT}.sales_and_promo.weekly_sales_data",
+    local_name="weekly_sales_data",
+    local_file="weekly_sales_data.csv",
+    date_column="date",
+    grain="week",
+    product_column="promoted_group",
+    value_column="daily_weekly_value_sales",
+    columns=(
+        Column("date", "DATE", "The first day of the week for sales data (e.g., '2023-01-03')."),
+        Column("retailer_banner_geography", "STRING", "Geogrphic identifier of retailer (e.g. 'NORTH EAST')."),
+        Column("promoted_group", "STRING", "The name of a product (e.g. 'FACE CREAM')."),
+        Column("daily_weekly_value_sales", "FLOAT", "Total sales revenue for the week of a given product."),
+        Column("is_tpr", "INTEGER", "Flag for Temporary Price Reduction promotion. 1 means that product was on TPR and 0 means it wasn't."),
+        Column("is_feature", "INTEGER", "Flag for promotion in magazine. 1 means that product was promoted in magazine and 0 means it wasn't."),
+        Column("is_display", "INTEGER", "Flag for promotion on display. 1 means that product was promoted on display and 0 means it wasn't."),
+    ),
+    products=("FACE CREAM", "MOISTURISER"),
+    product_aliases=(("moisturizer", "MOISTURISER"), ("face creams", "FACE CREAM")),
+    geography_column="retailer_banner_geography",
+    geographies=(
+        "NORTH EAST", "NORTH WEST", "YORKSHIRE", "EAST MIDLANDS", "WEST MIDLANDS", "EAST OF ENGLAND",
+        "LONDON", "SOUTH EAST", "SOUTH WEST", "WALES", "SCOTLAND", "NORTHERN IRELAND",
+    ),
+)
+
+TABLES = {table.name: table for table in (MONTHLY_SALES, WEEKLY_PROMO_SALES)}
+
+
+def find_table(name: str):
+    """Returns the registered table for a (possibly backticked) table name, or None."""
+    return TABLES.get(name.strip("`"))
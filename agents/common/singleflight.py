@@ -0,0 +1,71 @@
+import threading
+
+from common.telemetry import telemetry
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time; callers arriving while it runs wait for it and share its result.
+
+    The first caller of a key (the leader) runs the function. Callers with the
+    same key that arrive before it returns block until it does and get the same
+    result, or the same exception. Nothing is kept afterwards: the next call of
+    the key runs again, so caching stays the job of the caches.
+
+    Every call is counted in `singleflight_calls_total{group, role}`, where
+    role is "leader" or "coalesced".
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls = {} # key -> _Call in flight
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        """Returns `(func(*args), shared)`, where `shared` is True when another caller's result was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        telemetry.metrics.inc("singleflight_calls_total", group=self.group, role="leader" if leader else "coalesced")
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
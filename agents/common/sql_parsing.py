@@ -0,0 +1,252 @@
+import re
+from dataclasses import dataclass, field
+
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# Strings and quoted names are matched too, so comment markers inside them are left alone
+_COMMENT_OR_QUOTED = re.compile(
+    r"(?P<comment>--[^\n]*|#[^\n]*|/\*.*?(?:\*/|$))|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`", re.DOTALL
+)
+_CLAUSE_KEYWORDS = re.compile(
+    r"\b(SELECT|FROM|WHERE|GROUP\s+BY|HAVING|QUALIFY|WINDOW|ORDER\s+BY|LIMIT|OFFSET|UNION|INTERSECT|EXCEPT|WITH)\b",
+    re.IGNORECASE,
+)
+_TABLE_REFERENCE = re.compile(r"^(`[^`]+`|[\w.-]+)(?:\s+(?:AS\s+)?(\w+))?$", re.IGNORECASE)
+_ALIAS = re.compile(r"^(.*?)(?:\s+AS)?\s+(`[^`]+`|\w+)$", re.IGNORECASE | re.DOTALL)
+_RESERVED_ALIAS_WORDS = {"AND", "OR", "NOT", "END", "DESC", "ASC", "NULL", "TRUE", "FALSE", "FROM"}
+
+
+def mask_literals(sql: str) -> str:
+    """Blanks out string literals so keywords and parentheses inside them are ignored."""
+    return STRING_LITERAL.sub(lambda m: " " * len(m.group()), sql)
+
+
+def strip_comments(sql: str) -> str:
+    """
+    Replaces `--`, `#` and `/* */` comments with a space.
+
+    Clauses are cut from the query's text and put back together, where a line
+    comment left at the end of one would swallow every clause after it.
+    """
+    return _COMMENT_OR_QUOTED.sub(lambda m: " " if m.group("comment") else m.group(), sql)
+
+
+def split_top_level(text: str, separator: str = ",") -> list:
+    """Splits `text` on `separator` where it appears outside parentheses and string literals."""
+    parts, depth, quote, current = [], 0, None, []
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    return parts
+
+
+def split_conjuncts(condition: str) -> list:
+    """
+    Splits a WHERE condition on its top-level ANDs.
+
+    Returns None when the condition has a top-level OR, since it can then not be
+    treated as a list of independent filters.
+    """
+    masked = mask_literals(condition)
+    depth, boundaries = 0, []
+    for match in re.finditer(r"\(|\)|\bAND\b|\bOR\b|\bBETWEEN\b", masked, re.IGNORECASE):
+        token = match.group().upper()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            boundaries.append((token, match.start(), match.end()))
+
+    conjuncts, start, pending_between = [], 0, False
+    for token, token_start, token_end in boundaries:
+        if token == "OR":
+            return None
+        if token == "BETWEEN":
+            pending_between = True
+        elif pending_between:
+            # This AND belongs to `x BETWEEN a AND b`
+            pending_between = False
+        else:
+            conjuncts.append(condition[start:token_start].strip())
+            start = token_end
+    conjuncts.append(condition[start:].strip())
+    return [conjunct for conjunct in conjuncts if conjunct]
+
+
+def strip_parentheses(expression: str) -> str:
+    """Removes parentheses that wrap the whole expression."""
+    expression = expression.strip()
+    while expression.startswith("(") and expression.endswith(")"):
+        depth = 0
+        for i, char in enumerate(mask_literals(expression)):
+            depth += char == "("
+            depth -= char == ")"
+            if depth == 0 and i < len(expression) - 1:
+                return expression
+        expression = expression[1:-1].strip()
+    return expression
+
+
+@dataclass
+class SelectItem:
+    expression: str
+    alias: str = None
+
+
+@dataclass
+class SelectQuery:
+    """The clauses of a single-table SELECT statement."""
+    items: list
+    table: str
+    table_alias: str = None
+    distinct: bool = False
+    where: str = None
+    group_by: list = field(default_factory=list)
+    having: str = None
+    order_by: list = field(default_factory=list) # (expression, descending) pairs
+    limit: int = None
+    offset: int = None
+
+    def output_names(self) -> list:
+        """Column names BigQuery gives the result: alias, column name or `f<n>_`."""
+        names, anonymous = [], 0
+        for item in self.items:
+            if item.alias:
+                names.append(item.alias)
+            elif re.fullmatch(r"[\w.]+", item.expression):
+                names.append(item.expression.split(".")[-1])
+            else:
+                names.append(f"f{anonymous}_")
+                anonymous += 1
+        return names
+
+    def to_sql(self) -> str:
+        """Renders the query back to SQL, one clause per line."""
+        items = ", ".join(_render_select_item(item) for item in self.items)
+        lines = [f"SELECT {'DISTINCT ' if self.distinct else ''}{items}",
+                 f"FROM `{self.table}`" + (f" {self.table_alias}" if self.table_alias else "")]
+        if self.where:
+            lines.append(f"WHERE {self.where}")
+        if self.group_by:
+            lines.append(f"GROUP BY {', '.join(self.group_by)}")
+        if self.having:
+            lines.append(f"HAVING {self.having}")
+        if self.order_by:
+            lines.append("ORDER BY " + ", ".join(f"{expression}{' DESC' if descending else ''}"
+                                                 for expression, descending in self.order_by))
+        if self.limit is not None:
+            lines.append(f"LIMIT {self.limit}")
+        if self.offset is not None:
+            lines.append(f"OFFSET {self.offset}")
+        return "\n".join(lines)
+
+
+def _render_select_item(item: SelectItem) -> str:
+    if not item.alias:
+        return item.expression
+    alias = item.alias if re.fullmatch(r"[A-Za-z_]\w*", item.alias) else f"`{item.alias}`"
+    return f"{item.expression} AS {alias}"
+
+
+def _parse_select_item(text: str) -> SelectItem:
+    match = _ALIAS.match(text)
+    if match and match.group(2).upper() not in _RESERVED_ALIAS_WORDS:
+        expression = match.group(1).strip()
+        # `SUM(x) total` has an alias, `CASE ... END` or `x + y` do not end in one
+        if expression and (re.search(r"\bAS\s*$", text[:match.start(2)], re.IGNORECASE)
+                           or re.search(r"[\w)`'\"]$", expression)):
+            return SelectItem(expression, match.group(2).strip("`"))
+    return SelectItem(text.strip())
+
+
+def parse_select(sql_query: str):
+    """
+    Parses a single-table SELECT statement into its clauses.
+
+    Returns None for anything more complex (joins, subqueries, CTEs, set
+    operations, window clauses), so callers can fall back to the warehouse.
+    Comments are dropped.
+    """
+    sql_query = strip_comments(sql_query).strip().rstrip(";").strip()
+    masked = mask_literals(sql_query)
+    if re.search(r"\bOVER\s*\(|\bJOIN\b|\(\s*SELECT\b", masked, re.IGNORECASE):
+        return None
+
+    clauses, depth, last = [], 0, None
+    for match in re.finditer(r"\(|\)|" + _CLAUSE_KEYWORDS.pattern, masked, re.IGNORECASE):
+        text = match.group()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0:
+            keyword = re.sub(r"\s+", " ", text.upper())
+            if last is not None:
+                clauses[-1] = (clauses[-1][0], sql_query[last:match.start()].strip())
+            clauses.append((keyword, None))
+            last = match.end()
+    if not clauses or clauses[0][0] != "SELECT":
+        return None
+    clauses[-1] = (clauses[-1][0], sql_query[last:].strip())
+
+    keywords = [keyword for keyword, _ in clauses]
+    if len(set(keywords)) != len(keywords) or set(keywords) & {"UNION", "INTERSECT", "EXCEPT", "WITH", "QUALIFY", "WINDOW"}:
+        return None
+    parts = dict(clauses)
+    if "FROM" not in parts:
+        return None
+
+    table_match = _TABLE_REFERENCE.match(parts["FROM"])
+    if not table_match:
+        return None
+
+    select_list = parts["SELECT"]
+    distinct = bool(re.match(r"DISTINCT\b", select_list, re.IGNORECASE))
+    if distinct:
+        select_list = select_list[len("DISTINCT"):].strip()
+
+    order_by = []
+    for entry in split_top_level(parts.get("ORDER BY", "")) if "ORDER BY" in parts else []:
+        direction = re.search(r"\s+(ASC|DESC)$", entry, re.IGNORECASE)
+        if direction:
+            entry = entry[:direction.start()].strip()
+        order_by.append((entry, bool(direction) and direction.group(1).upper() == "DESC"))
+
+    limit, offset = None, None
+    if "LIMIT" in parts:
+        limit_match = re.fullmatch(r"(\d+)(?:\s+OFFSET\s+(\d+))?", parts["LIMIT"], re.IGNORECASE)
+        if not limit_match:
+            return None
+        limit = int(limit_match.group(1))
+        offset = int(limit_match.group(2)) if limit_match.group(2) else None
+    if "OFFSET" in parts:
+        if not parts["OFFSET"].isdigit():
+            return None
+        offset = int(parts["OFFSET"])
+
+    return SelectQuery(
+        items=[_parse_select_item(item) for item in split_top_level(select_list)],
+        table=table_match.group(1).strip("`"),
+        table_alias=table_match.group(2),
+        distinct=distinct,
+        where=parts.get("WHERE"),
+        group_by=split_top_level(parts["GROUP BY"]) if "GROUP BY" in parts else [],
+        having=parts.get("HAVING"),
+        order_by=order_by,
+        limit=limit,
+        offset=offset,
+    )
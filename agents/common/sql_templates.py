@@ -0,0 +1,391 @@
+import calendar
+import datetime
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from google.genai import types
+from google.adk.models import LlmResponse
+
+from common import query_execution
+from common.backends import QueryBackendError
+from common.query_guard import QueryRejectedError
+from common.routing import KeywordAutomaton
+from common.schema import MONTHLY_SALES, WEEKLY_PROMO_SALES
+from common.telemetry import telemetry
+
+
+# Answer template-shaped questions without the model (set SQL_TEMPLATES_ENABLED=false to disable)
+SQL_TEMPLATES_ENABLED = os.environ.get("SQL_TEMPLATES_ENABLED", "true").lower() != "false"
+
+# What the value column of each table is called in answers
+_MEASURES = {MONTHLY_SALES.name: "revenue", WEEKLY_PROMO_SALES.name: "sales"}
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+_PERIOD = re.compile(
+    r"\b(?:q(?P<quarter>[1-4])\s+(?:of\s+)?(?P<quarter_year>(?:19|20)\d\d)"
+    r"|(?P<month>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?\s+(?P<month_year>(?:19|20)\d\d)"
+    r"|(?P<year>(?:19|20)\d\d))\b",
+    re.IGNORECASE,
+)
+_TOP_N = re.compile(r"\btop\s+(?P<n>\d{1,2}|" + "|".join(_NUMBERS) + r")\b", re.IGNORECASE)
+
+
+# --- Entities ---
+
+@dataclass(frozen=True)
+class Period:
+    start: datetime.date
+    end: datetime.date   # Last day of the period
+    label: str           # '2023', 'Q4 2023' or 'March 2023'
+    whole_year: bool = False
+
+    def predicate(self, date_column: str) -> str:
+        if self.whole_year:
+            return f"EXTRACT(YEAR FROM {date_column}) = {self.start.year}"
+        return f"{date_column} BETWEEN '{self.start.isoformat()}' AND '{self.end.isoformat()}'"
+
+
+@dataclass
+class Entities:
+    """What a question mentions, and its shape: the question with each entity replaced by a placeholder."""
+    shape: str
+    products: list = field(default_factory=list)     # (table, product name) pairs
+    geographies: list = field(default_factory=list)  # (table, geography) pairs
+    periods: list = field(default_factory=list)
+    top_n: int = None
+
+
+class EntityExtractor:
+    """
+    Finds the products, geographies, periods and "top N" counts of a question.
+
+    Products and geographies come from the tables in the schema registry;
+    periods are years ('2023'), quarters ('Q4 2023') and months ('March 2023').
+    """
+
+    def __init__(self, tables: tuple):
+        keywords = {}
+        for table in tables:
+            keywords.update({name: ("product", table, product) for name, product in table.product_names().items()})
+            keywords.update({geography.lower(): ("geography", table, geography) for geography in table.geographies})
+        self._automaton = KeywordAutomaton(keywords)
+
+    def extract(self, question: str) -> Entities:
+        entities = Entities(shape="")
+        spans = []
+        # Longest match first, so 'face creams' wins over 'face cream'
+        for keyword, (kind, table, value), start in sorted(self._automaton.find(question), key=lambda match: -len(match[0])):
+            end = start + len(keyword)
+            if any(start < other_end and other_start < end for other_start, other_end, _ in spans):
+                continue
+            spans.append((start, end, kind))
+            (entities.products if kind == "product" else entities.geographies).append((table, value))
+        for match in _PERIOD.finditer(question):
+            spans.append((match.start(), match.end(), "period"))
+            entities.periods.append(_period(match))
+        for match in _TOP_N.finditer(question):
+            n = match.group("n").lower()
+            entities.top_n = int(n) if n.isdigit() else _NUMBERS[n]
+            spans.append((match.start(), match.end(), "top n"))
+
+        shape, position = [], 0
+        for start, end, kind in sorted(spans):
+            if start < position:
+                continue
+            shape += [question[position:start], f" <{kind}> "]
+            position = end
+        shape.append(question[position:])
+        entities.shape = _normalize("".join(shape))
+        return entities
+
+
+def _period(match) -> Period:
+    if match.group("quarter"):
+        quarter, year = int(match.group("quarter")), int(match.group("quarter_year"))
+        start = datetime.date(year, (quarter - 1) * 3 + 1, 1)
+        end_month = quarter * 3
+        return Period(start, datetime.date(year, end_month, calendar.monthrange(year, end_month)[1]), f"Q{quarter} {year}")
+    if match.group("month"):
+        month, year = _MONTHS[match.group("month").lower()], int(match.group("month_year"))
+        return Period(datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1]),
+                      f"{calendar.month_name[month]} {year}")
+    year = int(match.group("year"))
+    return Period(datetime.date(year, 1, 1), datetime.date(year, 12, 31), str(year), whole_year=True)
+
+
+def _normalize(shape: str) -> str:
+    """Lower-cases the shape and drops punctuation, articles and politeness, so wording variants compare equal."""
+    shape = re.sub(r"[-/]", " ", shape.lower())
+    shape = re.sub(r"[^\w<> ]", "", shape)
+    words = [word for word in shape.split() if word not in ("the", "a", "an", "please", "our", "my")]
+    return " ".join(words).replace("< ", "<").replace(" >", ">")
+
+
+# --- Templates ---
+
+# The filters a question may end with: 'in 2023', 'for LONDON', 'in NORTH EAST in Q4 2023'...
+_FILTERS = r"(?: (?:in|for|during|across) (?:<geography>|<period>))*"
+_MEASURE = r"(?:revenue|sales|value sales|turnover)"
+_TPR = r"(?:tpr|tprs|temporary price reductions?|price reductions?|price cuts?)"
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    """
+    A question shape answered by one parameterized query.
+
+    `patterns` are regular expressions over the question's shape; `sql`
+    builds the query from the table and entities, and `answer` turns its
+    rows into the reply.
+    """
+    name: str
+    patterns: tuple
+    sql: callable
+    answer: callable
+    table: object = None # The table of the question's product; this one when it names none
+    needs_product: bool = True
+    required_columns: tuple = ()
+
+    def matches(self, shape: str) -> bool:
+        return any(re.fullmatch(pattern, shape) for pattern in self.patterns)
+
+
+def _quote(value: str) -> str:
+    # Values are product and geography names from the schema registry, never user text
+    return f"'{value}'"
+
+
+def _where(table, entities: Entities) -> str:
+    conditions = [f"{table.product_column} = {_quote(product)}" for _, product in entities.products]
+    conditions += [f"{table.geography_column} = {_quote(geography)}" for _, geography in entities.geographies]
+    conditions += [period.predicate(table.date_column) for period in entities.periods]
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def _scope(entities: Entities) -> str:
+    """' in LONDON in Q4 2023' for the question's filters."""
+    return "".join(f" in {value}" for _, value in entities.geographies) + "".join(f" in {period.label}" for period in entities.periods)
+
+
+def _amount(value) -> str:
+    text = f"{float(value):,.2f}"
+    return text[:-3] if text.endswith(".00") else text
+
+
+def _total_sql(table, entities: Entities) -> str:
+    return (f"SELECT SUM({table.value_column}) AS total_{_MEASURES[table.name]} "
+            f"FROM `{table.name}`{_where(table, entities)}")
+
+
+def _total_answer(table, entities: Entities, headers: list, rows: list) -> str:
+    product = entities.products[0][1]
+    if not rows or rows[0][0] is None:
+        return f"No data was found for {product}{_scope(entities)}."
+    return f"The total {_MEASURES[table.name]} of {product}{_scope(entities)} was {_amount(rows[0][0])}."
+
+
+def _top_sql(table, entities: Entities) -> str:
+    measure = f"total_{_MEASURES[table.name]}"
+    return (f"SELECT {table.product_column}, SUM({table.value_column}) AS {measure} "
+            f"FROM `{table.name}`{_where(table, entities)} "
+            f"GROUP BY {table.product_column} ORDER BY {measure} DESC LIMIT {entities.top_n or 1}")
+
+
+def _top_answer(table, entities: Entities, headers: list, rows: list) -> str:
+    measure = _MEASURES[table.name]
+    if not rows:
+        return f"No data was found{_scope(entities)}."
+    if len(rows) == 1 and (entities.top_n or 1) == 1:
+        return f"{rows[0][0]} had the highest {measure}{_scope(entities)}, with {_amount(rows[0][1])}."
+    lines = [f"{i}. {product}: {_amount(value)}" for i, (product, value) in enumerate(rows, 1)]
+    return f"The top {len(rows)} products by {measure}{_scope(entities)} were:\n" + "\n".join(lines)
+
+
+def _top_geography_sql(table, entities: Entities) -> str:
+    measure = f"total_{_MEASURES[table.name]}"
+    return (f"SELECT {table.geography_column}, SUM({table.value_column}) AS {measure} "
+            f"FROM `{table.name}`{_where(table, entities)} "
+            f"GROUP BY {table.geography_column} ORDER BY {measure} DESC LIMIT 1")
+
+
+def _top_geography_answer(table, entities: Entities, headers: list, rows: list) -> str:
+    product = entities.products[0][1]
+    if not rows:
+        return f"No data was found for {product}{_scope(entities)}."
+    return f"{rows[0][0]} had the highest {product} {_MEASURES[table.name]}{_scope(entities)}, with {_amount(rows[0][1])}."
+
+
+def _tpr_sql(table, entities: Entities) -> str:
+    return (f"SELECT is_tpr, AVG({table.value_column}) AS avg_weekly_sales, COUNT(*) AS weeks "
+            f"FROM `{table.name}`{_where(table, entities)} GROUP BY is_tpr ORDER BY is_tpr")
+
+
+def _tpr_answer(table, entities: Entities, headers: list, rows: list) -> str:
+    product = entities.products[0][1]
+    by_flag = {int(row[0]): row for row in rows if row[0] is not None}
+    if 1 not in by_flag or 0 not in by_flag:
+        which = "no data" if not by_flag else ("no TPR weeks" if 1 not in by_flag else "no weeks without TPR")
+        return f"There is {which} for {product}{_scope(entities)}, so TPR and non-TPR sales cannot be compared."
+    (_, on, on_weeks), (_, off, off_weeks) = by_flag[1], by_flag[0]
+    change = f"{(on / off - 1) * 100:+.1f}%" if off else "n/a"
+    return (f"{product}{_scope(entities)}: average weekly sales were {_amount(on)} in TPR weeks ({on_weeks} weeks) "
+            f"and {_amount(off)} in other weeks ({off_weeks} weeks), a {change} difference with TPR.")
+
+
+TEMPLATES = (
+    QueryTemplate(
+        "total",
+        patterns=(
+            rf"(?:(?:what|how much) (?:was|were|is|are) |show me |give me |tell me )?(?:total )?{_MEASURE}(?: of| for)? <product>{_FILTERS}",
+            rf"(?:(?:what|how much) (?:was|were|is|are) |show me |give me |tell me )?<product>(?: total)? {_MEASURE}{_FILTERS}",
+            rf"how much(?: {_MEASURE})? did <product> (?:make|generate|sell|bring in|earn){_FILTERS}",
+        ),
+        sql=_total_sql,
+        answer=_total_answer,
+    ),
+    QueryTemplate(
+        "top_products",
+        patterns=(
+            rf"(?:(?:what|which) (?:are|were) |show me |list |give me )?<top n> products(?: by {_MEASURE})?{_FILTERS}",
+            rf"(?:what|which) (?:product|item) (?:had|has|made|generated|sold) (?:highest|most|best|biggest|largest)(?: total)? {_MEASURE}{_FILTERS}",
+            rf"(?:what|which) (?:was|is) (?:best|top) selling (?:product|item){_FILTERS}",
+        ),
+        sql=_top_sql,
+        answer=_top_answer,
+        table=MONTHLY_SALES,
+        needs_product=False,
+    ),
+    QueryTemplate(
+        "top_geography",
+        patterns=(
+            rf"(?:which|what) (?:region|geography|area) (?:sells|sold|has|had) (?:most|highest|best) <product>(?: {_MEASURE})?{_FILTERS}",
+            rf"(?:which|what) (?:region|geography|area) (?:has|had) (?:most|highest|best) <product> {_MEASURE}{_FILTERS}",
+            rf"(?:best|top) (?:region|geography|area) (?:for|of) <product>(?: {_MEASURE})?{_FILTERS}",
+        ),
+        sql=_top_geography_sql,
+        answer=_top_geography_answer,
+        required_columns=("retailer_banner_geography",),
+    ),
+    QueryTemplate(
+        "tpr_vs_non_tpr",
+        patterns=(
+            rf"(?:compare )?{_TPR} (?:vs|versus|and|against) non {_TPR}(?: weeks)?(?: {_MEASURE})?(?: of| for)? <product>(?: {_MEASURE})?{_FILTERS}",
+            rf"(?:compare )?<product>(?: {_MEASURE})? (?:on|with) {_TPR} (?:vs|versus|and|against) (?:off|without|non) {_TPR}?{_FILTERS}",
+            rf"(?:does|do|did) {_TPR} (?:increase|raise|boost|lift|improve|help|grow) <product>(?: {_MEASURE})?{_FILTERS}",
+            rf"(?:what is |what was |how big is )?{_TPR} (?:uplift|lift|effect|impact) (?:of|for|on) <product>(?: {_MEASURE})?{_FILTERS}",
+        ),
+        sql=_tpr_sql,
+        answer=_tpr_answer,
+        required_columns=("is_tpr",),
+    ),
+)
+
+
+# --- Engine ---
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    template: QueryTemplate
+    table: object
+    entities: Entities
+    sql: str
+
+
+class TemplateEngine:
+    """
+    Answers questions that match a query template from its SQL, without any model call.
+
+    A question matches when, once its products, geographies, periods and "top
+    N" are replaced by placeholders, it has one of a template's shapes, and
+    its entities fit the template: one product at most (exactly one unless
+    the template ranks products), at most one geography and period, all of
+    the same table. Anything else is left to the agents' models, as are
+    questions whose query fails.
+    """
+
+    def __init__(self, tables: tuple = (MONTHLY_SALES, WEEKLY_PROMO_SALES), templates: tuple = TEMPLATES,
+                 enabled: bool = SQL_TEMPLATES_ENABLED):
+        self.tables = tuple(tables)
+        self.templates = tuple(template for template in templates if template.table in (None,) + self.tables)
+        self.enabled = enabled
+        self.extractor = EntityExtractor(self.tables)
+        self._lock = threading.Lock()
+        self.answered = {template.name: 0 for template in self.templates}
+        self.unmatched = 0
+        self.failed = 0
+
+    def match(self, question: str):
+        """Returns the TemplateMatch for `question`, or None when no template covers it."""
+        entities = self.extractor.extract(question)
+        tables = {table.name: table for table, _ in entities.products + entities.geographies}
+        if len(entities.products) > 1 or len(entities.geographies) > 1 or len(entities.periods) > 1 or len(tables) > 1:
+            return None
+        for template in self.templates:
+            if template.needs_product != bool(entities.products) or not template.matches(entities.shape):
+                continue
+            table = next(iter(tables.values()), None) or template.table
+            if table is None or table not in self.tables or (template.table is not None and table is not template.table):
+                continue
+            if entities.geographies and table.geography_column is None:
+                continue
+            if not set(template.required_columns) <= set(table.column_names):
+                continue
+            return TemplateMatch(template, table, entities, template.sql(table, entities))
+        return None
+
+    def answer(self, question: str):
+        """Returns (answer, sql) for a question a template covers, or None."""
+        match = self.match(question)
+        if match is None:
+            with self._lock:
+                self.unmatched += 1
+            telemetry.metrics.inc("sql_template_lookups_total", template="unmatched")
+            return None
+        with telemetry.span("sql_template", template=match.template.name, sql=match.sql) as span:
+            try:
+                headers, rows, _, source = query_execution.fetch_rows(match.sql)
+            except (QueryRejectedError, QueryBackendError) as e:
+                span.set(error=str(e))
+                with self._lock:
+                    self.failed += 1
+                telemetry.metrics.inc("sql_template_lookups_total", template="failed")
+                return None
+            span.set(source=source, rows_returned=len(rows))
+        with self._lock:
+            self.answered[match.template.name] += 1
+        telemetry.metrics.inc("sql_template_lookups_total", template=match.template.name)
+        return match.template.answer(match.table, match.entities, headers, rows), match.sql
+
+    def stats(self) -> dict:
+        with self._lock:
+            answered = sum(self.answered.values())
+            total = answered + self.unmatched + self.failed
+            return {
+                "answered": dict(self.answered),
+                "unmatched": self.unmatched,
+                "failed": self.failed,
+                "coverage": answered / total if total else 0.0,
+            }
+
+    def before_model_callback(self, callback_context, llm_request):
+        """
+        ADK `before_model_callback`: on the first model call of a turn, answers a covered question itself.
+
+        The reply ends the turn like a model answer would; questions no
+        template covers go on to the model (or the next callback).
+        """
+        if not self.enabled or not llm_request.contents or llm_request.contents[-1].role != "user":
+            return None
+        parts = llm_request.contents[-1].parts or []
+        if any(part.function_response for part in parts):
+            return None
+        text = " ".join(part.text for part in parts if part.text)
+        result = self.answer(text) if text else None
+        if result is None:
+            return None
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=result[0])]))
@@ -0,0 +1,323 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# --- Metrics ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    In-process counters and duration histograms, rendered in the Prometheus text format.
+
+    Metrics are always recorded (they are cheap); only span export is sampled.
+    """
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}   # (name, labels) -> value
+        self._gauges = {}     # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {self._format(name, labels): value for (name, labels), value in self._counters.items()},
+                "gauges": {self._format(name, labels): value for (name, labels), value in self._gauges.items()},
+                "histograms": {
+                    self._format(name, labels): {"count": h[-1], "sum": h[-2]}
+                    for (name, labels), h in self._histograms.items()
+                },
+            }
+
+    @staticmethod
+    def _format(name: str, labels, extra: tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return name
+        rendered = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+        return f"{name}{{{rendered}}}"
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, list(h)) for key, h in self._histograms.items())
+        lines, typed = [], set()
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in metrics:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{self._format(name, labels)} {value}")
+        for (name, labels), h in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(self.buckets, h):
+                lines.append(f"{self._format(name + '_bucket', labels, (('le', bound),))} {count}")
+            lines.append(f"{self._format(name + '_bucket', labels, (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{self._format(name + '_sum', labels)} {h[-2]}")
+            lines.append(f"{self._format(name + '_count', labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# --- Exporters ---
+
+class CollectorExporter:
+    """
+    Ships finished spans to a local collector as JSON lines, from a background thread.
+
+    `target` is a file path, or `udp://host:port` for a collector agent. The
+    queue is bounded: when the collector cannot keep up spans are dropped (and
+    counted) instead of slowing down the request path.
+    """
+
+    def __init__(self, target: str, max_queue: int = 10000):
+        self.target = target
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="telemetry-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        if self.target.startswith("udp://"):
+            host, port = self.target[len("udp://"):].rsplit(":", 1)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            write = lambda line: sock.sendto(line.encode(), (host, int(port)))
+        else:
+            output = open(self.target, "a", buffering=1)
+            write = output.write
+        while True:
+            record = self._queue.get()
+            try:
+                write(json.dumps(record, default=str) + "\n")
+            except OSError:
+                self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Waits until queued spans are written, for short-lived processes such as benchmarks."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+# --- Spans ---
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "start", "duration", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id, sampled: bool, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": self.start, "duration_ms": round(self.duration * 1000, 3), "attributes": self.attributes,
+        }
+
+
+class _NoSpan:
+    """Stands in for the current span outside of any span, so callers never need to check."""
+    sampled = False
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Telemetry:
+    """
+    Spans and metrics for the agents and their tools, and for the API app (fastapi-agent-app/app/shared.py).
+
+    Every span records its duration in the `span_duration_seconds` histogram.
+    A trace (a root span and all spans opened inside it) is exported to the
+    collector with probability `sample_rate`, so hot paths can be profiled in
+    production without emitting a record per call.
+    """
+
+    def __init__(self, service: str, sample_rate: float = 0.1, exporter: CollectorExporter = None):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.metrics = Metrics()
+        self._current = contextvars.ContextVar(f"{service}_current_span", default=None)
+
+    @classmethod
+    def from_env(cls, service: str):
+        target = os.environ.get("TELEMETRY_EXPORT")
+        return cls(
+            service,
+            sample_rate=float(os.environ.get("TELEMETRY_SAMPLE_RATE") or 0.1),
+            exporter=CollectorExporter(target) if target else None,
+        )
+
+    def current_span(self):
+        return self._current.get() or _NO_SPAN
+
+    def start_span(self, name: str, parent: Span = None, **attributes) -> Span:
+        """Starts a span under `parent` (default: the current span). Close it with `end_span`."""
+        parent = parent or self._current.get()
+        if parent is None:
+            return Span(name, uuid.uuid4().hex, None, random.random() < self.sample_rate, attributes)
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+    def end_span(self, span: Span, error: Exception = None):
+        span.duration = time.time() - span.start
+        if error is not None:
+            span.attributes["error"] = type(error).__name__
+        self.metrics.observe("span_duration_seconds", span.duration, span=span.name)
+        if span.sampled and self.exporter is not None:
+            record = span.to_dict()
+            record["service"] = self.service
+            self.exporter.export(record)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Times the `with` block as a span, which is the current span inside the block."""
+        span = self.start_span(name, **attributes)
+        token = self._current.set(span)
+        error = None
+        try:
+            yield span
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span, error)
+
+
+telemetry = Telemetry.from_env("agents")
+
+
+# --- ADK Agent Instrumentation ---
+
+def _append_callback(existing, callback):
+    if existing is None:
+        return callback
+    if isinstance(existing, list):
+        return existing + [callback]
+    return [existing, callback]
+
+
+def instrument_agent(agent, telemetry: Telemetry = telemetry):
+    """
+    Adds agent and model-call spans and metrics to `agent` and all its sub-agents.
+
+    The callbacks are appended after any existing ones, so a model call
+    answered by an earlier `before_model_callback` (e.g. the pre-router) is
+    not counted as a model call.
+    """
+    open_spans = {} # (invocation_id, agent name, kind) -> (span, parent)
+    lock = threading.Lock()
+
+    def before_agent(callback_context):
+        parent = telemetry._current.get()
+        span = telemetry.start_span(f"agent.{callback_context.agent_name}", parent=parent)
+        with lock:
+            open_spans[(callback_context.invocation_id, callback_context.agent_name, "agent")] = (span, parent)
+        # Tool spans opened while the agent runs nest under it
+        telemetry._current.set(span)
+        return None
+
+    def after_agent(callback_context):
+        with lock:
+            span, parent = open_spans.pop((callback_context.invocation_id, callback_context.agent_name, "agent"), (None, None))
+        if span is not None:
+            telemetry.end_span(span)
+            telemetry._current.set(parent)
+        telemetry.metrics.inc("agent_invocations_total", agent=callback_context.agent_name)
+        return None
+
+    def before_model(callback_context, llm_request):
+        span = telemetry.start_span(f"model.{callback_context.agent_name}", model=llm_request.model)
+        with lock:
+            open_spans[(callback_context.invocation_id, callback_context.agent_name, "model")] = (span, None)
+        return None
+
+    def after_model(callback_context, llm_response):
+        agent_name = callback_context.agent_name
+        with lock:
+            span, _ = open_spans.pop((callback_context.invocation_id, agent_name, "model"), (None, None))
+        telemetry.metrics.inc("model_calls_total", agent=agent_name)
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            telemetry.metrics.inc("model_prompt_tokens_total", usage.prompt_token_count or 0, agent=agent_name)
+            telemetry.metrics.inc("model_output_tokens_total", usage.candidates_token_count or 0, agent=agent_name)
+            # Prompt tokens served from the provider's context cache (the stable instruction prefix, see common/prompts.py)
+            telemetry.metrics.inc("model_cached_tokens_total", usage.cached_content_token_count or 0, agent=agent_name)
+        if span is not None:
+            if usage is not None:
+                span.set(prompt_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count,
+                         cached_tokens=usage.cached_content_token_count)
+            telemetry.end_span(span)
+        return None
+
+    agent.before_agent_callback = _append_callback(agent.before_agent_callback, before_agent)
+    agent.after_agent_callback = _append_callback(agent.after_agent_callback, after_agent)
+    if hasattr(agent, "before_model_callback"):
+        agent.before_model_callback = _append_callback(agent.before_model_callback, before_model)
+        agent.after_model_callback = _append_callback(agent.after_model_callback, after_model)
+    for sub_agent in agent.sub_agents:
+        instrument_agent(sub_agent, telemetry)
+    return agent
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+from common.backends import get_backend
+from common.calendar_service import calendar_provider
+from common.forecasting import sales_forecaster
+from common.promo_uplift import uplift_engine
+from common.query_execution import rollup_router
+from common.schema import TABLES
+from common.telemetry import telemetry
+
+
+# Warm the agent's connections and caches in the background after import (off by default)
+PREWARM_ENABLED = os.environ.get("AGENT_PREWARM", "false").lower() == "true"
+
+_started = False
+_lock = threading.Lock()
+
+
+def _warm_backend():
+    backend = get_backend()
+    # Free metadata lookups: create a pooled client, resolve credentials and open a connection
+    for table_name in TABLES:
+        backend.table_version(table_name)
+
+
+def _warm_rollups():
+    if rollup_router is not None:
+        rollup_router.store.refresh()
+
+
+def _warm_uplift():
+    uplift_engine.uplift()
+
+
+def _warm_forecasts():
+    sales_forecaster.refresh()
+
+
+def _warm_calendar():
+    # Never starts the browser sign-in from a background thread
+    if os.path.exists(calendar_provider.token_file):
+        calendar_provider.service(interactive=False)
+
+
+STEPS = (("backend", _warm_backend), ("rollups", _warm_rollups), ("uplift", _warm_uplift),
+         ("forecasts", _warm_forecasts), ("calendar", _warm_calendar))
+
+
+def prewarm(steps=STEPS):
+    """
+    Does the work the first question would otherwise wait for: connecting to
+    the warehouse, building the rollup cubes and the promotion uplift table,
+    loading (or fitting) the sales forecasts, and loading calendar credentials.
+
+    Each step is independent; a failing step is reported and skipped, and the
+    first real request simply does that work itself.
+    """
+    with telemetry.span("agent.prewarm") as span:
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Prewarm: {name} failed: {e}")
+                span.set(**{f"{name}_error": str(e)})
+                continue
+            span.set(**{f"{name}_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+
+def start_prewarm():
+    """Runs `prewarm` once per process on a background thread, so it never delays startup."""
+    global _started
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    thread = threading.Thread(target=prewarm, name="agent-prewarm", daemon=True)
+    thread.start()
+    return thread
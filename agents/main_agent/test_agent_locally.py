@@ -1,9 +1,14 @@
 import logging
+import os
+import sys
 import google.cloud.logging
 import asyncio
 
 from vertexai.preview import reasoning_engines
 
+# Make the shared `common` package importable when running from the agent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from agent import root_agent
 
 logging.basicConfig(level=logging.INFO)
@@ -1,91 +1,36 @@
-import os
 from google.adk import Agent
-from google.cloud import bigquery
-from google.api_core.exceptions import GoogleAPIError
 
+from common.forecasting import forecast_sales
+from common.prompts import FORECAST_SECTION, SQL_SECTIONS, PromptCompiler
+from common.query_execution import execute_bigquery_queries, execute_bigquery_query
+from common.schema import MONTHLY_SALES
+from common.sql_templates import TemplateEngine
+from common.telemetry import instrument_agent
+from common.warmup import PREWARM_ENABLED, start_prewarm
 
 
-# --- Define the BigQuery Tool ---
-
-def execute_bigquery_query(sql_query: str) -> str:
-    """
-    Executes a BigQuery SQL query and returns the results.
-    The query must be a valid BigQuery SELECT statement.
-    Results are truncated to the first 50 rows for brevity if many rows are returned.
-
-    Args:
-        sql_query (str): The BigQuery SQL query to execute. MUST be a SELECT statement.
-                         Always include the full table path, e.g., `your-gcp-project-id.sales_analyst_mvp.monthly_sales_data`.
-
-    Returns:
-        str: A string representation of the query results (first 50 rows), or an error message.
-    """
-    print(f"\n--- Tool Call: Executing BigQuery Query ---\n{sql_query}\n--- End Tool Call ---\n")
-    # Initialize BigQuery Client
-    bq_client = bigquery.Client(project="hacker2025-team-199-dev")
-
-    try:
-        # Basic validation to ensure it's a SELECT statement for safety
-        if not sql_query.strip().upper().startswith("SELECT"):
-            return "ERROR: Only SELECT queries are allowed for security reasons."
-
-        query_job = bq_client.query(sql_query)
-        rows = list(query_job.result(max_results=50)) # Limit results to 5 rows for LLM context
-
-        if not rows:
-            return "Query executed successfully, but no results were found."
-
-        # Format results for the LLM
-        # Get column names (headers)
-        headers = [field.name for field in query_job.result().schema]
-        result_str = ",".join(headers) + "\n"
-
-        # Add rows
-        for row in rows:
-            values = [str(row[field.name]) for field in query_job.result().schema]
-            result_str += ",".join(values) + "\n"
-
-        return result_str
-
-    except GoogleAPIError as e:
-        return f"BigQuery API Error: {e}"
-    except Exception as e:
-        return f"An unexpected error occurred during query execution: {e}"
-
 # --- Define the Agent ---
 
-# This is where you provide the schema context to the LLM.
-# Make it as precise and helpful as possible.
-# Include descriptions for columns as that helps the LLM understand their meaning.
-bigquery_schema_context = f"""
-You have access to the following BigQuery table:
-Table: `hacker2025-team-199-dev.sales_analyst.artificial_sales`
+# The instructions are compiled from the table descriptions in common/schema.py (see common/prompts.py)
+prompt = PromptCompiler("retail_agent", MONTHLY_SALES, sections=SQL_SECTIONS + (FORECAST_SECTION,))
 
-Columns:
-  - `Date` (DATE): The first day of the month for sales data (e.g., '2023-01-01').
-  - `ProductId` (STRING): Unique identifier for a product (e.g., 'P01', 'P02').
-  - `ProductName` (STRING): Name of the product (e.g., 'Basic T-Shirt', 'Wireless Headphones').
-  - `SalesRevenue` (NUMERIC): Total sales revenue for the month for this product.
-
-Guidelines for generating SQL:
-1. Always use the fully qualified table name: `hacker2025-team-199-dev.sales_analyst.artificial_sales`.
-2. For date filtering, use `PARSE_DATE('%Y-%m-%d', 'YYYY-MM-DD')` or date functions like `DATE_TRUNC`, `CURRENT_DATE()`, `EXTRACT`.
-3. If a question asks for "total" or "sum", use `SUM()`.
-4. If a question asks for "average", use `AVG()`.
-5. If a question asks for "count", use `COUNT()`.
-6. If a question asks for "top" or "highest", use `ORDER BY` and `LIMIT`.
-7. Always `GROUP BY` and `ORDER BY` appropriately when using aggregate functions.
-8. Assume you are always asking about revenue, if not specified.
-9. Consider the user's question, and respond concisely based on the query results.
-10. If the query result is empty, clearly state that no data was found.
-"""
+# Questions with a known shape are answered from SQL without any model call (set SQL_TEMPLATES_ENABLED=false to disable)
+template_engine = TemplateEngine(tables=(MONTHLY_SALES,))
 
 # Create the Agent instance
 root_agent = Agent(
     name="retail_agent",
     description="Answer questions about sales data using BigQuery",
     model='gemini-2.0-flash-001', # You can try 'gemini-1.5-pro' if you have access and need larger context
-    tools=[execute_bigquery_query], # Register your BigQuery tool
-    instruction=bigquery_schema_context,
+    tools=[execute_bigquery_query, execute_bigquery_queries, forecast_sales], # Register your BigQuery tools
+    instruction=prompt.instruction,
+    before_model_callback=[template_engine.before_model_callback, prompt.before_model_callback],
     # enable_structured_response=True # Often helpful for more reliable tool calling
-)
\ No newline at end of file
+)
+
+# Spans and metrics for every agent and model call
+instrument_agent(root_agent)
+
+# Connect to the warehouse, build the rollups and load calendar credentials in the background (AGENT_PREWARM=true)
+if PREWARM_ENABLED:
+    start_prewarm()
@@ -1,8 +1,12 @@
 import os
+import sys
 import vertexai
 from vertexai import agent_engines
 from dotenv import load_dotenv
 
+# Make the shared `common` package importable when running from the agent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from agent import root_agent
 
 load_dotenv()
@@ -17,7 +21,7 @@ remote_app = agent_engines.create(
     display_name=os.getenv("APP_NAME", "Agent App"),
     agent_engine=root_agent,
     requirements=[
-        "google-cloud-aiplatform[adk,agent_engines]"
+        "google-cloud-aiplatform[adk,agent_engines]", "numpy"
     ],
-    extra_packages = ["agent.py"]
+    extra_packages = ["agent.py", "../common"]
 )
\ No newline at end of file
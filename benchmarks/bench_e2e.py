@@ -0,0 +1,395 @@
+"""
+End-to-end latency benchmark of the agents and the FastAPI /query endpoint, fully offline.
+
+Drives `root_agent`, `sales_agent`, `promo_agent` (from agents/main_agent) or
+the real /query handler and agent_service with the questions in
+benchmarks/corpus.json. The model, BigQuery, Google Calendar and the remote
+agent engine are replaced by deterministic local stand-ins with configurable
+latency:
+
+  - the LLM answers from the corpus (routing decision, SQL or calendar call,
+    then a short answer), sleeping a base latency plus a per-1k-prompt-chars
+    cost so prompt size shows up in the numbers;
+  - BigQuery is the DuckDB LocalBackend over generated data, plus a fixed
+    round-trip latency per query that reaches the backend;
+  - Calendar requests return canned events after a fixed latency.
+
+Each question is split into stages from the ADK event stream: routing
+(steering decision), sql_generation (model call that produces the tool call),
+query_execution (tool run) and formatting (final answer). Stage and total
+p50/p95/p99 latencies and throughput are reported per concurrency level.
+Requires duckdb, and fastapi + httpx for --target api.
+
+Run from the repository root:
+    python benchmarks/bench_e2e.py --target root --concurrency 1 8 --requests 48
+    python benchmarks/bench_e2e.py --target api --concurrency 1 8 32 --llm-latency-ms 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(ROOT)
+
+STAGES = ("routing", "sql_generation", "query_execution", "formatting", "total")
+
+
+# --- Stand-ins ---
+
+def load_corpus(path: str) -> list:
+    with open(path) as f:
+        return json.load(f)
+
+
+def generate_local_data(data_dir: str, seed: int = 42):
+    """Writes both tables with generate_data.py's defaults into `data_dir`."""
+    import generate_data
+
+    for table, output, start, end, freq in (
+        ("sales", generate_data.OUTPUT_FILENAME, generate_data.START_DATE, generate_data.END_DATE, "monthly"),
+        ("promo", generate_data.PROMO_OUTPUT_FILENAME, generate_data.PROMO_START_DATE, generate_data.PROMO_END_DATE, "weekly"),
+    ):
+        num_products = generate_data.NUM_PRODUCTS if table == "sales" else len(generate_data.promo_product_configs)
+        frames = generate_data.generate_frames(table, num_products, len(generate_data.GEOGRAPHIES), start, end, freq, seed)
+        generate_data.write_frames(frames, os.path.join(data_dir, output), "csv")
+
+
+def make_latency_backend(inner, latency: float):
+    """Wraps a QueryBackend so every query that reaches it pays a BigQuery-like round trip."""
+    from common.backends import QueryBackend
+
+    class LatencyBackend(QueryBackend):
+        name = f"{inner.name}+latency"
+
+        def __init__(self):
+            self.queries = 0
+
+        def run(self, sql_query, max_results, timeout=None):
+            self.queries += 1
+            time.sleep(latency)
+            return inner.run(sql_query, max_results, timeout)
+
+        def table_version(self, table_name):
+            return inner.table_version(table_name)
+
+        def dry_run(self, sql_query):
+            # A dry run is a round trip too (set GUARD_DRY_RUN=false to measure without it)
+            time.sleep(latency)
+            return inner.dry_run(sql_query)
+
+    return LatencyBackend()
+
+
+class FakeCalendarRequest:
+    def __init__(self, result: dict, latency: float):
+        self._result = result
+        self._latency = latency
+
+    def execute(self, http=None):
+        time.sleep(self._latency)
+        return self._result
+
+
+class FakeCalendarService:
+    """Answers `events().list(...)` and `events().insert(...)` like the Calendar API would."""
+
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def events(self):
+        return self
+
+    def list(self, **kwargs):
+        events = [
+            {"summary": f"Promo review {i}", "start": {"dateTime": f"2024-03-2{i}T10:00:00Z"},
+             "end": {"dateTime": f"2024-03-2{i}T11:00:00Z"}}
+            for i in range(min(3, kwargs.get("maxResults", 3)))
+        ]
+        return FakeCalendarRequest({"items": events}, self._latency)
+
+    def insert(self, calendarId, body):
+        return FakeCalendarRequest({"htmlLink": "https://calendar.example/event/1"}, self._latency)
+
+
+def install_fake_calendar(latency: float):
+    from common.calendar_service import calendar_provider
+
+    service = FakeCalendarService(latency)
+    calendar_provider.service = lambda: service
+    calendar_provider.execute = lambda request: request.execute()
+
+
+def make_fake_llm(role: str, script: dict, base_latency: float, latency_per_1k_chars: float, prompt_chars: dict):
+    """
+    Returns a deterministic BaseLlm for one agent.
+
+    `role` is 'router' (answers with a transfer to the corpus agent) or 'worker'
+    (answers with the corpus tool call, then with a summary of the tool result).
+    """
+    from google.adk.models import BaseLlm, LlmResponse
+    from google.genai import types
+
+    class FakeLlm(BaseLlm):
+        model: str = f"fake-{role}"
+
+        async def generate_content_async(self, llm_request, stream=False):
+            contents = llm_request.contents or []
+            instruction = llm_request.config.system_instruction if llm_request.config else None
+            chars = len(str(instruction or "")) + sum(len(part.text or "") for c in contents for part in (c.parts or []))
+            prompt_chars.setdefault(role, []).append(chars)
+            await asyncio.sleep(base_latency + latency_per_1k_chars * chars / 1000)
+
+            entry = next(
+                (script[part.text.strip()] for c in contents for part in (c.parts or [])
+                 if part.text and part.text.strip() in script),
+                None,
+            )
+            last_parts = contents[-1].parts or [] if contents else []
+            responses = [part.function_response for part in last_parts if part.function_response]
+            if entry is None:
+                part = types.Part(text="I can only answer questions about sales, promotions and the calendar.")
+            elif role == "router":
+                part = types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": entry["agent"]}))
+            elif not responses:
+                args = entry.get("args") or {"sql_query": entry["sql"]}
+                part = types.Part(function_call=types.FunctionCall(name=entry["tool"], args=args))
+            else:
+                result = str((responses[0].response or {}).get("result", ""))
+                part = types.Part(text="Here is what I found:\n" + "\n".join(result.splitlines()[:5]))
+            yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+    return FakeLlm()
+
+
+# --- Harness ---
+
+class Harness:
+    """Runs corpus questions through an ADK agent and records per-stage latencies."""
+
+    def __init__(self, agent, app_name: str = "bench"):
+        from google.adk.runners import InMemoryRunner
+
+        self.runner = InMemoryRunner(agent=agent, app_name=app_name)
+        self.timings = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.timings = {stage: [] for stage in STAGES}
+
+    async def ask(self, question: str) -> list:
+        """Asks `question` in a fresh session and returns the answer's text parts."""
+        from google.genai import types
+
+        user_id = f"bench-{uuid.uuid4().hex[:8]}"
+        session = await self.runner.session_service.create_session(app_name=self.runner.app_name, user_id=user_id)
+        start = time.perf_counter()
+        marks, texts = {}, []
+        async for event in self.runner.run_async(
+            user_id=user_id, session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+        ):
+            now = time.perf_counter()
+            calls = [call.name for call in event.get_function_calls()]
+            responses = [response.name for response in event.get_function_responses()]
+            if "transfer_to_agent" in responses:
+                marks.setdefault("routing", now)
+            elif any(name != "transfer_to_agent" for name in calls):
+                marks.setdefault("sql_generation", now)
+            elif responses:
+                marks.setdefault("query_execution", now)
+            if event.is_final_response() and event.content and event.content.parts:
+                texts.extend(part.text for part in event.content.parts if part.text)
+        marks["formatting"] = time.perf_counter()
+
+        previous = start
+        with self._lock:
+            for stage in STAGES[:-1]:
+                if stage in marks:
+                    self.timings[stage].append(marks[stage] - previous)
+                    previous = marks[stage]
+            self.timings["total"].append(marks["formatting"] - start)
+        return texts
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def drive(ask, questions: list, concurrency: int):
+    """Sends `questions` with at most `concurrency` in flight; returns (elapsed, request latencies)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(question):
+        async with semaphore:
+            start = time.perf_counter()
+            await ask(question)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(question) for question in questions))
+    return time.perf_counter() - start, latencies
+
+
+class LocalAgentEngine:
+    """Stands in for the remote agent engine of agent_service: every question runs locally through `harness`."""
+
+    def __init__(self, harness: Harness):
+        self.harness = harness
+
+    def create_session(self, user_id: str):
+        return {"id": uuid.uuid4().hex}
+
+    def delete_session(self, user_id: str, session_id: str):
+        pass
+
+    def stream_query(self, user_id: str, session_id: str, message: str):
+        # Runs on the app's worker threads, each with its own event loop
+        for text in asyncio.run(self.harness.ask(message)):
+            yield {"content": {"parts": [{"text": text}]}}
+
+
+def build_api_app(harness: Harness, answer_cache: bool = False):
+    """Imports the real FastAPI app and agent_service, with the remote agent engine replaced by `harness`."""
+    import httpx
+
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+    os.environ.setdefault("GOOGLE_CLOUD_LOCATION", "us-central1")
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "true" if answer_cache else "false"
+    os.environ["AGENT_PREWARM"] = "false"
+    sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+    import agent_service
+
+    # agent_service initializes the remote engine lazily, so it never contacts Vertex AI here
+    agent_service._remote_app = LocalAgentEngine(harness)
+    import main as fastapi_main
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fastapi_main.app), base_url="http://bench", timeout=None)
+
+    async def ask(question: str):
+        response = await client.post("/query", json={"question": question, "user_id": "bench"})
+        response.raise_for_status()
+        return response.json()["answer"]
+
+    return ask, fastapi_main.agent_executor
+
+
+def print_report(target: str, concurrency: int, elapsed: float, latencies: list, timings: dict, prompt_chars: dict):
+    print(f"\n{target} | concurrency {concurrency} | {len(latencies)} questions | {len(latencies) / elapsed:.1f} q/s")
+    print(f"  {'stage':<18}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = [(stage, timings[stage]) for stage in STAGES]
+    if target == "api":
+        rows.append(("http_request", latencies))
+    for stage, values in rows:
+        if values:
+            print(f"  {stage:<18}{len(values):>5}{percentile(values, 0.5) * 1000:>10.1f}"
+                  f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+    for role, chars in sorted(prompt_chars.items()):
+        print(f"  {role} LLM calls: {len(chars)}, avg prompt {sum(chars) / len(chars):.0f} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["root", "sales", "promo", "api"], default="root")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.json"))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=46, help="Questions sent per concurrency level.")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-ms-per-1k-chars", type=float, default=5.0)
+    parser.add_argument("--warehouse-latency-ms", type=float, default=150.0)
+    parser.add_argument("--calendar-latency-ms", type=float, default=80.0)
+    parser.add_argument("--data-dir", help="Directory with the table CSVs (default: generated into a temp dir).")
+    parser.add_argument("--cold", action="store_true", help="Clear the query result cache before every question.")
+    parser.add_argument("--no-rollups", action="store_true", help="Send every aggregate query to the warehouse.")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' and tools' own output.")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the API's semantic answer cache on (--target api).")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("google_adk").setLevel(logging.ERROR)
+    quiet = contextlib.nullcontext if args.verbose else lambda: contextlib.redirect_stdout(io.StringIO())
+
+    if args.no_rollups:
+        os.environ["ROLLUPS_ENABLED"] = "false"
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-e2e-")
+    if not args.data_dir:
+        generate_local_data(data_dir)
+
+    from common.backends import LocalBackend, set_backend
+    from common import query_execution
+    from main_agent import agent as main_agent
+
+    backend = make_latency_backend(LocalBackend(data_dir=data_dir), args.warehouse_latency_ms / 1000)
+    set_backend(backend)
+    install_fake_calendar(args.calendar_latency_ms / 1000)
+
+    corpus = load_corpus(args.corpus)
+    script = {entry["question"]: entry for entry in corpus}
+    prompt_chars = {}
+    llm = lambda role: make_fake_llm(role, script, args.llm_latency_ms / 1000, args.llm_ms_per_1k_chars / 1000, prompt_chars)
+    main_agent.root_agent.model = llm("router")
+    main_agent.sales_agent.model = llm("worker")
+    main_agent.promo_agent.model = llm("worker")
+
+    agents = {"root": main_agent.root_agent, "api": main_agent.root_agent,
+              "sales": main_agent.sales_agent, "promo": main_agent.promo_agent}
+    if args.target == "sales":
+        corpus = [entry for entry in corpus if entry["agent"] == "retail_agent"]
+    elif args.target == "promo":
+        corpus = [entry for entry in corpus if entry["agent"] == "promo_agent"]
+    harness = Harness(agents[args.target])
+
+    executor = None
+    if args.target == "api":
+        ask, executor = build_api_app(harness, args.answer_cache)
+        if not args.verbose:
+            # agent_service logs every answer at INFO level
+            logging.getLogger().setLevel(logging.WARNING)
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+    else:
+        ask = harness.ask
+    if args.cold:
+        plain_ask = ask
+
+        async def ask(question):
+            query_execution.result_cache.clear()
+            return await plain_ask(question)
+
+    questions = [corpus[i % len(corpus)]["question"] for i in range(args.requests)]
+    print(f"Target {args.target}, {len(corpus)} corpus questions, data in {data_dir}")
+    print(f"LLM {args.llm_latency_ms:.0f} ms + {args.llm_ms_per_1k_chars:.1f} ms/1k chars, "
+          f"warehouse {args.warehouse_latency_ms:.0f} ms, calendar {args.calendar_latency_ms:.0f} ms")
+
+    # Warm up once over the corpus (rollup cubes, caches, imports), unmeasured
+    with quiet():
+        asyncio.run(drive(ask, [entry["question"] for entry in corpus], 1))
+    for concurrency in args.concurrency:
+        harness.reset()
+        prompt_chars.clear()
+        with quiet():
+            elapsed, latencies = asyncio.run(drive(ask, questions, concurrency))
+        print_report(args.target, concurrency, elapsed, latencies, harness.timings, prompt_chars)
+
+    print(f"\nWarehouse queries: {backend.queries}, result cache: {query_execution.result_cache.stats()}")
+    if query_execution.rollup_router is not None:
+        print(f"Rollup router: {query_execution.rollup_router.stats()}")
+    if args.target in ("root", "api"):
+        print(f"Pre-router: {main_agent.pre_router.stats()}")
+    if executor is not None:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
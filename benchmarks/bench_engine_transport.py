@@ -0,0 +1,161 @@
+"""
+Measures connection reuse, tail latency and failure handling of EngineTransport against a local fake engine.
+
+The fake engine (benchmarks/fake_agent_engine.py) is served over TLS with a
+self-signed certificate, so each new connection pays a real handshake.
+Concurrent users each run --requests-per-user streamed queries:
+
+  - "new conn": keep-alive disabled, every call opens a new TLS connection,
+    as a client stack without connection reuse does;
+  - "pooled": the shared keep-alive pool of EngineTransport.
+
+Then, with pooling on, the engine fails --failure-rate of the calls with 503
+(with and without retries), and finally goes down entirely, to show the
+circuit breaker failing calls fast instead of sending them.
+
+Run from the repository root:
+    python benchmarks/bench_engine_transport.py --users 1 8 32 --requests-per-user 10
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+
+import uvicorn
+
+from engine_transport import CircuitBreaker, EngineTransport, EngineUnavailableError
+from fake_agent_engine import FakeEngineState, build_app
+
+RESOURCE = "projects/bench/locations/local/reasoningEngines/1"
+
+
+def self_signed_certificate(directory: str):
+    key, cert = os.path.join(directory, "key.pem"), os.path.join(directory, "cert.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+                    "-days", "1", "-subj", "/CN=127.0.0.1"], check=True, capture_output=True)
+    return key, cert
+
+
+def serve(state: FakeEngineState, tls: bool):
+    """Starts the fake engine on a background thread and returns its endpoint."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    options = {}
+    if tls:
+        options["ssl_keyfile"], options["ssl_certfile"] = self_signed_certificate(tempfile.mkdtemp(prefix="fake-engine-"))
+    server = uvicorn.Server(uvicorn.Config(build_app(state), port=port, log_level="warning",
+                                           timeout_keep_alive=60, **options))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"{'https' if tls else 'http'}://127.0.0.1:{port}/v1"
+
+
+def run_load(transport: EngineTransport, users: int, requests_per_user: int):
+    latencies, errors = [], {}
+    lock = threading.Lock()
+
+    def user(index):
+        session_id = None
+        for i in range(requests_per_user):
+            start = time.perf_counter()
+            try:
+                session_id = session_id or transport.create_session(user_id=f"user-{index}")["id"]
+                for _ in transport.stream_query(user_id=f"user-{index}", session_id=session_id, message=f"q{i}"):
+                    pass
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(0.5),
+        "p99": percentile(0.99),
+        "ok": len(latencies),
+        "errors": errors,
+    }
+
+
+def transport_for(endpoint: str, **options) -> EngineTransport:
+    return EngineTransport(RESOURCE, endpoint, verify=False, backoff=0.01, max_backoff=0.1, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=5, help="Events streamed per fake answer.")
+    parser.add_argument("--chunk-latency-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP (no handshake cost).")
+    args = parser.parse_args()
+
+    state = FakeEngineState(args.chunks, args.chunk_latency_ms / 1000)
+    endpoint = serve(state, tls=not args.no_tls)
+
+    print(f"{'mode':<10}{'users':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'conns':>7}  protocol")
+    for mode in ("new conn", "pooled"):
+        for users in args.users:
+            state.reset_counters()
+            # An expiry of 0 closes every connection once its call ends
+            transport = transport_for(endpoint, keepalive_expiry=0 if mode == "new conn" else 60)
+            result = run_load(transport, users, args.requests_per_user)
+            transport.close()
+            print(f"{mode:<10}{users:>6}{result['throughput']:>9.1f}{result['p50']:>9.1f}{result['p99']:>9.1f}"
+                  f"{len(state.connections):>7}  {state.http_versions}")
+
+    users = max(args.users)
+    print(f"\nEngine failing {args.failure_rate:.0%} of calls with 503, {users} users:")
+    state.failure_rate = args.failure_rate
+    for retries in (0, 3):
+        state.reset_counters()
+        transport = transport_for(endpoint, max_retries=retries,
+                                  breaker=CircuitBreaker(failure_threshold=1000, reset_timeout=1))
+        result = run_load(transport, users, args.requests_per_user)
+        transport.close()
+        total = users * args.requests_per_user
+        print(f"  retries={retries}: {result['ok']}/{total} answered, p99 {result['p99']:.1f} ms, "
+              f"{transport.retries} retries, errors {result['errors']}")
+    state.failure_rate = 0.0
+
+    print("\nEngine down:")
+    state.outage = True
+    state.reset_counters()
+    transport = transport_for(endpoint, max_retries=1, breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    rejected, start = 0, time.perf_counter()
+    for i in range(50):
+        try:
+            list(transport.stream_query(user_id="u", session_id="s", message=f"q{i}"))
+        except EngineUnavailableError:
+            rejected += 1
+        except Exception:
+            pass
+    elapsed = time.perf_counter() - start
+    transport.close()
+    print(f"  50 calls in {elapsed * 1000:.0f} ms: {state.requests} reached the engine, "
+          f"{rejected} failed fast with the circuit open")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Measures the app's bulk export path (POST /export) against buffering the whole result.
+
+Generates the monthly sales table for --products products (36 months each)
+into DuckDB and serves it through a stand-in BigQuery client that pages
+results like BigQuery's RowIterator (--page-size rows per page). For the
+full table, in CSV and Parquet:
+
+  - streamed: `ResultExporter.start(...).chunks()`, what /export sends;
+  - buffered: fetching every row first, then writing the whole file at once.
+
+Reports the time, output size and peak Python memory (tracemalloc) of each,
+and checks both files hold the same rows. Then exports through the app with
+the FastAPI test client: a SELECT, and the SQL recorded from a fake agent's
+last answer. The same rows through /query would take one question per
+50-row answer.
+
+Run from the repository root:
+    python benchmarks/bench_export.py --products 20000
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+sys.path.append(ROOT)
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import generate_data
+
+TABLE = "hacker2025-team-199-dev.sales_analyst.artificial_sales"
+SQL = f"SELECT Date, ProductId, ProductName, SalesRevenue FROM `{TABLE}` ORDER BY ProductId, Date"
+_FIELD_TYPES = {"DATE": "DATE", "BIGINT": "INTEGER", "INTEGER": "INTEGER", "DOUBLE": "FLOAT", "VARCHAR": "STRING"}
+
+
+class DuckDBBigQueryClient:
+    """Answers `query(...).result(page_size=...)` from DuckDB, fetching one page per step like BigQuery's RowIterator."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.queries = 0
+
+    def __call__(self, project=None):
+        return self
+
+    def query(self, sql, job_config=None):
+        self.queries += 1
+        return SimpleNamespace(result=lambda page_size=None: self._rows(sql, page_size), total_bytes_processed=0)
+
+    def _rows(self, sql, page_size):
+        sql = sql.replace(f"`{TABLE}`", "artificial_sales")
+        total = self.connection.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+        cursor = self.connection.cursor()
+        cursor.execute(sql)
+        schema = [SimpleNamespace(name=name, field_type=_FIELD_TYPES.get(str(kind), "STRING"), mode="NULLABLE")
+                  for name, kind, *_ in cursor.description]
+
+        def pages():
+            while True:
+                rows = cursor.fetchmany(page_size or 10_000)
+                if not rows:
+                    return
+                yield [SimpleNamespace(values=lambda row=row: row) for row in rows]
+
+        return SimpleNamespace(schema=schema, total_rows=total, pages=pages())
+
+
+def measure(func):
+    """(seconds, peak traced bytes, result) of `func()`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def streamed(exporter, file_format: str, output) -> int:
+    """Writes the export's chunks to `output` as they arrive; returns the bytes written."""
+    size = 0
+    for chunk in exporter.start(SQL, file_format).chunks():
+        size += len(chunk)
+        output.write(chunk)
+    return size
+
+
+def buffered(client, file_format: str, output) -> int:
+    """Fetches every row, then builds the whole file in memory and writes it to `output`."""
+    result = client.query(SQL).result(page_size=10 ** 9)
+    headers = [field.name for field in result.schema]
+    rows = [tuple(row.values()) for page in result.pages for row in page]
+    if file_format == "csv":
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(headers)
+        writer.writerows(rows)
+        data = text.getvalue().encode()
+    else:
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pylist([dict(zip(headers, row)) for row in rows]), sink)
+        data = sink.getvalue().to_pybytes()
+    output.write(data)
+    return len(data)
+
+
+def read_rows(data: bytes, file_format: str) -> tuple:
+    """(row count, sum of SalesRevenue) of an exported file."""
+    if file_format == "csv":
+        reader = csv.reader(io.StringIO(data.decode()))
+        next(reader)
+        count = total = 0
+        for row in reader:
+            count += 1
+            total += int(row[3])
+        return count, total
+    table = pq.read_table(pa.BufferReader(data))
+    return table.num_rows, int(pa.compute.sum(table["SalesRevenue"]).as_py())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+    os.environ.setdefault("GOOGLE_CLOUD_LOCATION", "us-central1")
+    os.environ["EXPORT_TABLES"] = TABLE
+    os.environ["EXPORT_PAGE_SIZE"] = str(args.page_size)
+
+    frame = pa.concat_tables(
+        pa.Table.from_pandas(chunk) for chunk in generate_data.generate_frames(
+            "sales", args.products, 1, generate_data.START_DATE, generate_data.END_DATE, "monthly", args.seed)
+    )
+    connection = duckdb.connect()
+    connection.register("generated", frame)
+    connection.execute("CREATE TABLE artificial_sales AS SELECT CAST(Date AS DATE) AS Date, ProductId, ProductName, "
+                       "SalesRevenue FROM generated")
+    connection.unregister("generated")
+    del frame
+    client = DuckDBBigQueryClient(connection)
+
+    import agent_service
+    from export import ResultExporter
+    from google.cloud import bigquery # Imported by the first export; loaded here so it is not counted in its memory
+
+    # agent_service logs every answer at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    exporter = ResultExporter.from_env("bench-project")
+    exporter._client_factory = client
+    total_rows = connection.execute("SELECT COUNT(*) FROM artificial_sales").fetchone()[0]
+    print(f"{total_rows} rows, {args.page_size} rows per page")
+
+    print(f"\n{'format':<9}{'mode':<10}{'seconds':>9}{'MB out':>9}{'peak MB':>9}")
+    for file_format in ("csv", "parquet"):
+        results = {}
+        for mode, run in (("streamed", streamed), ("buffered", buffered)):
+            with tempfile.TemporaryFile() as output:
+                seconds, peak, size = measure(lambda: run(exporter if mode == "streamed" else client, file_format, output))
+                output.seek(0)
+                results[mode] = read_rows(output.read(), file_format)
+            print(f"{file_format:<9}{mode:<10}{seconds:>9.2f}{size / 1e6:>9.1f}{peak / 1e6:>9.1f}")
+        assert results["streamed"] == results["buffered"] and results["streamed"][0] == total_rows, results
+
+    # Through the app: a SELECT, and the SQL behind a fake agent's last answer
+    from fastapi.testclient import TestClient
+    import main
+
+    class FakeAgentEngine:
+        def create_session(self, user_id):
+            return {"id": uuid.uuid4().hex}
+
+        def delete_session(self, user_id, session_id):
+            pass
+
+        def stream_query(self, user_id, session_id, message):
+            yield {"content": {"parts": [{"function_call": {"name": "execute_bigquery_query", "args": {"sql_query": SQL}}}]}}
+            yield {"content": {"parts": [{"text": "Here are the first 50 rows of the monthly sales."}]}}
+
+    agent_service._remote_app = FakeAgentEngine()
+    main.exporter._client_factory = client
+    with TestClient(main.app) as http:
+        checks = {
+            "select": http.post("/export", json={"sql": SQL, "format": "csv"}),
+            "last answer": (http.post("/query", json={"question": "Monthly sales of every product", "user_id": "analyst"}),
+                            http.post("/export", json={"format": "parquet", "user_id": "analyst"}))[1],
+            "rejected": http.post("/export", json={"sql": f"DELETE FROM `{TABLE}` WHERE TRUE"}),
+            "other table": http.post("/export", json={"sql": "SELECT * FROM `other.dataset.table`"}),
+            "comma join": http.post("/export", json={"sql": f"SELECT * FROM `{TABLE}` s, `other.dataset.table` o"}),
+            "table func": http.post("/export", json={"sql": "SELECT * FROM EXTERNAL_QUERY('other.us.conn', 'SELECT 1')"}),
+        }
+    for name, response in checks.items():
+        detail = (f"{read_rows(response.content, 'csv' if name == 'select' else 'parquet')[0]} rows"
+                  if response.status_code == 200 else response.json()["detail"])
+        print(f"/export {name:<12}{response.status_code:>5}  {detail}")
+    print(f"The same rows through /query: {-(-total_rows // 50)} questions at 50 rows per answer")
+
+
+if __name__ == "__main__":
+    main()
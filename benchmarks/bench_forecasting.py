@@ -0,0 +1,153 @@
+"""
+Measures fitting and serving the sales forecasts of common/forecasting.py.
+
+Loads --train-months months of the monthly sales table for --products
+products into a load_data.py store (DuckDB LocalBackend), then:
+
+  - fit: times `fit_models` over every product at once against fitting each
+    product on its own in a loop, and checks both give the same parameters;
+  - growth: compares the fitted growth per month with the one the data was
+    generated with (generate_data.make_products);
+  - accuracy: loads the next --holdout-months months and compares the
+    forecasts with them, against the seasonal naive forecast (the same month
+    a year earlier), by mean absolute percentage error;
+  - refresh: appends one month at a time with load_data.py, --refreshes
+    times, and times the forecaster's incremental refit against a full
+    refit of a new forecaster;
+  - serving: times `forecast` and the `forecast_sales` tool per call.
+
+Run from the repository root:
+    python benchmarks/bench_forecasting.py --products 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(ROOT)
+
+import numpy as np
+
+import generate_data
+import load_data
+from common.backends import LocalBackend, set_backend
+from common.forecasting import SalesForecaster, _add_months, fit_models, forecast_sales, sales_forecaster
+from common.schema import MONTHLY_SALES
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def actual_sales(backend, first_month, months: int) -> dict:
+    """{product: [sales of each month from first_month]}, from the table."""
+    table = MONTHLY_SALES
+    _, rows = backend.run(
+        f"SELECT {table.product_column}, {table.date_column}, SUM({table.value_column}) FROM `{table.name}` "
+        f"WHERE {table.date_column} >= DATE '{first_month.isoformat()}' GROUP BY 1, 2", None
+    )
+    sales = {}
+    for product, date, value in rows:
+        position = (date.year - first_month.year) * 12 + date.month - first_month.month
+        if 0 <= position < months:
+            sales.setdefault(product, [np.nan] * months)[position] = float(value)
+    return sales
+
+
+def growth_error(model: dict, true_growth: dict) -> float:
+    """Mean absolute difference between the fitted and the generated growth per month."""
+    return float(np.mean([abs(model["growth"][i] - true_growth[product]) for product, i in model["index"].items()]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--train-months", type=int, default=24)
+    parser.add_argument("--holdout-months", type=int, default=12)
+    parser.add_argument("--refreshes", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=10000, help="Forecasts timed per serving measurement.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    store = tempfile.mkdtemp(prefix="bench-forecast-")
+    origin = generate_data.START_DATE
+    train_end = _add_months(origin.date(), args.train_months - 1)
+    load_data.load(store, "sales", end=generate_data.datetime(train_end.year, train_end.month, 1),
+                   products=args.products, seed=args.seed)
+    backend = LocalBackend(data_dir=store)
+    set_backend(backend)
+    sales_forecaster.path = os.path.join(store, "sales_forecast_model.npz")
+    fit_seconds, model = timed(sales_forecaster.refresh)
+    products, history = model["products"], model["history"]
+    print(f"{len(products)} products x {history.shape[1]} months, fitted and saved in {fit_seconds * 1000:.0f} ms")
+
+    # Vectorized fit vs one product at a time
+    vectorized_seconds, together = timed(fit_models, history, model["first_month"])
+    start = time.perf_counter()
+    alone = [fit_models(history[i:i + 1], model["first_month"]) for i in range(len(products))]
+    loop_seconds = time.perf_counter() - start
+    growth_difference = np.max(np.abs(together["growth"] - np.concatenate([fit["growth"] for fit in alone])))
+    level_difference = np.max(np.abs(together["levels"] - np.concatenate([fit["levels"] for fit in alone]))
+                         / np.maximum(np.abs(together["levels"]), 1))
+    # The batch stops when its slowest product converges, so single fits stop a step or two earlier
+    assert growth_difference < 1e-5 and level_difference < 1e-4, (growth_difference, level_difference)
+    print(f"\nfit: all products {vectorized_seconds * 1000:.1f} ms ({together['iterations']} iterations), "
+          f"one at a time {loop_seconds * 1000:.1f} ms ({loop_seconds / vectorized_seconds:.0f}x); same parameters")
+
+    # Recovered growth vs the generated one
+    catalogue_rng = np.random.default_rng(np.random.SeedSequence(args.seed).spawn(2 + len(generate_data.PROMOTIONS))[0])
+    generated = generate_data.make_products(generate_data.product_configs, args.products, catalogue_rng)
+    true_growth = dict(zip(generated["name"].tolist(), generated["growth_rate_per_month"].tolist()))
+    print(f"growth on {history.shape[1]} months: mean absolute error {growth_error(model, true_growth) * 100:.3f} points "
+          f"per month (generated growth spans {min(true_growth.values()) * 100:+.2f}% to {max(true_growth.values()) * 100:+.2f}%)")
+    for product in (config["name"] for config in generate_data.product_configs):
+        i = model["index"][product]
+        print(f"  {product:<22}{true_growth[product] * 100:>+8.2f}%{model['growth'][i] * 100:>+8.2f}%")
+
+    # Holdout accuracy vs seasonal naive
+    holdout_first = _add_months(train_end, 1)
+    holdout_end = _add_months(train_end, args.holdout_months)
+    load_data.load(store, "sales", end=generate_data.datetime(holdout_end.year, holdout_end.month, 1))
+    actual = actual_sales(backend, holdout_first, args.holdout_months)
+    model_errors, naive_errors = [], []
+    for i, product in enumerate(products):
+        predicted = np.array([row[1] for row in sales_forecaster.forecast(product, args.holdout_months)[0]])
+        observed = np.array(actual[product])
+        naive = np.array([history[i, -12 + step % 12] for step in range(args.holdout_months)])
+        model_errors.append(np.abs(predicted - observed) / observed)
+        naive_errors.append(np.abs(naive - observed) / observed)
+    print(f"accuracy over {args.holdout_months} held-out months: MAPE {np.mean(model_errors):.1%} "
+          f"(seasonal naive {np.mean(naive_errors):.1%})")
+
+    # Incremental refit vs full refit as months arrive
+    sales_forecaster.refresh()
+    print(f"\n{'refresh':<9}{'months':>8}{'load s':>9}{'incremental ms':>16}{'iterations':>12}{'full ms':>10}{'iterations':>12}")
+    for refresh in range(1, args.refreshes + 1):
+        load_seconds, _ = timed(load_data.load, store, "sales")
+        incremental_seconds, incremental = timed(sales_forecaster.refresh)
+        full_seconds, full = timed(SalesForecaster(path="").refresh)
+        assert np.max(np.abs(incremental["growth"] - full["growth"])) < 1e-5
+        print(f"{refresh:<9}{incremental['history'].shape[1]:>8}{load_seconds:>9.2f}{incremental_seconds * 1000:>16.1f}"
+              f"{incremental['iterations']:>12}{full_seconds * 1000:>10.1f}{full['iterations']:>12}")
+    print(f"growth on {incremental['history'].shape[1]} months: mean absolute error "
+          f"{growth_error(incremental, true_growth) * 100:.3f} points per month")
+    print(f"Forecaster: {sales_forecaster.stats()}")
+
+    # Serving from memory
+    product = products[0]
+    for name, call in (("forecast", lambda: sales_forecaster.forecast(product, 3)),
+                       ("forecast_sales", lambda: forecast_sales(product, 3))):
+        seconds, _ = timed(lambda: [call() for _ in range(args.calls)])
+        print(f"{name}: {seconds / args.calls * 1e6:.1f} us per call")
+    restarted = SalesForecaster(path=sales_forecaster.path)
+    load_seconds, _ = timed(restarted.refresh)
+    print(f"restart: saved model loaded and checked in {load_seconds * 1000:.1f} ms, fits {restarted.fits}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares refreshing the sales table by full regeneration with incremental loading.
+
+Starting from --months of history for --products products, one more month
+arrives, --refreshes times in a row:
+
+  - full: generate_data.py regenerates the whole history into the CSV, and the
+    local backend reloads the whole file;
+  - incremental: load_data.py appends the new month to the partitioned
+    Parquet store, the local backend appends the new part file and the
+    rollup cubes merge in the new month only.
+
+Reports the time of each step per refresh. Requires duckdb and pyarrow.
+
+Run from the repository root:
+    python benchmarks/bench_incremental_load.py --products 5000 --refreshes 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(ROOT)
+
+import generate_data
+import load_data
+from common.backends import LocalBackend
+from common.rollups import CUBES, RollupStore
+from common.schema import MONTHLY_SALES
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--refreshes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    origin, end = generate_data.START_DATE, generate_data.END_DATE
+    csv_dir, store_dir = tempfile.mkdtemp(prefix="bench-full-"), tempfile.mkdtemp(prefix="bench-incremental-")
+    csv_path = os.path.join(csv_dir, MONTHLY_SALES.local_file)
+
+    def regenerate(last):
+        frames = generate_data.generate_frames("sales", args.products, 1, origin, last, "monthly", args.seed)
+        return generate_data.write_frames(frames, csv_path, "csv")[0]
+
+    regenerate(end)
+    load_data.load(store_dir, "sales", products=args.products, seed=args.seed)
+    full_backend, store_backend = LocalBackend(data_dir=csv_dir), LocalBackend(data_dir=store_dir)
+    rollups = RollupStore(lambda: store_backend, cubes=[spec for spec in CUBES if spec.table is MONTHLY_SALES])
+    rollups.refresh()
+
+    print(f"{'refresh':<9}{'rows':>10}  {'full: generate':>15}{'reload':>9}  "
+          f"{'incremental: load':>19}{'reload':>9}{'rollups':>9}")
+    last = end
+    for refresh in range(1, args.refreshes + 1):
+        last = load_data.next_period(last, "monthly")
+        generate_seconds, rows = timed(regenerate, last)
+        full_reload_seconds, _ = timed(full_backend.table_version, MONTHLY_SALES.name)
+        load_seconds, marker = timed(load_data.load, store_dir, "sales")
+        store_reload_seconds, _ = timed(store_backend.table_version, MONTHLY_SALES.name)
+        rollup_seconds, _ = timed(rollups.refresh)
+        assert marker["rows"] == rows, (marker["rows"], rows)
+        print(f"{refresh:<9}{rows:>10}  {generate_seconds:>15.3f}{full_reload_seconds:>9.3f}  "
+              f"{load_seconds:>19.3f}{store_reload_seconds:>9.3f}{rollup_seconds:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
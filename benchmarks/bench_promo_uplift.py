@@ -0,0 +1,145 @@
+"""
+Compares answering promotion strategy questions with ad hoc queries and with the uplift tool.
+
+Generates the weekly promo table for --products products in --geographies
+geographies and loads it into the DuckDB LocalBackend, with
+--warehouse-latency-ms added to every query that reaches it. For each
+product, one strategy question ("which promotion works best for X, per
+geography?") is answered two ways:
+
+  - ad hoc: what promo_agent did before, three `execute_bigquery_query`
+    calls comparing AVG(daily_weekly_value_sales) split by is_tpr,
+    is_feature and is_display per geography (result cache cleared first,
+    rollup cubes on unless --no-rollups);
+  - tool: one `analyze_promotion_uplift(product, "EACH")` call; the first call
+    computes the lift table for every product, later ones reuse it.
+
+Also checks `compute_uplift` against a pandas groupby over the raw rows and
+against computing the same lifts and intervals in a per-group Python loop,
+and times both.
+
+Run from the repository root:
+    python benchmarks/bench_promo_uplift.py --products 20 --geographies 50
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+sys.path.append(ROOT)
+
+import generate_data
+
+
+def loop_uplift(cells: list, confidence: float = 0.95, min_weeks: int = 3) -> dict:
+    """Reference: (lift, ci_low, ci_high) of every (product, geography, combination), one group at a time."""
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    groups = {}
+    for product, geography, tpr, feature, display, weeks, total, squares in cells:
+        combination = int(bool(tpr)) + 2 * int(bool(feature)) + 4 * int(bool(display))
+        for key in ((product, geography), (product, "ALL")):
+            counts = groups.setdefault(key, {})
+            previous = counts.get(combination, (0, 0.0, 0.0))
+            counts[combination] = (previous[0] + weeks, previous[1] + total, previous[2] + squares)
+    lifts = {}
+    for (product, geography), counts in groups.items():
+        if 0 not in counts:
+            continue
+        base_weeks, base_total, base_squares = counts[0]
+        base_mean = base_total / base_weeks
+        base_var = max(base_squares - base_total * base_mean, 0) / (base_weeks - 1) if base_weeks > 1 else math.nan
+        for combination, (weeks, total, squares) in counts.items():
+            if not combination or weeks < min_weeks or base_weeks < min_weeks or base_mean <= 0 or total <= 0:
+                continue
+            mean = total / weeks
+            var = max(squares - total * mean, 0) / (weeks - 1)
+            ratio = mean / base_mean
+            se = math.sqrt(var / (weeks * mean ** 2) + base_var / (base_weeks * base_mean ** 2))
+            lifts[(product, geography, combination)] = (ratio - 1, ratio * math.exp(-z * se) - 1, ratio * math.exp(z * se) - 1)
+    return lifts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--geographies", type=int, default=50)
+    parser.add_argument("--warehouse-latency-ms", type=float, default=150.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-rollups", action="store_true", help="Send every ad hoc query to the warehouse.")
+    args = parser.parse_args()
+
+    if args.no_rollups:
+        os.environ["ROLLUPS_ENABLED"] = "false"
+    data_dir = tempfile.mkdtemp(prefix="bench-uplift-")
+    frames = generate_data.generate_frames("promo", args.products, args.geographies, generate_data.PROMO_START_DATE,
+                                           generate_data.PROMO_END_DATE, "weekly", args.seed)
+    rows = generate_data.write_frames(frames, os.path.join(data_dir, generate_data.PROMO_OUTPUT_FILENAME), "csv")[0]
+
+    from bench_e2e import make_latency_backend
+    from common import query_execution
+    from common.backends import LocalBackend, set_backend
+    from common.promo_uplift import PROMO_FLAGS, analyze_promotion_uplift, compute_uplift, promotion_label, uplift_engine
+    from common.schema import WEEKLY_PROMO_SALES as table
+
+    local = LocalBackend(data_dir=data_dir)
+    backend = make_latency_backend(local, args.warehouse_latency_ms / 1000)
+    set_backend(backend)
+    _, products = local.run(f"SELECT DISTINCT {table.product_column} FROM `{table.name}` ORDER BY 1", None)
+    products = [row[0] for row in products]
+    print(f"{rows} rows, {len(products)} products, {args.geographies} geographies, "
+          f"warehouse {args.warehouse_latency_ms:.0f} ms per query")
+
+    # Correctness and compute time, on the cells the engine reads
+    _, cells = local.run(uplift_engine._cells_sql(), None)
+    start = time.perf_counter()
+    vectorized = compute_uplift(cells)
+    vectorized_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    reference = loop_uplift(cells)
+    loop_seconds = time.perf_counter() - start
+    labels = {promotion_label(combination): combination for combination in range(8)}
+    errors = [abs(value / 100 - expected)
+              for row in vectorized for value, expected in zip(row[7:10], reference[(row[0], row[1], labels[row[2]])])]
+    assert len(vectorized) == len(reference) and max(errors) < 1e-9, (len(vectorized), len(reference), max(errors))
+
+    import pandas as pd
+    frame = pd.read_csv(os.path.join(data_dir, generate_data.PROMO_OUTPUT_FILENAME))
+    sample = vectorized[0]
+    flags = [flag for flag, label in PROMO_FLAGS]
+    promoted = frame[frame[table.product_column] == sample[0]]
+    combination = labels[sample[2]]
+    mask = sum((promoted[flag] > 0).astype(int) * (1 << bit) for bit, flag in enumerate(flags))
+    pandas_lift = promoted[mask == combination][table.value_column].mean() / promoted[mask == 0][table.value_column].mean() - 1
+    assert math.isclose(pandas_lift, sample[7] / 100, rel_tol=1e-9), (pandas_lift, sample[7])
+    print(f"compute_uplift: {len(cells)} cells -> {len(vectorized)} lifts in {vectorized_seconds * 1000:.1f} ms "
+          f"(per-group loop {loop_seconds * 1000:.1f} ms); matches the loop and pandas")
+
+    def ad_hoc(product):
+        for flag in flags:
+            query_execution.execute_bigquery_query(
+                f"SELECT {table.geography_column}, {flag}, AVG({table.value_column}) AS avg_weekly_sales, COUNT(*) AS weeks "
+                f"FROM `{table.name}` WHERE {table.product_column} = '{product}' "
+                f"GROUP BY {table.geography_column}, {flag} ORDER BY {table.geography_column}, {flag}"
+            )
+
+    print(f"\n{'approach':<10}{'questions':>10}{'queries':>9}{'total s':>9}{'first ms':>10}{'later ms':>10}")
+    for name, answer in (("ad hoc", ad_hoc), ("tool", lambda product: analyze_promotion_uplift(product, "EACH"))):
+        query_execution.result_cache.clear()
+        before, timings = backend.queries, []
+        for product in products:
+            start = time.perf_counter()
+            answer(product)
+            timings.append(time.perf_counter() - start)
+        later = timings[1:] or timings
+        print(f"{name:<10}{len(products):>10}{backend.queries - before:>9}{sum(timings):>9.2f}"
+              f"{timings[0] * 1000:>10.1f}{sum(later) / len(later) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
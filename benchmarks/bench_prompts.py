@@ -0,0 +1,123 @@
+"""
+Counts the input tokens of every model request with full and with trimmed instructions.
+
+Runs the questions in benchmarks/corpus.json through `root_agent` (from
+agents/main_agent) with the deterministic stand-ins of bench_e2e.py, twice:
+
+  - full: every guideline section is sent on every turn, as the static
+    instructions did (PROMPT_TRIMMING_ENABLED=false);
+  - trimmed: only the sections each question calls for (the default).
+
+Every request the agents send to the model is recorded: system instruction,
+tool declarations and contents. Tokens are estimated at 4 characters per
+token (no tokenizer is available offline). Per agent, reports the requests,
+average input tokens, and the average leading part of a request identical to
+the previous request of the same agent, which is what provider-side prefix
+caching can reuse.
+
+Run from the repository root:
+    python benchmarks/bench_prompts.py
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(os.path.dirname(ROOT), "agents"))
+
+from bench_e2e import Harness, generate_local_data, install_fake_calendar, load_corpus, make_fake_llm
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def request_blocks(llm_request) -> list:
+    """The request as serialized blocks in the order the provider receives them: instruction, tools, contents."""
+    config = llm_request.config
+    tools = [tool.model_dump_json(exclude_none=True) for tool in (config.tools or [])]
+    return ([str(config.system_instruction or ""), "".join(tools)]
+            + [content.model_dump_json(exclude_none=True) for content in llm_request.contents or []])
+
+
+def recording(llm, agent_name: str, requests: list):
+    """Wraps a fake BaseLlm so every request it receives is recorded as (agent, blocks)."""
+
+    class RecordingLlm(type(llm)):
+        async def generate_content_async(self, llm_request, stream=False):
+            requests.append((agent_name, request_blocks(llm_request)))
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+
+    return RecordingLlm()
+
+
+def shared_prefix_tokens(blocks: list, previous: list) -> int:
+    tokens = 0
+    for block, previous_block in zip(blocks, previous or []):
+        if block != previous_block:
+            break
+        tokens += estimate_tokens(block)
+    return tokens
+
+
+def report(label: str, requests: list):
+    by_agent, previous = {}, {}
+    for agent_name, blocks in requests:
+        stats = by_agent.setdefault(agent_name, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += sum(estimate_tokens(block) for block in blocks)
+        stats[2] += shared_prefix_tokens(blocks, previous.get(agent_name))
+        previous[agent_name] = blocks
+    for agent_name, (count, tokens, cached) in sorted(by_agent.items()):
+        print(f"{label:<9}{agent_name:<14}{count:>9}{tokens / count:>14.0f}{cached / count:>16.0f}")
+    total = sum(stats[1] for stats in by_agent.values())
+    print(f"{label:<9}{'all':<14}{len(requests):>9}{total / len(requests):>14.0f}"
+          f"{sum(stats[2] for stats in by_agent.values()) / len(requests):>16.0f}")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "corpus.json"))
+    args = parser.parse_args()
+
+    logging.getLogger("google_adk").setLevel(logging.ERROR)
+    data_dir = tempfile.mkdtemp(prefix="bench-prompts-")
+    generate_local_data(data_dir)
+
+    from common.backends import LocalBackend, set_backend
+    from main_agent import agent as main_agent
+
+    set_backend(LocalBackend(data_dir=data_dir))
+    install_fake_calendar(0)
+    corpus = load_corpus(args.corpus)
+    script = {entry["question"]: entry for entry in corpus}
+    requests = []
+    for agent, role in ((main_agent.root_agent, "router"), (main_agent.sales_agent, "worker"), (main_agent.promo_agent, "worker")):
+        agent.model = recording(make_fake_llm(role, script, 0, 0, {}), agent.name, requests)
+    harness = Harness(main_agent.root_agent)
+
+    print(f"{len(corpus)} corpus questions, ~4 chars per token")
+    print(f"{'mode':<9}{'agent':<14}{'requests':>9}{'avg tokens':>14}{'avg prefix hit':>16}")
+    totals = {}
+    for label, trim in (("full", False), ("trimmed", True)):
+        main_agent.sales_prompt.trim = main_agent.promo_prompt.trim = trim
+        requests.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for entry in corpus:
+                asyncio.run(harness.ask(entry["question"]))
+        totals[label] = report(label, requests)
+    print(f"\nInput tokens: {totals['full']} -> {totals['trimmed']} "
+          f"({1 - totals['trimmed'] / totals['full']:.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Compares the BigQuery round trips made by the old per-call tool implementation
+and the shared `common.query_execution` module, using a local fake client.
+
+Run from the repository root:
+    python benchmarks/bench_query_execution.py --rows 50 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+from common.backends import BigQueryBackend, BigQueryClientPool
+from common.query_execution import format_rows
+
+
+class CallCounter:
+    def __init__(self):
+        self.clients_created = 0
+        self.queries = 0
+        self.result_calls = 0
+
+
+class FakeField:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeRow(dict):
+    def values(self):
+        return list(dict.values(self))
+
+
+class FakeRowIterator:
+    def __init__(self, rows, schema):
+        self._rows = rows
+        self.schema = schema
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class FakeQueryJob:
+    total_bytes_processed = 0
+    cache_hit = False
+
+    def __init__(self, counter, num_rows, latency):
+        self._counter = counter
+        self._num_rows = num_rows
+        self._latency = latency
+        self._schema = [FakeField("Date"), FakeField("ProductName"), FakeField("SalesRevenue")]
+
+    def result(self, max_results=None, timeout=None):
+        self._counter.result_calls += 1
+        time.sleep(self._latency)
+        num_rows = self._num_rows if max_results is None else min(self._num_rows, max_results)
+        rows = [
+            FakeRow(Date="2023-01-01", ProductName=f"Product {i}", SalesRevenue=1000.0 + i)
+            for i in range(num_rows)
+        ]
+        return FakeRowIterator(rows, self._schema)
+
+
+class FakeClient:
+    def __init__(self, counter, num_rows, latency, project=None):
+        counter.clients_created += 1
+        self._counter = counter
+        self._num_rows = num_rows
+        self._latency = latency
+
+    def query(self, sql_query):
+        self._counter.queries += 1
+        return FakeQueryJob(self._counter, self._num_rows, self._latency)
+
+
+def legacy_execute(sql_query, client_factory):
+    """The tool body as it was before the shared module: new client, result() per row."""
+    bq_client = client_factory(project="fake-project")
+    query_job = bq_client.query(sql_query)
+    rows = list(query_job.result(max_results=50))
+    headers = [field.name for field in query_job.result().schema]
+    result_str = ",".join(headers) + "\n"
+    for row in rows:
+        values = [str(row[field.name]) for field in query_job.result().schema]
+        result_str += ",".join(values) + "\n"
+    return result_str
+
+
+def pooled_execute(sql_query, backend):
+    headers, rows = backend.run(sql_query, 50)
+    return format_rows(headers, rows)
+
+
+def report(label, counter, elapsed, num_queries):
+    print(
+        f"{label:<8} clients={counter.clients_created:<5} queries={counter.queries:<5} "
+        f"result_calls={counter.result_calls:<6} "
+        f"result_calls/query={counter.result_calls / num_queries:<6.1f} "
+        f"elapsed={elapsed * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50, help="Rows returned by each fake query.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of tool calls to simulate.")
+    parser.add_argument("--latency-ms", type=float, default=0.2, help="Simulated latency of each result() call.")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+    sql_query = "SELECT Date, ProductName, SalesRevenue FROM `fake.dataset.table`"
+
+    legacy_counter = CallCounter()
+    factory = lambda project: FakeClient(legacy_counter, args.rows, latency, project)
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        legacy_output = legacy_execute(sql_query, factory)
+    report("legacy", legacy_counter, time.perf_counter() - start, args.queries)
+
+    pooled_counter = CallCounter()
+    pool = BigQueryClientPool(
+        "fake-project",
+        client_factory=lambda project: FakeClient(pooled_counter, args.rows, latency, project),
+    )
+    backend = BigQueryBackend(pool)
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        pooled_output = pooled_execute(sql_query, backend)
+    report("pooled", pooled_counter, time.perf_counter() - start, args.queries)
+
+    assert legacy_output == pooled_output, "Both implementations must format results identically."
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures what the query guard saves, and checks its budgets, without BigQuery.
+
+Runs the corpus queries plus a few wasteful ones through
+`common.query_guard.QueryGuard`:
+
+  - against the DuckDB LocalBackend over generated data, comparing the
+    estimated bytes scanned before and after the rewrites, and checking that
+    every rewritten query still runs;
+  - against BigQueryBackend with a fake client whose dry runs bill a fixed
+    number of bytes, checking that the per-query and hourly budgets reject
+    queries without ever running them.
+
+Run from the repository root:
+    python benchmarks/bench_query_guard.py --date-window-days 90
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+
+from bench_e2e import generate_local_data, load_corpus
+from common.backends import BigQueryBackend, LocalBackend
+from common.query_guard import QueryGuard, QueryRejectedError, format_bytes
+
+WASTEFUL_QUERIES = [
+    "SELECT * FROM `hacker2025-team-199-dev.sales_and_promo.weekly_sales_data`",
+    "SELECT * FROM `hacker2025-team-199-dev.sales_analyst.artificial_sales` WHERE EXTRACT(YEAR FROM Date) = 2023",
+    "SELECT s.* FROM `hacker2025-team-199-dev.sales_and_promo.weekly_sales_data` s WHERE is_tpr = 1 OR is_display = 1",
+]
+
+
+class FakeDryRunJob:
+    def __init__(self, total_bytes_processed):
+        self.total_bytes_processed = total_bytes_processed
+
+
+class FakeDryRunClient:
+    """Answers dry runs with `bytes_per_query`; a real run is a failure of the guard."""
+
+    def __init__(self, bytes_per_query):
+        self.bytes_per_query = bytes_per_query
+        self.dry_runs = 0
+
+    def query(self, sql_query, job_config=None):
+        assert job_config is not None and job_config.dry_run, "The guard let a query through to execution."
+        self.dry_runs += 1
+        return FakeDryRunJob(self.bytes_per_query)
+
+
+class FakePool:
+    def __init__(self, client):
+        self._client = client
+
+    @contextmanager
+    def client(self):
+        yield self._client
+
+
+def local_savings(backend, guard, queries):
+    print(f"{'query':<7}{'before':>12}{'after':>12}  rewrites")
+    before_total = after_total = 0
+    for i, sql in enumerate(queries, start=1):
+        rewritten, notes = guard.rewrite(sql)
+        before, after = backend.dry_run(sql), backend.dry_run(rewritten)
+        backend.run(rewritten, guard.max_rows)
+        before_total += before
+        after_total += after
+        changed = "yes" if rewritten != sql.strip().rstrip(";").strip() else ""
+        print(f"q{i:<6}{format_bytes(before):>12}{format_bytes(after):>12}  {changed}{' (windowed)' if notes else ''}")
+    print(f"\nEstimated bytes scanned: {format_bytes(before_total)} before, {format_bytes(after_total)} after "
+          f"({1 - after_total / before_total:.0%} less)")
+
+
+def budget_checks(max_bytes):
+    client = FakeDryRunClient(bytes_per_query=max_bytes // 4)
+    backend = BigQueryBackend(FakePool(client))
+    guard = QueryGuard(lambda: backend, max_bytes=max_bytes, max_bytes_per_hour=max_bytes)
+    accepted = 0
+    try:
+        for _ in range(5):
+            guard.check_cost(WASTEFUL_QUERIES[0])
+            accepted += 1
+        raise AssertionError("The hourly budget did not reject the fifth query.")
+    except QueryRejectedError as e:
+        print(f"\nHourly budget: {accepted} queries accepted, then: {e}")
+    assert accepted == 4
+
+    client.bytes_per_query = max_bytes * 2
+    try:
+        QueryGuard(lambda: backend, max_bytes=max_bytes).check_cost(WASTEFUL_QUERIES[0])
+        raise AssertionError("The per-query budget did not reject the query.")
+    except QueryRejectedError as e:
+        print(f"Per-query budget: {e}")
+    print(f"Fake dry runs: {client.dry_runs}, queries executed: 0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.json"))
+    parser.add_argument("--data-dir", help="Directory with the table CSVs (default: generated into a temp dir).")
+    parser.add_argument("--max-rows", type=int, default=1000)
+    parser.add_argument("--date-window-days", type=int, help="Restrict unbounded row listings to the last N days.")
+    parser.add_argument("--max-bytes", type=int, default=1 << 30, help="Per-query budget for the fake dry-run checks.")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-guard-")
+    if not args.data_dir:
+        generate_local_data(data_dir)
+    backend = LocalBackend(data_dir=data_dir)
+    guard = QueryGuard(lambda: backend, max_rows=args.max_rows, date_window_days=args.date_window_days)
+
+    queries = [entry["sql"] for entry in load_corpus(args.corpus) if "sql" in entry] + WASTEFUL_QUERIES
+    local_savings(backend, guard, queries)
+    budget_checks(args.max_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the prompt tokens of tool results under the old and the compact result encodings.
+
+Runs the corpus queries (plus a few large raw-row queries) on the DuckDB
+LocalBackend over generated data, and encodes each result with:
+
+  - csv:     the old tool output, `str()` of every value, first 50 rows only;
+  - compact: common.result_encoding.encode_rows under --token-budget.
+
+Tokens are estimated with `estimate_tokens`, or counted with the Gemini
+tokenizer with --gemini-tokenizer (downloads the tokenizer model once).
+Model latency is modelled as --model-base-ms plus --prefill-ms-per-1k-tokens
+for the result tokens the next model call has to read.
+
+Run from the repository root:
+    python benchmarks/bench_result_encoding.py --token-budget 800
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+
+from bench_e2e import generate_local_data, load_corpus
+from common.backends import LocalBackend
+from common.query_execution import format_rows
+from common.result_encoding import encode_rows, estimate_tokens
+
+LEGACY_MAX_ROWS = 50
+
+LARGE_QUERIES = [
+    "SELECT * FROM `hacker2025-team-199-dev.sales_analyst.artificial_sales`",
+    "SELECT * FROM `hacker2025-team-199-dev.sales_and_promo.weekly_sales_data` WHERE promoted_group = 'FACE CREAM'",
+    "SELECT date, retailer_banner_geography, AVG(daily_weekly_value_sales) AS avg_sales FROM "
+    "`hacker2025-team-199-dev.sales_and_promo.weekly_sales_data` GROUP BY date, retailer_banner_geography ORDER BY date",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.json"))
+    parser.add_argument("--data-dir", help="Directory with the table CSVs (default: generated into a temp dir).")
+    parser.add_argument("--token-budget", type=int, default=800)
+    parser.add_argument("--max-rows", type=int, default=1000, help="Rows fetched for the compact encoding.")
+    parser.add_argument("--model-base-ms", type=float, default=300.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=40.0)
+    parser.add_argument("--gemini-tokenizer", action="store_true", help="Count tokens with the Gemini tokenizer.")
+    args = parser.parse_args()
+
+    count_tokens = estimate_tokens
+    if args.gemini_tokenizer:
+        from vertexai.preview import tokenization
+        tokenizer = tokenization.get_tokenizer_for_model("gemini-1.5-flash-002")
+        count_tokens = lambda text: tokenizer.count_tokens(text).total_tokens
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-encoding-")
+    if not args.data_dir:
+        generate_local_data(data_dir)
+    backend = LocalBackend(data_dir=data_dir)
+
+    queries = [entry["sql"] for entry in load_corpus(args.corpus) if "sql" in entry] + LARGE_QUERIES
+    model_ms = lambda tokens: args.model_base_ms + args.prefill_ms_per_1k_tokens * tokens / 1000
+
+    print(f"{'query':<7}{'rows':>6}{'csv tok':>10}{'compact tok':>13}{'saved':>8}{'encode us':>11}")
+    totals = {"csv": 0, "compact": 0, "csv_ms": 0.0, "compact_ms": 0.0}
+    for i, sql in enumerate(queries, start=1):
+        headers, rows = backend.run(sql, None)
+        if not rows:
+            continue
+        legacy = format_rows(headers, rows[:LEGACY_MAX_ROWS])
+        start = time.perf_counter()
+        compact = encode_rows(headers, rows[:args.max_rows], args.token_budget, truncated=len(rows) > args.max_rows)
+        encode_us = (time.perf_counter() - start) * 1e6
+        legacy_tokens, compact_tokens = count_tokens(legacy), count_tokens(compact)
+        totals["csv"] += legacy_tokens
+        totals["compact"] += compact_tokens
+        totals["csv_ms"] += model_ms(legacy_tokens)
+        totals["compact_ms"] += model_ms(compact_tokens)
+        print(f"q{i:<6}{len(rows):>6}{legacy_tokens:>10}{compact_tokens:>13}"
+              f"{1 - compact_tokens / legacy_tokens:>8.0%}{encode_us:>11.0f}")
+
+    print(f"\nTotal result tokens: csv {totals['csv']}, compact {totals['compact']} "
+          f"({1 - totals['compact'] / totals['csv']:.0%} fewer)")
+    print(f"Modelled model time reading the results: csv {totals['csv_ms'] / 1000:.2f}s, "
+          f"compact {totals['compact_ms'] / 1000:.2f}s")
+    print("Note: for results over 50 rows the csv encoding silently drops every row after the 50th,"
+          " the compact one summarises all fetched rows.")
+
+
+if __name__ == "__main__":
+    main()
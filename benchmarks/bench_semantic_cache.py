@@ -0,0 +1,121 @@
+"""
+Measures the hit rate, the wrong-answer rate and the lookup cost of the semantic answer cache.
+
+The cache is filled with the corpus questions (answered with their own
+text), then probed with:
+
+  - paraphrases, which should hit the cached question they rephrase;
+  - near misses (another year, product, region or aggregate), which must miss.
+
+Lookup latency is then measured with the cache filled to --entries questions
+generated from the corpus with other years and products, so the inverted
+index holds many entries sharing words with every probe.
+
+Run from the repository root:
+    python benchmarks/bench_semantic_cache.py --entries 2000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+
+from semantic_cache import SemanticCache
+
+# (paraphrase, corpus question it should be answered from)
+PARAPHRASES = [
+    ("How much revenue did the Smartwatch make in 2023?", "What was the total revenue of Smartwatch in 2023?"),
+    ("Smartwatch total sales 2023", "What was the total revenue of Smartwatch in 2023?"),
+    ("Which product sold most in 2022?", "Which product had the highest sales in 2022?"),
+    ("best selling product in 2022", "Which product had the highest sales in 2022?"),
+    ("What is the mean monthly revenue of Denim Jeans?", "What is the average monthly revenue of Denim Jeans?"),
+    ("Which region has the highest MOISTURISER sales?", "Which region sells the most MOISTURISER?"),
+    ("what were the sales of face cream in 2023", "What were FACE CREAM sales in 2023?"),
+    ("Give me the total revenue per year of Running Shoes", "Total revenue of Running Shoes per year"),
+    ("Does temporary price reduction increase sales of FACE CREAM?", "Does a temporary price reduction increase FACE CREAM sales?"),
+    ("Top 3 products by sales in Q4 2023", "Top 3 products by revenue in Q4 2023"),
+]
+
+# Questions that look like a cached one but need a different answer
+NEAR_MISSES = [
+    "What was the total revenue of Smartwatch in 2022?",
+    "What was the total revenue of Coffee Maker in 2023?",
+    "Which product had the lowest sales in 2022?",
+    "Which product had the highest sales in 2023?",
+    "What is the average monthly revenue of Running Shoes?",
+    "Which region sells the least MOISTURISER?",
+    "Which region sells the most FACE CREAM?",
+    "What were MOISTURISER sales in 2023?",
+    "Total revenue of Running Shoes per month",
+    "Top 5 products by revenue in Q4 2023",
+    "Top 3 products by revenue in Q3 2023",
+    "What about 2022?",
+    "What are my upcoming events?",
+]
+
+PRODUCTS = ["Smartwatch", "Coffee Maker", "Denim Jeans", "Running Shoes", "Camping Tent", "Novelty Mug",
+            "Basic T-Shirt", "Cookware Set", "Weighted Blanket", "Wireless Headphones", "FACE CREAM", "MOISTURISER"]
+
+
+def filler_questions(questions, count, seed=0):
+    """Variants of the corpus questions with other years and products, none equal to a probe's answer."""
+    rng = random.Random(seed)
+    variants = []
+    while len(variants) < count:
+        question = rng.choice(questions)
+        for product in PRODUCTS:
+            question = question.replace(product, rng.choice(PRODUCTS))
+        variants.append(f"{question.rstrip('?')} in {rng.randint(1990, 2015)}?")
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.json"))
+    parser.add_argument("--entries", type=int, default=2000, help="Cache size for the latency measurement.")
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        questions = [entry["question"] for entry in json.load(f)]
+    options = {"threshold": args.threshold} if args.threshold is not None else {}
+
+    cache = SemanticCache(**options)
+    for question in questions:
+        cache.put(question, question)
+
+    hits = 0
+    for paraphrase, original in PARAPHRASES:
+        answer = cache.get(paraphrase)
+        hits += answer == original
+        print(f"{'hit ' if answer == original else 'MISS'}  {paraphrase}")
+    wrong = 0
+    for question in NEAR_MISSES:
+        answer = cache.get(question)
+        wrong += answer is not None
+        print(f"{'WRONG' if answer is not None else 'miss '} {question}" + (f"  -> {answer}" if answer else ""))
+    print(f"\nParaphrases answered from the cache: {hits}/{len(PARAPHRASES)}")
+    print(f"Near misses answered wrongly: {wrong}/{len(NEAR_MISSES)}")
+
+    cache = SemanticCache(max_entries=args.entries + len(questions), **options)
+    for question in filler_questions(questions, args.entries) + questions:
+        cache.put(question, question)
+    probes = [paraphrase for paraphrase, _ in PARAPHRASES] + NEAR_MISSES
+    timings = []
+    for _ in range(20):
+        for probe in probes:
+            start = time.perf_counter()
+            cache.get(probe)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    print(f"\nLookup with {cache.stats()['entries']} entries ({cache.stats()['bytes'] / 1024 / 1024:.1f} MiB): "
+          f"p50 {statistics.median(timings):.0f} us, p99 {timings[int(len(timings) * 0.99)]:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measures request coalescing when many callers ask the same thing at the same moment.
+
+--callers threads start together (e.g. a team opening the dashboard) and
+send the same request, with and without single-flight:
+
+  - warehouse level: the same SQL through `execute_bigquery_query`, on the
+    DuckDB LocalBackend plus --warehouse-latency-ms per query (rollups off,
+    result cache cleared first, so every caller misses it);
+  - agent level: the same question through the app's `query_agent`, from
+    different users, against a fake agent engine answering in
+    --agent-latency-ms (the answer cache is on, as in production).
+
+Reports the wall time and how many warehouse jobs / agent runs were started.
+
+Run from the repository root:
+    python benchmarks/bench_singleflight.py --callers 20
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+
+SQL = ("SELECT ProductName, SUM(SalesRevenue) AS total_revenue "
+       "FROM `hacker2025-team-199-dev.sales_analyst.artificial_sales` "
+       "WHERE EXTRACT(YEAR FROM Date) = 2023 GROUP BY ProductName ORDER BY total_revenue DESC LIMIT 1")
+QUESTION = "Which product had the highest sales in 2023?"
+
+
+class FakeAgentEngine:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def create_session(self, user_id):
+        return {"id": uuid.uuid4().hex}
+
+    def delete_session(self, user_id, session_id):
+        pass
+
+    def stream_query(self, user_id, session_id, message):
+        with self._lock:
+            self.runs += 1
+        time.sleep(self.latency)
+        yield {"content": {"parts": [{"text": "Smartwatch had the highest sales in 2023."}]}}
+
+
+def burst(callers: int, func) -> float:
+    """Calls `func(i)` from `callers` threads released at the same moment; returns the wall time."""
+    barrier = threading.Barrier(callers)
+
+    def caller(i):
+        barrier.wait()
+        return func(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(caller, range(callers)))
+    assert len(set(results)) == 1 and not results[0].startswith(("ERROR", "An unexpected")), results[0]
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--warehouse-latency-ms", type=float, default=300.0)
+    parser.add_argument("--agent-latency-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    os.environ["ROLLUPS_ENABLED"] = "false"
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+    os.environ.setdefault("GOOGLE_CLOUD_LOCATION", "us-central1")
+
+    from bench_e2e import generate_local_data, make_latency_backend
+    from common import query_execution
+    from common.backends import LocalBackend, set_backend
+    from common.singleflight import SingleFlight
+    import agent_service
+    from shared import SingleFlight as AppSingleFlight
+
+    data_dir = tempfile.mkdtemp(prefix="bench-singleflight-")
+    generate_local_data(data_dir)
+    backend = make_latency_backend(LocalBackend(data_dir=data_dir), args.warehouse_latency_ms / 1000)
+    set_backend(backend)
+    engine = FakeAgentEngine(args.agent_latency_ms / 1000)
+    agent_service._remote_app = engine
+    # agent_service logs every answer at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'level':<11}{'single-flight':<15}{'callers':>8}{'wall s':>8}{'started':>9}")
+    for enabled in (False, True):
+        query_execution.query_flight = SingleFlight("bigquery_query") if enabled else None
+        query_execution.result_cache.clear()
+        before = backend.queries
+        elapsed = burst(args.callers, lambda i: query_execution.execute_bigquery_query(SQL))
+        print(f"{'warehouse':<11}{'on' if enabled else 'off':<15}{args.callers:>8}{elapsed:>8.2f}{backend.queries - before:>9}")
+
+    for enabled in (False, True):
+        agent_service.agent_flight = AppSingleFlight("agent_query") if enabled else None
+        if agent_service.answer_cache is not None:
+            agent_service.answer_cache.clear()
+        before = engine.runs
+        elapsed = burst(args.callers, lambda i: agent_service.query_agent(QUESTION, f"user-{i}"))
+        print(f"{'agent':<11}{'on' if enabled else 'off':<15}{args.callers:>8}{elapsed:>8.2f}{engine.runs - before:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measures the questions the SQL template engine answers without a model call.
+
+Runs the questions in benchmarks/corpus.json through `root_agent` (from
+agents/main_agent) with the deterministic stand-ins of bench_e2e.py (LLM,
+DuckDB LocalBackend with a BigQuery-like round trip, calendar), with the
+template engine off and on. Reports, for the questions a template covers and
+for the rest, how many there are and their mean and p95 latency.
+
+Every covered question's template query is also checked against the
+corpus SQL for it: the rows must agree on the columns the corpus query returns.
+
+Run from the repository root:
+    python benchmarks/bench_sql_templates.py --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(os.path.dirname(ROOT), "agents"))
+
+from bench_e2e import (
+    Harness, generate_local_data, install_fake_calendar, load_corpus, make_fake_llm, make_latency_backend, percentile,
+)
+
+
+def same_rows(expected: list, actual: list) -> bool:
+    """True when `actual` has the rows of `expected` on its columns, numbers equal to 6 significant digits."""
+    if len(expected) != len(actual):
+        return False
+    for expected_row, actual_row in zip(expected, actual):
+        for a, b in zip(expected_row, actual_row):
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                if not math.isclose(float(a), float(b), rel_tol=1e-6):
+                    return False
+            elif str(a) != str(b):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "corpus.json"))
+    parser.add_argument("--repeat", type=int, default=3, help="Times each question is asked per mode.")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-ms-per-1k-chars", type=float, default=5.0)
+    parser.add_argument("--warehouse-latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    logging.getLogger("google_adk").setLevel(logging.ERROR)
+    data_dir = tempfile.mkdtemp(prefix="bench-templates-")
+    generate_local_data(data_dir)
+
+    from common.backends import LocalBackend, set_backend
+    from common import query_execution
+    from main_agent import agent as main_agent
+
+    local = LocalBackend(data_dir=data_dir)
+    set_backend(make_latency_backend(local, args.warehouse_latency_ms / 1000))
+    install_fake_calendar(0.08)
+    corpus = load_corpus(args.corpus)
+    script = {entry["question"]: entry for entry in corpus}
+    llm = lambda role: make_fake_llm(role, script, args.llm_latency_ms / 1000, args.llm_ms_per_1k_chars / 1000, {})
+    main_agent.root_agent.model = llm("router")
+    main_agent.sales_agent.model = main_agent.promo_agent.model = llm("worker")
+    engine = main_agent.template_engine
+
+    covered = set()
+    print(f"{'template':<16}{'agrees':<8}question")
+    for entry in corpus:
+        match = engine.match(entry["question"])
+        if match is None:
+            continue
+        covered.add(entry["question"])
+        _, expected = local.run(entry["sql"], 1000)
+        _, actual = local.run(match.sql, 1000)
+        agrees = same_rows(expected, actual)
+        print(f"{match.template.name:<16}{'yes' if agrees else 'NO':<8}{entry['question']}")
+    print(f"\n{len(covered)} of {len(corpus)} corpus questions covered; "
+          f"LLM {args.llm_latency_ms:.0f} ms per call, warehouse {args.warehouse_latency_ms:.0f} ms per query")
+
+    harness = Harness(main_agent.root_agent)
+    questions = [entry["question"] for entry in corpus] * args.repeat
+    print(f"\n{'templates':<11}{'questions':<11}{'n':>5}{'mean ms':>10}{'p95 ms':>10}")
+    for enabled in (False, True):
+        engine.enabled = enabled
+        query_execution.result_cache.clear()
+        latencies = {"covered": [], "other": []}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for question in questions:
+                start = time.perf_counter()
+                asyncio.run(harness.ask(question))
+                latencies["covered" if question in covered else "other"].append(time.perf_counter() - start)
+        for group, values in latencies.items():
+            print(f"{'on' if enabled else 'off':<11}{group:<11}{len(values):>5}"
+                  f"{sum(values) / len(values) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}")
+    print(f"\nTemplate engine: {engine.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Cold-start benchmark of the agent modules and the FastAPI app.
+
+Every measurement runs in a fresh interpreter, --runs times, and reports the
+median wall time:
+
+  - agent import: `import main_agent.agent`, as Agent Engine does on start;
+  - api import: `import main` in fastapi-agent-app/app;
+  - "eager" variants import, on top, the modules these now load on first use
+    (google-cloud-bigquery, the Calendar API client and OAuth libraries for the
+    agents; vertexai and Cloud Logging for the app), which is what every cold
+    start paid before. Only the app gains from deferring them: the agent
+    modules must import google.adk to define root_agent at import, and that
+    import (which loads google.genai with it) is nearly all of their cold
+    start, so the two agent timings are within noise of each other;
+  - api listen: from starting uvicorn until /metrics answers, with the
+    background prewarm on and off. No network call is needed for either.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENTS_DIR = os.path.join(ROOT, "agents")
+APP_DIR = os.path.join(ROOT, "fastapi-agent-app", "app")
+
+AGENT_DEFERRED = ["google.cloud.bigquery", "googleapiclient.discovery", "google_auth_oauthlib.flow", "google_auth_httplib2"]
+APP_DEFERRED = ["vertexai", "vertexai.agent_engines", "google.cloud.logging"]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+for name in {extra!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+loaded = [name for name in {watch!r} if name in sys.modules]
+print(elapsed, ",".join(loaded) or "-")
+"""
+
+
+def environment(**overrides) -> dict:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+    env.setdefault("GOOGLE_CLOUD_LOCATION", "us-central1")
+    env.update(overrides)
+    return env
+
+
+def time_import(module: str, cwd: str, extra: list, watch: list, runs: int):
+    timings, loaded = [], ""
+    script = IMPORT_SCRIPT.format(module=module, extra=extra, watch=watch)
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=environment(AGENT_PREWARM="false"),
+                                capture_output=True, text=True, check=True)
+        elapsed, loaded = result.stdout.strip().splitlines()[-1].split(" ", 1)
+        timings.append(float(elapsed))
+    return statistics.median(timings), loaded
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_listen(prewarm: bool, runs: int, timeout: float = 60.0) -> float:
+    import httpx
+
+    timings = []
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=APP_DIR, env=environment(AGENT_PREWARM="true" if prewarm else "false"),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+            timings.append(time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-listen", action="store_true", help="Skip the uvicorn measurements.")
+    args = parser.parse_args()
+
+    print(f"{'measurement':<28}{'median s':>10}  deferred modules loaded")
+    for label, module, cwd, extra, watch in (
+        ("agent import", "main_agent.agent", AGENTS_DIR, [], AGENT_DEFERRED),
+        ("agent import (eager)", "main_agent.agent", AGENTS_DIR, AGENT_DEFERRED, AGENT_DEFERRED),
+        ("api import", "main", APP_DIR, [], APP_DEFERRED),
+        ("api import (eager)", "main", APP_DIR, APP_DEFERRED, APP_DEFERRED),
+    ):
+        elapsed, loaded = time_import(module, cwd, extra, watch, args.runs)
+        print(f"{label:<28}{elapsed:>10.2f}  {loaded}")
+
+    if not args.skip_listen:
+        for prewarm in (False, True):
+            label = f"api listen (prewarm {'on' if prewarm else 'off'})"
+            print(f"{label:<28}{time_listen(prewarm, args.runs):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
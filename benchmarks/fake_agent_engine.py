@@ -0,0 +1,96 @@
+"""
+A local stand-in for a deployed Vertex AI Agent Engine's REST API.
+
+Serves `POST /v1/{resource}:query` (create_session, delete_session) and
+`POST /v1/{resource}:streamQuery` (JSON lines of content events), and counts
+the TCP connections its clients open, so connection reuse can be measured.
+`failure_rate` and `outage` make it answer 503, to exercise retries and
+circuit breaking.
+
+Run on its own (plain HTTP) and point the app at it:
+    python benchmarks/fake_agent_engine.py --port 8081
+    AGENT_ENGINE_ID=1 AGENT_ENGINE_ENDPOINT=http://127.0.0.1:8081/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeEngineState:
+    def __init__(self, chunks: int = 5, chunk_latency: float = 0.005, failure_rate: float = 0.0, seed: int = 0):
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+        self.failure_rate = failure_rate
+        self.outage = False
+        self.random = random.Random(seed)
+        self.connections = set() # (client host, client port): one per TCP connection
+        self.http_versions = {}
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections.clear()
+            self.http_versions.clear()
+            self.requests = 0
+            self.failures = 0
+
+    def record(self, request: Request) -> bool:
+        """Counts the request and returns whether it should fail."""
+        with self._lock:
+            self.requests += 1
+            self.connections.add(tuple(request.client))
+            version = request.scope.get("http_version")
+            self.http_versions[version] = self.http_versions.get(version, 0) + 1
+            fail = self.outage or self.random.random() < self.failure_rate
+            self.failures += fail
+            return fail
+
+
+def build_app(state: FakeEngineState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/{resource:path}")
+    async def call(resource: str, request: Request):
+        body = await request.json()
+        if state.record(request):
+            return JSONResponse({"error": {"code": 503, "message": "unavailable"}}, status_code=503)
+        method, arguments = body["class_method"], body["input"]
+        if resource.endswith(":query"):
+            if method == "create_session":
+                return {"output": {"id": uuid.uuid4().hex, "user_id": arguments["user_id"]}}
+            return {"output": None}
+
+        async def events():
+            for i in range(state.chunks):
+                await asyncio.sleep(state.chunk_latency)
+                event = {"content": {"parts": [{"text": f"chunk {i} "}]}, "author": "fake_agent"}
+                yield json.dumps(event) + "\n"
+
+        return StreamingResponse(events(), media_type="application/json")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--chunk-latency-ms", type=float, default=20.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    state = FakeEngineState(args.chunks, args.chunk_latency_ms / 1000, args.failure_rate)
+    uvicorn.run(build_app(state), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Load test for the /query request path against a local fake agent engine.
+
+Compares the old handler, which called the blocking agent query inline on the
+event loop, with the AgentQueryExecutor path, for an increasing number of
+concurrent users. Requires fastapi and httpx.
+
+Run from the repository root:
+    python benchmarks/load_test_query.py --users 1 4 16 64 --requests-per-user 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fastapi-agent-app", "app"))
+
+from query_executor import AgentBusyError, AgentQueryExecutor, AgentTimeoutError
+
+
+class FakeAgentEngine:
+    """Mimics `remote_app.stream_query`: a blocking generator of content events."""
+
+    def __init__(self, chunks: int, chunk_latency: float):
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+
+    def stream_query(self, user_id, session_id, message):
+        for i in range(self.chunks):
+            time.sleep(self.chunk_latency)
+            yield {"content": {"parts": [{"text": f"chunk {i} "}]}}
+
+
+def make_query_agent(engine):
+    def query_agent(question: str) -> str:
+        response_text = ""
+        for event in engine.stream_query(user_id="load-test", session_id="s", message=question):
+            for part in event["content"]["parts"]:
+                if "text" in part:
+                    response_text += part["text"]
+        return response_text
+    return query_agent
+
+
+class QueryRequest(BaseModel):
+    question: str
+
+
+def build_app(query_agent, executor=None):
+    app = FastAPI()
+
+    @app.post("/query")
+    async def handle_query(request: QueryRequest):
+        if executor is None:
+            return {"answer": query_agent(request.question)}
+        try:
+            return {"answer": await executor.run(query_agent, request.question)}
+        except AgentBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except AgentTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+
+    return app
+
+
+async def run_load(app, users: int, requests_per_user: int):
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake", timeout=None) as client:
+        async def user(user_index):
+            for i in range(requests_per_user):
+                start = time.perf_counter()
+                response = await client.post("/query", json={"question": f"question {user_index}-{i}"})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-user", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=5, help="Events streamed per fake agent answer.")
+    parser.add_argument("--chunk-latency-ms", type=float, default=20.0)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=256)
+    args = parser.parse_args()
+
+    engine = FakeAgentEngine(args.chunks, args.chunk_latency_ms / 1000)
+    query_agent = make_query_agent(engine)
+    print(f"{'mode':<10}{'users':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}  statuses")
+    for mode in ("inline", "executor"):
+        for users in args.users:
+            executor = AgentQueryExecutor(args.max_workers, args.max_queue, timeout=60) if mode == "executor" else None
+            result = asyncio.run(run_load(build_app(query_agent, executor), users, args.requests_per_user))
+            if executor:
+                executor.shutdown()
+            print(
+                f"{mode:<10}{users:>6}{result['throughput']:>10.1f}"
+                f"{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}  {result['statuses']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
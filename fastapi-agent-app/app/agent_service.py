@@ -1,54 +1,206 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import HTTPException
 import logging
 import os
-import google.cloud.logging
-from google.cloud.logging.handlers import CloudLoggingHandler
-import vertexai
-from vertexai import agent_engines
+import re
+import threading
+import time
 from dotenv import load_dotenv
+from engine_transport import EngineTransport, EngineUnavailableError
+from export import RecentQueries, ResultExporter, agent_queries
+from semantic_cache import SemanticCache, tokenize
+from session_manager import SessionManager
+from shared import SingleFlight, telemetry
 
 load_dotenv()
 
-# Initialize Google Cloud Logging
-project_id = os.environ["GOOGLE_CLOUD_PROJECT"]
-cloud_logging_client = google.cloud.logging.Client(project=project_id)
-handler = CloudLoggingHandler(cloud_logging_client, name="agent")
 logging.getLogger().setLevel(logging.INFO)
-logging.getLogger().addHandler(handler)
 
-# Initialize Vertex AI
+project_id = os.environ["GOOGLE_CLOUD_PROJECT"]
 location = os.environ["GOOGLE_CLOUD_LOCATION"]
 app_name = os.environ.get("APP_NAME", "Agent App")
 bucket_name = f"gs://{project_id}-bucket"
+# With an engine ID, the engine is called through the pooled EngineTransport instead of the Vertex AI SDK
+engine_id = os.environ.get("AGENT_ENGINE_ID")
 
-vertexai.init(
-    project=project_id,
-    location=location,
-    staging_bucket=bucket_name,
-)
+# Cloud Logging, Vertex AI and the remote agent are set up on first use or by `prewarm`, not at import:
+# importing vertexai alone takes seconds, and the server should accept traffic as soon as it starts
+_remote_app = None
+_init_lock = threading.Lock()
+
+def _init_cloud_logging():
+    import google.cloud.logging
+    from google.cloud.logging.handlers import CloudLoggingHandler
+
+    cloud_logging_client = google.cloud.logging.Client(project=project_id)
+    handler = CloudLoggingHandler(cloud_logging_client, name="agent")
+    logging.getLogger().addHandler(handler)
+
+def get_remote_app():
+    """Returns the remote agent engine, initializing Cloud Logging and Vertex AI on first use."""
+    global _remote_app
+    if _remote_app is None:
+        with _init_lock:
+            if _remote_app is None:
+                with telemetry.span("agent.initialize", transport="rest" if engine_id else "sdk"):
+                    _init_cloud_logging()
+                    if engine_id:
+                        _remote_app = EngineTransport.from_env(project_id, location, engine_id)
+                        return _remote_app
+                    import vertexai
+                    from vertexai import agent_engines
+
+                    vertexai.init(
+                        project=project_id,
+                        location=location,
+                        staging_bucket=bucket_name,
+                    )
+                    _remote_app = agent_engines.get('')
+    return _remote_app
 
-remote_app = vertexai.agent_engines.get('')
-remote_session = remote_app.create_session(user_id="u_457")
+def remote_app_ready() -> bool:
+    return _remote_app is not None
 
-def query_agent(question: str) -> str:
+def engine_stats() -> dict:
+    """Connection pool and circuit breaker counters, when the engine is called through EngineTransport."""
+    return _remote_app.stats() if isinstance(_remote_app, EngineTransport) else {}
+
+def close():
+    if isinstance(_remote_app, EngineTransport):
+        _remote_app.close()
+
+def prewarm():
+    """Initializes the remote agent ahead of the first request; if it fails, the first request retries."""
     try:
+        get_remote_app()
+    except Exception as e:
+        logging.warning(f"Could not prewarm the agent engine: {e}")
+
+# One session per caller, created on first use and rotated before its history grows too long
+session_manager = SessionManager.from_env(
+    create_session=lambda user_id: get_remote_app().create_session(user_id=user_id)["id"],
+    delete_session=lambda user_id, session_id: get_remote_app().delete_session(user_id=user_id, session_id=session_id),
+)
+
+# Tables whose modification time versions the answer cache, e.g. "project.dataset.table,project.dataset.other"
+cache_tables = [name.strip() for name in (os.environ.get("SEMANTIC_CACHE_TABLES") or "").split(",") if name.strip()]
+_bigquery_client = None
+
+def data_version():
+    """Returns the modification times of `cache_tables`; table metadata lookups are free."""
+    global _bigquery_client
+    if _bigquery_client is None:
+        from google.cloud import bigquery
+        _bigquery_client = bigquery.Client(project=project_id)
+    return tuple(_bigquery_client.get_table(name).modified for name in cache_tables)
 
-        events = remote_app.stream_query(
-            user_id="u_457",
-            session_id=remote_session["id"],
+# Answers to questions already asked in other words skip the agent (set SEMANTIC_CACHE_ENABLED=false to disable)
+answer_cache = None
+if os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() != "false":
+    answer_cache = SemanticCache.from_env(version_source=data_version if cache_tables else None)
+
+# Tool results reporting a failure (the agents' "ERROR: ..." results and backend errors), and answers that apologise
+# instead of answering: the turn failed, so its answer is not cached for other callers
+_TOOL_ERROR = re.compile(
+    r"^(?:ERROR:|An unexpected error occurred|BigQuery API Error|DuckDB Error|(?:BigQuery|DuckDB) query did not finish)",
+    re.MULTILINE,
+)
+_APOLOGY = re.compile(
+    r"^\W*(?:I'm sorry|I am sorry|sorry|I apologi[sz]e|unfortunately|I (?:could not|couldn't|was unable|am unable|can't|cannot))\b",
+    re.IGNORECASE,
+)
+
+def tool_failed(part: dict) -> bool:
+    """Whether an event part is a tool result (`function_response`) reporting an error."""
+    response = part.get("function_response") or part.get("functionResponse") or {}
+    output = response.get("response")
+    values = output.values() if isinstance(output, dict) else [output]
+    return any(isinstance(value, str) and _TOOL_ERROR.search(value) for value in values)
+
+# Identical questions asked while one is being answered wait for that answer (set SINGLEFLIGHT_ENABLED=false to disable)
+agent_flight = None
+if os.environ.get("SINGLEFLIGHT_ENABLED", "true").lower() != "false":
+    agent_flight = SingleFlight("agent_query")
+
+# The SQL behind each caller's last answer, and the exporter that streams its full result (see POST /export)
+recent_queries = RecentQueries(max_callers=int(os.environ.get("SESSION_MAX_LIVE") or 1000))
+try:
+    exporter = ResultExporter.from_env(project_id)
+except ValueError as e:
+    # Without an allowlist /export stays off instead of reading any table the service account can
+    logging.error(f"POST /export disabled: {e}")
+    exporter = None
+
+def stream_agent(question: str, user_id: str, queries: list = None):
+    """
+    Yields the text parts of the agent's answer as they arrive from the remote stream.
+
+    The SQL behind the answer is recorded for the caller, and added to `queries` when given.
+    """
+    with telemetry.span("agent.stream_query", user_id=user_id, question_chars=len(question)) as span:
+        cached_answer = answer_cache.get(question) if answer_cache is not None else None
+        if cached_answer is not None:
+            span.set(cache="hit", answer_chars=len(cached_answer))
+            telemetry.metrics.inc("agent_answers_total", source="cache")
+            yield cached_answer
+            return
+
+        events = get_remote_app().stream_query(
+            user_id=user_id,
+            session_id=session_manager.session_for(user_id),
             message=question,
         )
-
-        response_text = ""
+        chunks, answer_chars, failed = [], 0, False
+        queries = [] if queries is None else queries
         for event in events:
-            for part in event["content"]["parts"]:
+            failed = failed or bool(event.get("error_code") or event.get("error_message"))
+            # Error events may come without content; they are counted as failures above
+            for part in (event.get("content") or {}).get("parts") or []:
+                queries += agent_queries(part)
+                failed = failed or tool_failed(part)
                 if "text" in part:
-                    response_text += part["text"]
-                    logging.info("[remote response] " + response_text)
+                    if not chunks:
+                        span.set(first_chunk_ms=round((time.time() - span.start) * 1000, 1))
+                    chunks.append(part["text"])
+                    answer_chars += len(part["text"])
+                    yield part["text"]
+        answer = "".join(chunks)
+        failed = failed or bool(_APOLOGY.match(answer))
+        span.set(chunks=len(chunks), answer_chars=answer_chars, queries=len(queries), failed=failed)
+    recent_queries.record(user_id, queries)
+    if answer_cache is not None:
+        if failed:
+            # An error or apology would be repeated to everyone asking alike for the cache's whole TTL
+            telemetry.metrics.inc("agent_answers_not_cached_total")
+        else:
+            answer_cache.put(question, answer)
+    telemetry.metrics.inc("agent_answers_total", source="agent")
+    telemetry.metrics.inc("agent_answer_chars_total", answer_chars)
+    session_manager.record_turn(user_id)
+
+def query_agent(question: str, user_id: str) -> str:
+    try:
+        # Follow-up and calendar questions depend on the caller's session, so are never shared
+        if agent_flight is not None and SemanticCache.cacheable(tokenize(question)):
+            def answer():
+                queries = []
+                return "".join(stream_agent(question, user_id, queries)), queries
+
+            # Keyed on the question text up to case and spacing: only identical questions share an answer
+            (response_text, queries), shared = agent_flight.do(" ".join(question.lower().split()), answer)
+            if shared:
+                # The turn ran in the leader's session: count it in this caller's too, and let it export the same SQL
+                recent_queries.record(user_id, queries)
+                session_manager.record_turn(user_id)
+        else:
+            response_text, shared = "".join(stream_agent(question, user_id)), False
+        # Logged once per answer, not once per chunk
+        if not shared:
+            logging.info("[remote response] " + response_text)
         return response_text
 
         raise HTTPException(status_code=500, detail="No response from agent.")
+    except EngineUnavailableError:
+        raise
     except Exception as e:
         logging.error(f"Error querying agent: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -0,0 +1,324 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from query_executor import AgentBusyError
+from shared import telemetry
+
+
+# Statuses meaning the engine did not run the request, so sending it again cannot repeat a turn
+RETRYABLE_STATUSES = {429, 502, 503}
+# Errors raised before the request reached the engine (a stale keep-alive connection shows up as RemoteProtocolError)
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+def _http2_available() -> bool:
+    try:
+        import h2 # noqa: F401 (httpx negotiates HTTP/2 only when h2 is installed)
+    except ImportError:
+        return False
+    return True
+
+
+class EngineUnavailableError(Exception):
+    """Raised without calling the engine while the circuit breaker is open."""
+
+
+class EngineRequestError(Exception):
+    """Raised when the engine answers with an error status, after any retries."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Agent engine returned {status_code}: {detail}")
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """
+    Stops calling an engine that keeps failing, and probes it again after a pause.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail right away for `reset_timeout` seconds. Then one call is let through:
+    its success closes the circuit, its failure opens it for another pause.
+    Every call let through must end in `record_success`, `record_failure` or
+    `release`, or the probe never ends and the circuit stays open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """Ends a call that says nothing about the engine's health (a client error, a caller that stopped reading)."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if not self._probing:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def google_token_provider():
+    """Returns a function giving a valid OAuth access token from the application default credentials."""
+    import google.auth
+    from google.auth.transport.requests import Request
+
+    credentials, _ = google.auth.default(scopes=SCOPES)
+    lock = threading.Lock()
+
+    def token() -> str:
+        with lock:
+            if not credentials.valid:
+                credentials.refresh(Request())
+            return credentials.token
+
+    return token
+
+
+class EngineTransport:
+    """
+    Calls a deployed Agent Engine over its REST API, as a drop-in for the SDK's remote app.
+
+    One httpx client is shared by every request, so TLS connections are kept
+    alive and reused (and multiplexed over HTTP/2 when the `h2` package is
+    installed) instead of being set up again for each question. At most
+    `max_concurrency` calls run at once; further callers wait up to
+    `acquire_timeout` seconds, then get AgentBusyError.
+
+    Calls the engine cannot have run (connection errors, 429, 502 and 503) are
+    retried up to `max_retries` times with full-jitter exponential backoff,
+    honouring Retry-After. A stream is never retried once its first event has
+    been read, so an answer is never repeated. Failed calls feed a
+    CircuitBreaker, which makes calls fail fast with EngineUnavailableError
+    while the engine is down.
+    """
+
+    def __init__(self, resource_name: str, endpoint: str, token_provider=None, max_connections: int = 32,
+                 max_concurrency: int = 32, acquire_timeout: float = 10.0, max_retries: int = 3,
+                 backoff: float = 0.2, max_backoff: float = 5.0, connect_timeout: float = 10.0,
+                 timeout: float = 120.0, keepalive_expiry: float = 60.0, breaker: CircuitBreaker = None,
+                 verify=True):
+        self.resource_name = resource_name
+        self.endpoint = endpoint.rstrip("/")
+        self.token_provider = token_provider
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.http2 = _http2_available()
+        self._client = httpx.Client(
+            http2=self.http2,
+            verify=verify,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry),
+        )
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, project_id: str, location: str, engine_id: str):
+        """`engine_id` is the engine's numeric ID or full resource name."""
+        resource_name = engine_id if "/" in engine_id else \
+            f"projects/{project_id}/locations/{location}/reasoningEngines/{engine_id}"
+        endpoint = os.environ.get("AGENT_ENGINE_ENDPOINT") or f"https://{location}-aiplatform.googleapis.com/v1"
+        return cls(
+            resource_name,
+            endpoint,
+            token_provider=google_token_provider() if endpoint.startswith("https://") else None,
+            max_connections=int(os.environ.get("AGENT_ENGINE_MAX_CONNECTIONS") or 32),
+            max_concurrency=int(os.environ.get("AGENT_ENGINE_MAX_CONCURRENCY") or 32),
+            max_retries=int(os.environ.get("AGENT_ENGINE_MAX_RETRIES") or 3),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("AGENT_ENGINE_BREAKER_FAILURES") or 5),
+                reset_timeout=float(os.environ.get("AGENT_ENGINE_BREAKER_RESET_SECONDS") or 30),
+            ),
+        )
+
+    # --- Remote app interface ---
+
+    def create_session(self, user_id: str) -> dict:
+        return self._query("create_session", user_id=user_id)
+
+    def delete_session(self, user_id: str, session_id: str):
+        return self._query("delete_session", user_id=user_id, session_id=session_id)
+
+    def stream_query(self, user_id: str, session_id: str, message: str):
+        """Yields the engine's events (dicts) as they are streamed."""
+        with self._request("stream_query", user_id=user_id, session_id=session_id, message=message) as response:
+            for line in response.iter_lines():
+                # Events come as JSON lines, or as server-sent events with ?alt=sse
+                line = line.removeprefix("data:").strip()
+                if line:
+                    yield json.loads(line)
+
+    def _query(self, class_method: str, **kwargs):
+        with self._request(class_method, **kwargs) as response:
+            output = json.loads(response.read() or b"{}")
+        return output.get("output", output)
+
+    # --- Transport ---
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.token_provider is not None:
+            headers["Authorization"] = f"Bearer {self.token_provider()}"
+        return headers
+
+    def _delay(self, attempt: int, response: httpx.Response = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise AgentBusyError("Too many concurrent agent engine calls, please retry shortly.")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def _send(self, class_method: str, body: dict, span) -> httpx.Response:
+        """Sends one call, retrying while the engine cannot have run it, and returns the open response."""
+        method = "streamQuery" if class_method == "stream_query" else "query"
+        url = f"{self.endpoint}/{self.resource_name}:{method}"
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                telemetry.metrics.inc("agent_engine_requests_total", method=class_method, status="circuit_open")
+                raise EngineUnavailableError("The agent engine is unavailable, please retry shortly.")
+            response, error = None, None
+            try:
+                request = self._client.build_request("POST", url, headers=self._headers(), json=body)
+            except Exception:
+                # No token (or no request) means no call: fail it like an unreachable engine, ending any probe
+                self.breaker.record_failure()
+                raise
+            try:
+                response = self._client.send(request, stream=True)
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except httpx.HTTPError:
+                self.breaker.record_failure()
+                raise
+            status = str(response.status_code) if response is not None else type(error).__name__
+            telemetry.metrics.inc("agent_engine_requests_total", method=class_method, status=status)
+            if response is not None and response.status_code < 400:
+                span.set(http_version=response.http_version)
+                return response
+            if response is not None and response.status_code not in RETRYABLE_STATUSES:
+                detail = response.read().decode(errors="replace")[:500]
+                response.close()
+                # Only server errors count against the engine's health
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                raise EngineRequestError(response.status_code, detail)
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                detail = response.read().decode(errors="replace")[:500]
+                response.close()
+                raise EngineRequestError(response.status_code, detail)
+            delay = self._delay(attempt, response)
+            if response is not None:
+                response.close()
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            telemetry.metrics.inc("agent_engine_retries_total", method=class_method)
+            span.set(retries=attempt)
+            time.sleep(delay)
+
+    @contextmanager
+    def _request(self, class_method: str, **kwargs):
+        """Yields the engine's streamed response to `class_method(**kwargs)`, holding a concurrency slot."""
+        with self._slot(), telemetry.span("agent_engine.request", method=class_method) as span:
+            with self._lock:
+                self.requests += 1
+            start = time.perf_counter()
+            response = self._send(class_method, {"class_method": class_method, "input": kwargs}, span)
+            # Every way out settles the call with the breaker, so a probe can never be left open
+            try:
+                yield response
+            except GeneratorExit:
+                # The caller stopped reading the stream early
+                self.breaker.release()
+                raise
+            except BaseException:
+                # The answer broke off or could not be read (httpx errors, invalid JSON, ...)
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+            finally:
+                response.close()
+                telemetry.metrics.observe("agent_engine_request_seconds", time.perf_counter() - start,
+                                          method=class_method)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "circuit_open": int(self.breaker.state != "closed"),
+                "circuit_opened": self.breaker.opened,
+            }
+
+    def close(self):
+        self._client.close()
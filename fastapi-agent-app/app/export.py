@@ -0,0 +1,383 @@
+import csv
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from shared import telemetry
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Only needed for Parquet exports
+    pa = pq = None
+
+
+DEFAULT_PAGE_SIZE = 10_000
+DEFAULT_MAX_BYTES = 10 << 30 # 10 GiB billed per export
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Tools of the agents whose calls carry the SQL behind an answer, and the argument holding it
+AGENT_SQL_TOOLS = {"execute_bigquery_query": "sql_query", "execute_bigquery_queries": "sql_queries"}
+
+# The tables of the agents' schema registry (agents/common/schema.py), the default export allowlist; mirrored here
+# because the app is deployed without the agents tree
+REGISTRY_TABLES = (
+    "hacker2025-team-199-dev.sales_analyst.artificial_sales",
+    "hacker2025-team-199-dev.sales_and_promo.weekly_sales_data",
+)
+
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|--[^\n]*|#[^\n]*|/\*.*?\*/", re.DOTALL)
+_FORBIDDEN = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TRUNCATE|GRANT|REVOKE|CALL|EXECUTE|DECLARE|SET|BEGIN|EXPORT|LOAD)\b",
+    re.IGNORECASE,
+)
+# FROM that does not start a FROM clause: EXTRACT(YEAR FROM date), a IS DISTINCT FROM b
+_NOT_A_TABLE_FROM = re.compile(r"(\bEXTRACT\s*\(\s*\w+\s+|\bDISTINCT\s+)FROM\b", re.IGNORECASE)
+_FROM = re.compile(r"\bFROM\b", re.IGNORECASE)
+# What ends a FROM clause at its own depth (besides a closing parenthesis)
+_FROM_CLAUSE_END = re.compile(
+    r"\b(?:WHERE|GROUP\s+BY|HAVING|QUALIFY|WINDOW|ORDER\s+BY|LIMIT|OFFSET|UNION|INTERSECT|EXCEPT|SELECT)\b", re.IGNORECASE
+)
+_JOIN = re.compile(r"\b(?:(?:NATURAL\s+)?(?:LEFT|RIGHT|FULL|INNER|CROSS)\s+(?:OUTER\s+)?)?JOIN\b", re.IGNORECASE)
+_FROM_ITEM = re.compile(r"(`[^`]+`|[\w.-]+)\s*(\()?")
+_SUBQUERY = re.compile(r"\(\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+_CTE_NAME = re.compile(r"(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s+AS\s*\(", re.IGNORECASE)
+
+
+class ExportRejectedError(Exception):
+    """Raised when the SQL to export is not a single read-only SELECT over the allowed tables."""
+
+
+# --- Validation ---
+
+def _mask(sql: str) -> str:
+    """`sql` with string literals and comments blanked out, so keywords inside them are not matched."""
+    return _LITERAL_OR_COMMENT.sub(lambda match: " " * len(match.group()), sql)
+
+
+def _split_top_level(text: str, separator: re.Pattern) -> list:
+    """
+    Splits `text` where `separator` matches outside parentheses and quoted names.
+
+    The same splitting as common/sql_parsing.py's `split_top_level`, for
+    separators longer than a character (JOIN).
+    """
+    parts, depth, quote, start, position = [], 0, None, 0, 0
+    while position < len(text):
+        char = text[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            # `match` at a position still sees the text before it, so \b in `separator` holds
+            match = separator.match(text, position)
+            if match:
+                parts.append(text[start:position].strip())
+                start = position = match.end()
+                continue
+        position += 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def _from_clause(masked: str, start: int) -> str:
+    """The FROM clause starting at `start` (just after FROM): up to its next clause keyword, or the parenthesis closing it."""
+    depth, quote = 0, None
+    for position in range(start, len(masked)):
+        char = masked[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char == "`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                return masked[start:position]
+        elif depth == 0 and _FROM_CLAUSE_END.match(masked, position):
+            return masked[start:position]
+    return masked[start:]
+
+
+def _table_references(masked: str) -> list:
+    """
+    Every item of every FROM clause of `masked` (at any depth), split on top-level commas and JOINs.
+
+    Each is (name, is_call): `is_call` for a function such as UNNEST(...) or
+    EXTERNAL_QUERY(...), and name None for a subquery, whose own FROM clauses
+    are items of the list too. Raises ExportRejectedError for anything else.
+    """
+    masked = _NOT_A_TABLE_FROM.sub(lambda match: match.group(1) + "    ", masked)
+    references = []
+    for keyword in _FROM.finditer(masked):
+        for joined in _split_top_level(_from_clause(masked, keyword.end()), re.compile(",")):
+            for item in _split_top_level(joined, _JOIN):
+                if not item:
+                    continue
+                if _SUBQUERY.match(item):
+                    references.append((None, False))
+                    continue
+                reference = _FROM_ITEM.match(item)
+                if reference is None:
+                    raise ExportRejectedError(f"Cannot tell which table '{item[:80]}' reads.")
+                references.append((reference.group(1).strip("`"), bool(reference.group(2))))
+    return references
+
+
+def validate_select(sql: str, allowed_tables: tuple) -> str:
+    """
+    Returns `sql` without its trailing semicolon if it is a single read-only SELECT, else raises ExportRejectedError.
+
+    Every table it reads (other than its own WITH clauses) must be one of
+    `allowed_tables`, wherever it appears: in a FROM or JOIN, after a comma,
+    or in a subquery. Table functions (EXTERNAL_QUERY, ML.PREDICT, ...) are
+    rejected; UNNEST is the only function allowed in FROM.
+    """
+    sql = (sql or "").strip().rstrip(";").strip()
+    masked = _mask(sql)
+    if not re.match(r"(?:SELECT|WITH)\b", masked.lstrip("( \n\t"), re.IGNORECASE):
+        raise ExportRejectedError("Only SELECT queries can be exported.")
+    if ";" in masked:
+        raise ExportRejectedError("Only a single statement can be exported.")
+    forbidden = _FORBIDDEN.search(masked)
+    if forbidden:
+        raise ExportRejectedError(f"Only read-only queries can be exported, found {forbidden.group().upper()}.")
+    allowed = {table.lower() for table in allowed_tables}
+    ctes = {name.lower() for name in _CTE_NAME.findall(masked)}
+    for name, is_call in _table_references(masked):
+        if name is None or (is_call and name.upper() == "UNNEST"):
+            continue
+        if is_call:
+            raise ExportRejectedError(f"Table function {name} cannot be exported.")
+        if name.lower() not in allowed and name.lower() not in ctes:
+            raise ExportRejectedError(f"Table {name} cannot be exported.")
+    return sql
+
+
+# --- Last Agent Queries ---
+
+class RecentQueries:
+    """
+    The SQL behind each caller's last agent answer, so it can be exported in full.
+
+    Kept in a bounded LRU of `max_callers` callers, like the agent sessions.
+    """
+
+    def __init__(self, max_callers: int = 1000):
+        self.max_callers = max_callers
+        self._queries = OrderedDict() # user_id -> [sql, ...] of the last answer
+        self._lock = threading.Lock()
+
+    def record(self, user_id: str, queries: list):
+        if not queries:
+            return
+        with self._lock:
+            self._queries[user_id] = list(queries)
+            self._queries.move_to_end(user_id)
+            while len(self._queries) > self.max_callers:
+                self._queries.popitem(last=False)
+
+    def last(self, user_id: str, index: int = -1):
+        """The `index`-th query behind the caller's last answer (the last one by default), or None."""
+        with self._lock:
+            queries = self._queries.get(user_id)
+        try:
+            return queries[index] if queries else None
+        except IndexError:
+            return None
+
+
+def agent_queries(part: dict) -> list:
+    """The SQL of an agent tool call event part (`function_call`), or an empty list for any other part."""
+    call = part.get("function_call") or part.get("functionCall") or {}
+    argument = AGENT_SQL_TOOLS.get(call.get("name"))
+    if argument is None:
+        return []
+    value = (call.get("args") or {}).get(argument)
+    return [value] if isinstance(value, str) else [sql for sql in value or [] if isinstance(sql, str)]
+
+
+# --- Export ---
+
+def _arrow_type(field):
+    """The Arrow type of a BigQuery schema field; anything without a plain equivalent is exported as a string."""
+    if field.mode == "REPEATED" or field.field_type in ("RECORD", "STRUCT"):
+        return pa.string()
+    return {
+        "INTEGER": pa.int64(), "INT64": pa.int64(), "FLOAT": pa.float64(), "FLOAT64": pa.float64(),
+        "NUMERIC": pa.decimal128(38, 9), "BIGNUMERIC": pa.decimal256(76, 38), "BOOLEAN": pa.bool_(), "BOOL": pa.bool_(),
+        "DATE": pa.date32(), "DATETIME": pa.timestamp("us"), "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+        "TIME": pa.time64("us"), "BYTES": pa.binary(),
+    }.get(field.field_type, pa.string())
+
+
+class _Chunks:
+    """A write-only file that hands back what was written since the last `take`."""
+
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+class Export:
+    """A running export: the query's schema and row count, and its rows streamed a page at a time."""
+
+    def __init__(self, rows, file_format: str, max_rows: int = None):
+        self._rows = rows
+        self.file_format = file_format
+        self.max_rows = max_rows
+        self.schema = list(rows.schema)
+        self.headers = [field.name for field in self.schema]
+        self.total_rows = rows.total_rows
+        self.media_type = FORMATS[file_format]
+
+    def _pages(self):
+        """Pages of row tuples, fetched from the warehouse one at a time and stopped at `max_rows`."""
+        remaining = self.max_rows
+        for page in self._rows.pages:
+            rows = [tuple(row.values()) for row in page]
+            if remaining is not None:
+                rows = rows[:remaining]
+                remaining -= len(rows)
+            if rows:
+                yield rows
+            if remaining == 0:
+                return
+
+    def _csv(self):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(self.headers)
+        for rows in self._pages():
+            writer.writerows(rows)
+            yield len(rows), text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+        if text.tell():
+            yield 0, text.getvalue().encode()
+
+    def _parquet(self):
+        schema = pa.schema([pa.field(field.name, _arrow_type(field)) for field in self.schema])
+        stringified = [pa.types.is_string(column.type) for column in schema]
+        sink = _Chunks()
+        # One row group per page, written out as soon as it is complete
+        with pq.ParquetWriter(sink, schema) as writer:
+            for rows in self._pages():
+                columns = [
+                    [None if value is None else str(value) for value in column] if as_string else list(column)
+                    for column, as_string in zip(zip(*rows), stringified)
+                ]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                yield len(rows), sink.take()
+        yield 0, sink.take()
+
+    def chunks(self):
+        """Yields the file in chunks of about one page; only one page is held in memory at a time."""
+        # No span here: the server may resume the generator on a different thread (and context) for every chunk
+        start = time.perf_counter()
+        rows_sent = bytes_sent = 0
+        for rows, data in (self._csv() if self.file_format == "csv" else self._parquet()):
+            rows_sent += rows
+            bytes_sent += len(data)
+            if data:
+                yield data
+        telemetry.metrics.observe("export_stream_seconds", time.perf_counter() - start, format=self.file_format)
+        telemetry.metrics.inc("export_rows_total", rows_sent, format=self.file_format)
+        telemetry.metrics.inc("export_bytes_total", bytes_sent, format=self.file_format)
+
+
+class ResultExporter:
+    """
+    Runs a validated SELECT on BigQuery and streams its full result as CSV or Parquet.
+
+    The rows never go through the agent or the model, and are not capped like
+    the agents' tool results. BigQuery keeps the result server-side and it is
+    read back `page_size` rows at a time, each page written out before the
+    next is fetched, so memory stays constant whatever the result size.
+    `max_bytes` caps what a query may bill, `max_rows` optionally caps the
+    rows exported, and `allowed_tables` the tables it may read; an exporter
+    without any raises ValueError rather than exporting any table the
+    service account can read.
+    """
+
+    def __init__(self, project: str, client_factory=None, page_size: int = DEFAULT_PAGE_SIZE,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_rows: int = None, allowed_tables: tuple = REGISTRY_TABLES):
+        if not allowed_tables:
+            raise ValueError("No tables to export from: set EXPORT_TABLES, or leave it empty for the schema registry's.")
+        self.project = project
+        self._client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.allowed_tables = tuple(allowed_tables)
+
+    @classmethod
+    def from_env(cls, project: str):
+        return cls(
+            project,
+            page_size=int(os.environ.get("EXPORT_PAGE_SIZE") or DEFAULT_PAGE_SIZE),
+            max_bytes=int(os.environ.get("EXPORT_MAX_BYTES") or DEFAULT_MAX_BYTES),
+            max_rows=int(os.environ["EXPORT_MAX_ROWS"]) if os.environ.get("EXPORT_MAX_ROWS") else None,
+            allowed_tables=[name.strip() for name in (os.environ.get("EXPORT_TABLES") or "").split(",") if name.strip()]
+                           or REGISTRY_TABLES,
+        )
+
+    def _bigquery(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self._client_factory is None:
+                        # Imported on first use, like the answer cache's version lookups
+                        from google.cloud import bigquery
+                        self._client_factory = bigquery.Client
+                    self._client = self._client_factory(project=self.project)
+        return self._client
+
+    def start(self, sql: str, file_format: str = "csv") -> Export:
+        """
+        Validates and runs `sql`, and returns the Export to stream once the query finished.
+
+        Raises ExportRejectedError for invalid SQL or formats; BigQuery errors
+        (including going over `max_bytes`) are raised as they are.
+        """
+        if file_format not in FORMATS:
+            raise ExportRejectedError(f"Unknown export format '{file_format}', use one of: {', '.join(FORMATS)}.")
+        if file_format == "parquet" and pq is None:
+            raise ExportRejectedError("Parquet exports require the 'pyarrow' package.")
+        sql = validate_select(sql, self.allowed_tables)
+        from google.cloud import bigquery
+
+        with telemetry.span("export.query", format=file_format) as span:
+            job_config = bigquery.QueryJobConfig(maximum_bytes_billed=self.max_bytes)
+            query_job = self._bigquery().query(sql, job_config=job_config)
+            rows = query_job.result(page_size=self.page_size)
+            span.set(total_rows=rows.total_rows, bytes_scanned=query_job.total_bytes_processed or 0)
+        telemetry.metrics.inc("export_requests_total", format=file_format)
+        return Export(rows, file_format, self.max_rows)
@@ -1,7 +1,18 @@
-from fastapi import FastAPI
+import json
+import os
+import threading
+from typing import Optional
+from fastapi import FastAPI, Header, Request
 from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from agent_service import query_agent
+from agent_service import (agent_flight, answer_cache, close as close_agent_service, engine_stats, exporter, prewarm,
+                           query_agent, recent_queries, remote_app_ready, session_manager, stream_agent)
+from engine_transport import EngineUnavailableError
+from export import ExportRejectedError
+from query_executor import AgentBusyError, AgentQueryExecutor, AgentTimeoutError
+from shared import telemetry
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -18,16 +29,145 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Agent queries are blocking, run them off the event loop with bounded concurrency
+agent_executor = AgentQueryExecutor.from_env()
+
+@app.on_event("startup")
+def start_prewarm():
+    """Connects to the agent engine in the background (unless AGENT_PREWARM=false); startup does not wait for it."""
+    if os.environ.get("AGENT_PREWARM", "true").lower() != "false":
+        threading.Thread(target=prewarm, name="agent-prewarm", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    agent_executor.shutdown()
+    close_agent_service()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Times every request as a span and counts it by route and status code."""
+    with telemetry.span(f"http {request.method}", path=request.url.path) as span:
+        response = await call_next(request)
+        span.set(status=response.status_code)
+    # Label by route template, not raw path, so unknown URLs cannot blow up the metric cardinality
+    route = request.scope.get("route")
+    telemetry.metrics.inc("http_requests_total", route=route.path if route else "unmatched", status=response.status_code)
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    telemetry.metrics.set("agent_queries_in_flight", agent_executor.in_flight)
+    telemetry.metrics.set("agent_engine_ready", int(remote_app_ready()))
+    for name, value in engine_stats().items():
+        telemetry.metrics.set(f"agent_engine_{name}", value)
+    for name, value in session_manager.stats().items():
+        telemetry.metrics.set(f"agent_sessions_{name}", value)
+    if agent_flight is not None:
+        for name, value in agent_flight.stats().items():
+            telemetry.metrics.set(f"agent_singleflight_{name}", value)
+    if answer_cache is not None:
+        for name, value in answer_cache.stats().items():
+            telemetry.metrics.set(f"semantic_cache_{name}", value)
+    if telemetry.exporter is not None:
+        telemetry.metrics.set("telemetry_spans_dropped", telemetry.exporter.dropped)
+    return telemetry.metrics.render()
+
 class QueryRequest(BaseModel):
     question: str
+    user_id: Optional[str] = None
+
+def caller_id(request: QueryRequest, http_request: Request, x_user_id: Optional[str]) -> str:
+    """Identifies the caller whose agent session is used: body, X-User-Id header, then client address."""
+    if request.user_id:
+        return request.user_id
+    if x_user_id:
+        return x_user_id
+    return f"anonymous-{http_request.client.host if http_request.client else 'unknown'}"
 
 class QueryResponse(BaseModel):
     answer: str
 
 @app.post("/query", response_model=QueryResponse)
-async def handle_query(request: QueryRequest):
+async def handle_query(request: QueryRequest, http_request: Request, x_user_id: Optional[str] = Header(None)):
     try:
-        answer = query_agent(request.question)
+        answer = await agent_executor.run(query_agent, request.question, caller_id(request, http_request, x_user_id))
         return QueryResponse(answer=answer)
+    except (AgentBusyError, EngineUnavailableError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except AgentTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(data: dict, event: str = None) -> str:
+    """Formats one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def handle_query_stream(request: QueryRequest, http_request: Request, x_user_id: Optional[str] = Header(None)):
+    """Streams the agent's answer as server-sent events, one `data` event per text chunk."""
+    chunks = agent_executor.stream(stream_agent, request.question, caller_id(request, http_request, x_user_id))
+    try:
+        # Start the agent before sending headers, so a full server still gets a plain 503
+        first_chunk = await anext(chunks, None)
+    except (AgentBusyError, EngineUnavailableError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except AgentTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        try:
+            if first_chunk is not None:
+                yield _sse({"text": first_chunk})
+            async for text in chunks:
+                yield _sse({"text": text})
+            yield _sse({}, event="done")
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class ExportRequest(BaseModel):
+    sql: Optional[str] = None
+    format: str = "csv"
+    user_id: Optional[str] = None
+
+@app.post("/export")
+async def handle_export(request: ExportRequest, http_request: Request, x_user_id: Optional[str] = Header(None)):
+    """
+    Streams the full result of a SELECT as CSV or Parquet, without going through the agent.
+
+    Without `sql`, exports the query behind the caller's last agent answer.
+    """
+    if exporter is None:
+        raise HTTPException(status_code=503, detail="Exports are disabled: no tables are allowed (EXPORT_TABLES).")
+    sql = request.sql or recent_queries.last(caller_id(request, http_request, x_user_id))
+    if sql is None:
+        raise HTTPException(status_code=404, detail="No query to export: pass `sql`, or ask the agent a data question first.")
+    try:
+        # Runs the query before sending headers, so a rejected or failing query still gets a plain error status
+        export = await run_in_threadpool(exporter.start, sql, request.format)
+    except ExportRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"The export query failed: {e}")
+
+    # A plain generator: Starlette iterates it on a worker thread, one page at a time
+    return StreamingResponse(
+        export.chunks(),
+        media_type=export.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="export.{request.format}"',
+            "X-Total-Rows": str(export.total_rows),
+        },
+    )
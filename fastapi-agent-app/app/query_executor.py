@@ -0,0 +1,121 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AgentBusyError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class AgentTimeoutError(Exception):
+    """Raised when an agent query does not finish within the request timeout."""
+
+
+class AgentQueryExecutor:
+    """
+    Runs blocking agent queries on a bounded thread pool so they never block the event loop.
+
+    At most `max_workers` queries run at once and at most `max_queue` more wait
+    for a worker; further requests are rejected right away with AgentBusyError
+    instead of piling up. Callers stop waiting after `timeout` seconds. A timed
+    out query keeps its worker until the remote stream ends, and its slot is
+    only released then, so the bound on running queries always holds.
+    """
+
+    def __init__(self, max_workers: int = 16, max_queue: int = 64, timeout: float = 120.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-query")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_workers=int(os.environ.get("AGENT_MAX_CONCURRENCY") or 16),
+            max_queue=int(os.environ.get("AGENT_MAX_QUEUE") or 64),
+            timeout=float(os.environ.get("AGENT_TIMEOUT_SECONDS") or 120),
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, func, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise AgentBusyError("Too many concurrent agent queries, please retry shortly.")
+            self._in_flight += 1
+        try:
+            # Run in a copy of the caller's context, so spans started by the worker nest under the request span
+            future = self._pool.submit(contextvars.copy_context().run, func, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args, timeout: float = None):
+        """Runs `func(*args)` on the pool and returns its result."""
+        future = self._submit(func, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise AgentTimeoutError(f"The agent did not answer within {timeout or self.timeout:.0f} seconds.")
+
+    async def stream(self, func, *args, timeout: float = None):
+        """
+        Runs the blocking generator `func(*args)` on the pool and yields its items as they arrive.
+
+        The generator is closed early when the consumer stops iterating (e.g. the
+        client disconnected) or when the stream exceeds `timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        stop = threading.Event()
+        end = object()
+
+        def publish(error, item):
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (error, item))
+            except RuntimeError:
+                stop.set() # The event loop is gone
+
+        def produce():
+            generator = func(*args)
+            try:
+                for item in generator:
+                    if stop.is_set():
+                        break
+                    publish(None, item)
+            except Exception as e:
+                publish(e, None)
+            finally:
+                generator.close()
+                publish(None, end)
+
+        self._submit(produce)
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            while True:
+                try:
+                    error, item = await asyncio.wait_for(items.get(), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    raise AgentTimeoutError(f"The agent did not finish within {timeout or self.timeout:.0f} seconds.")
+                if error is not None:
+                    raise error
+                if item is end:
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
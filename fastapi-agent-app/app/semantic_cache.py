@@ -0,0 +1,292 @@
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+DIMENSIONS = 1 << 20 # Hashed feature space; collisions are rare at question length
+SIMILARITY_THRESHOLD = 0.7 # Anchors must match exactly, so the vectors only need to agree on the rest
+DEFAULT_TTL_SECONDS = 60 * 60
+MAX_ENTRIES = 2000
+MAX_BYTES = 16 * 1024 * 1024
+VERSION_CHECK_INTERVAL_SECONDS = 60
+MIN_QUESTION_WORDS = 3
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_UNCHECKED = object() # No data version was read: the check is not due or failed
+
+# Words that never change the answer; range and conjunction words ("from 2021 to 2023", "2021 and 2023") do
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "by", "during", "with", "is", "are",
+    "was", "were", "be", "been", "do", "does", "did", "has", "have", "had", "what", "which", "who", "how", "much",
+    "many", "me", "please", "show", "tell", "give", "list", "find", "get", "i", "we", "our", "can", "you", "could",
+    "would", "there", "s", "whats", "what's", "product", "products", "item", "items", "data", "figure", "figures",
+}
+# Different words for the same thing share one token; each group's word is still part of the answer's meaning
+_SYNONYMS = {
+    "sold": "sale", "sell": "sale", "sells": "sale", "selling": "sale", "sales": "sale", "revenue": "sale",
+    "revenues": "sale", "turnover": "sale", "value": "sale", "make": "sale", "made": "sale", "earn": "sale",
+    "earned": "sale", "generate": "sale", "generated": "sale",
+    "most": "top", "highest": "top", "best": "top", "biggest": "top", "largest": "top", "greatest": "top", "top": "top",
+    "lowest": "bottom", "least": "bottom", "worst": "bottom", "smallest": "bottom", "fewest": "bottom",
+    "average": "avg", "mean": "avg", "avg": "avg", "total": "sum", "overall": "sum", "sum": "sum",
+    "monthly": "month", "months": "month", "yearly": "year", "annual": "year", "annually": "year", "years": "year",
+    "weekly": "week", "weeks": "week", "quarterly": "quarter", "quarters": "quarter",
+    "regions": "region", "geography": "region", "geographies": "region", "regional": "region",
+    "promotion": "promo", "promotions": "promo", "promos": "promo", "promotional": "promo",
+}
+# Canonical words whose absence does not change the answer ("sales in 2023" is the total)
+_SOFT_TOKENS = {"sale", "sum"}
+# Words whose order relative to the numbers changes the answer ("2022 compared to 2023")
+_ORDERED_TOKENS = {"from", "to", "and", "than", "vs", "versus", "compared", "between", "since", "until", "before", "after"}
+# Questions about the calendar, actions or "now" must always reach the agent
+_UNCACHEABLE = {
+    "schedule", "create", "book", "add", "delete", "cancel", "remove", "update", "move", "calendar", "event",
+    "events", "meeting", "meetings", "remind", "reminder", "today", "tomorrow", "yesterday", "now", "upcoming",
+}
+# Follow-up questions depend on the conversation, not just on their words
+_FOLLOW_UP = {"it", "its", "that", "those", "these", "them", "they", "same", "also", "else", "again", "instead",
+              "previous", "above", "about"}
+
+
+# --- Embedding ---
+
+def tokenize(question: str) -> list:
+    """Lower-cased words of `question` with synonyms mapped to one token and stopwords dropped."""
+    words = _WORD.findall(question.lower())
+    return [_SYNONYMS.get(word, word) for word in words if word not in _STOPWORDS]
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode()) % DIMENSIONS
+
+
+def embed(tokens: list) -> dict:
+    """
+    Embeds question tokens as an L2-normalized sparse vector of hashed n-grams.
+
+    Words and word pairs carry the meaning; character trigrams make typos and
+    inflections ("promo" / "promos") land close together.
+    """
+    vector = {}
+    features = [(f"w:{token}", 1.0) for token in tokens]
+    features += [(f"b:{first} {second}", 0.5) for first, second in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"#{token}#"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        features += [(f"c:{trigram}", 0.5 / len(trigrams)) for trigram in trigrams]
+    for feature, weight in features:
+        bucket = _bucket(feature)
+        vector[bucket] = vector.get(bucket, 0.0) + weight
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+# --- Cache ---
+
+class _Entry:
+    __slots__ = ("question", "answer", "vector", "anchors", "postings", "expires_at", "version", "size")
+
+    def __init__(self, question, answer, vector, anchors, postings, expires_at, version):
+        self.question = question
+        self.answer = answer
+        self.vector = vector
+        self.anchors = anchors
+        self.postings = postings
+        self.expires_at = expires_at
+        self.version = version
+        # Rough footprint: both strings plus ~100 bytes per vector item and posting
+        self.size = len(question) + len(answer) + 100 * (len(vector) + len(postings))
+
+
+class SemanticCache:
+    """
+    Answers to recent questions, found again when the same question is asked in other words.
+
+    Questions are embedded as hashed n-gram vectors (see `embed`). Candidates
+    come from an inverted index of their words, so a lookup only scores the
+    entries sharing a word with the question, and the best one is returned
+    when its cosine similarity reaches `threshold`. A candidate must also have
+    exactly the same anchors: numbers, names and every other word that is not
+    a stopword or a generic synonym ("sales", "total"), with the numbers and
+    range words in the same order, so "Smartwatch sales in 2023" never
+    answers "Smartwatch sales in 2022", "Coffee Maker sales in 2023" or
+    "Smartwatch sales in 2021 and 2023", however similar the vectors are.
+
+    Entries expire after `ttl` seconds, and all of them are dropped when
+    `version_source()` (the data version of the tables, checked at most every
+    `version_check_interval` seconds) changes. Memory is bounded by
+    `max_entries` and `max_bytes`, evicting the least recently used entries.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, version_source=None,
+                 version_check_interval: float = VERSION_CHECK_INTERVAL_SECONDS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict() # id -> _Entry, in LRU order
+        self._index = {}              # word bucket -> set of entry ids
+        self._next_id = 0
+        self._bytes = 0
+        self._version = None
+        self._version_checked_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, version_source=None):
+        return cls(
+            threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD") or SIMILARITY_THRESHOLD),
+            ttl=float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS") or DEFAULT_TTL_SECONDS),
+            max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES") or MAX_ENTRIES),
+            max_bytes=int(os.environ.get("SEMANTIC_CACHE_MAX_BYTES") or MAX_BYTES),
+            version_source=version_source,
+        )
+
+    @staticmethod
+    def cacheable(tokens: list) -> bool:
+        """Short, follow-up and calendar questions are never cached."""
+        return len(tokens) >= MIN_QUESTION_WORDS and not any(token in _UNCACHEABLE or token in _FOLLOW_UP for token in tokens)
+
+    @staticmethod
+    def _anchors(tokens: list) -> tuple:
+        # Numbers and range words also in order: "2022 compared to 2023" is not "2023 compared to 2022"
+        ordered = tuple(token for token in tokens if token.isdigit() or token in _ORDERED_TOKENS)
+        return frozenset(token for token in tokens if token not in _SOFT_TOKENS), ordered
+
+    def _read_version(self, now: float):
+        """Reads the data version when a check is due, else returns _UNCHECKED. Called without the lock."""
+        if self.version_source is None:
+            return _UNCHECKED
+        with self._lock:
+            if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+                return _UNCHECKED
+            self._version_checked_at = now
+        # The source may query the warehouse; other lookups must not wait for it
+        try:
+            return self.version_source()
+        except Exception as e:
+            print(f"Could not read the data version: {e}")
+            return _UNCHECKED
+
+    def _apply_version(self, version):
+        """Drops every entry when `version` differs from the one they were cached at. Called with the lock held."""
+        if version is not _UNCHECKED and version != self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size
+        for bucket in entry.postings:
+            ids = self._index.get(bucket)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[bucket]
+
+    def _nearest(self, tokens: list, vector: dict, now: float, threshold: float):
+        """Returns the id of the most similar live entry with the same anchors, if it reaches `threshold`."""
+        anchors = self._anchors(tokens)
+        candidates = set()
+        for token in set(tokens):
+            candidates.update(self._index.get(_bucket(f"w:{token}"), ()))
+        best, best_score = None, threshold
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if now >= entry.expires_at:
+                self._remove(entry_id)
+                self.expirations += 1
+                continue
+            if entry.anchors != anchors:
+                continue
+            score = _cosine(vector, entry.vector)
+            if score >= best_score:
+                best, best_score = entry_id, score
+        return best
+
+    def get(self, question: str):
+        """Returns the cached answer to `question` or a question like it, or None on a miss."""
+        tokens = tokenize(question)
+        if not self.cacheable(tokens):
+            with self._lock:
+                self.skipped += 1
+            return None
+        now = time.monotonic()
+        version = self._read_version(now)
+        with self._lock:
+            self._apply_version(version)
+            best = self._nearest(tokens, embed(tokens), now, self.threshold)
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best].answer
+
+    def put(self, question: str, answer: str):
+        """Stores the agent's answer to `question`, unless the question is not cacheable."""
+        tokens = tokenize(question)
+        if not answer or not self.cacheable(tokens):
+            return
+        postings = {_bucket(f"w:{token}") for token in tokens}
+        now = time.monotonic()
+        version = self._read_version(now)
+        with self._lock:
+            self._apply_version(version)
+            entry = _Entry(question, answer, embed(tokens), self._anchors(tokens), postings, now + self.ttl, self._version)
+            if entry.size > self.max_bytes:
+                return
+            # A fresh answer to the same question replaces the old one
+            duplicate = self._nearest(tokens, entry.vector, now, 0.999)
+            if duplicate is not None:
+                self._remove(duplicate)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._bytes += entry.size
+            for bucket in postings:
+                self._index.setdefault(bucket, set()).add(entry_id)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
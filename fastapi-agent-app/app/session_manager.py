@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionManager:
+    """
+    Keeps one remote agent session per caller.
+
+    Sessions are created lazily on a caller's first question and kept in a
+    bounded LRU (`max_sessions`). Sessions idle for more than `idle_ttl` seconds
+    are dropped, and a session is replaced by a fresh one after `max_turns`
+    questions, so the history sent to the model (and the prompt size) stays
+    bounded. Dropped sessions are deleted on the engine on a best-effort basis.
+    """
+
+    def __init__(self, create_session, delete_session=None, max_sessions: int = 1000,
+                 idle_ttl: float = 30 * 60, max_turns: int = 20):
+        self._create_session = create_session
+        self._delete_session = delete_session
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self._sessions = OrderedDict() # user_id -> [session_id, turns, last_used]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.rotated = 0
+
+    @classmethod
+    def from_env(cls, create_session, delete_session=None):
+        return cls(
+            create_session,
+            delete_session,
+            max_sessions=int(os.environ.get("SESSION_MAX_LIVE") or 1000),
+            idle_ttl=float(os.environ.get("SESSION_IDLE_SECONDS") or 30 * 60),
+            max_turns=int(os.environ.get("SESSION_MAX_TURNS") or 20),
+        )
+
+    def _drop(self, user_id: str, session_id: str):
+        if self._delete_session is None:
+            return
+        try:
+            self._delete_session(user_id, session_id)
+        except Exception as e:
+            logging.warning(f"Could not delete session {session_id} of {user_id}: {e}")
+
+    def _expire_idle(self, now: float) -> list:
+        stale = []
+        # The LRU order means idle sessions are at the front
+        while self._sessions:
+            user_id, (session_id, _, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._sessions[user_id]
+            self.expired += 1
+            stale.append((user_id, session_id))
+        return stale
+
+    def session_for(self, user_id: str) -> str:
+        """Returns the live session of `user_id`, creating (or rotating) it when needed."""
+        now = time.monotonic()
+        with self._lock:
+            stale = self._expire_idle(now)
+            entry = self._sessions.get(user_id)
+            if entry is not None and entry[1] >= self.max_turns:
+                del self._sessions[user_id]
+                self.rotated += 1
+                stale.append((user_id, entry[0]))
+                entry = None
+            if entry is not None:
+                entry[2] = now
+                self._sessions.move_to_end(user_id)
+                session_id = entry[0]
+        for stale_user_id, stale_session_id in stale:
+            self._drop(stale_user_id, stale_session_id)
+        if entry is not None:
+            return session_id
+
+        # Create the session outside the lock, it is a remote call
+        session_id = self._create_session(user_id)
+        evicted = []
+        with self._lock:
+            existing = self._sessions.get(user_id)
+            if existing is not None:
+                # A concurrent request for the same user won the race, use its session
+                evicted.append((user_id, session_id))
+                session_id = existing[0]
+            else:
+                self._sessions[user_id] = [session_id, 0, now]
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    evicted_user_id, (evicted_session_id, _, _) = self._sessions.popitem(last=False)
+                    evicted.append((evicted_user_id, evicted_session_id))
+                    self.evicted += 1
+        for evicted_user_id, evicted_session_id in evicted:
+            self._drop(evicted_user_id, evicted_session_id)
+        return session_id
+
+    def record_turn(self, user_id: str):
+        """Counts one question asked in the current session of `user_id`."""
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is not None:
+                entry[1] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "live": len(self._sessions),
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "rotated": self.rotated,
+            }
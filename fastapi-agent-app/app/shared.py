@@ -0,0 +1,13 @@
+import os
+import sys
+
+# The agents' telemetry and single-flight modules (agents/common) are shared, not copied, so the two cannot drift
+_AGENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "agents")
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+from common.singleflight import SingleFlight
+from common.telemetry import telemetry
+
+# Spans exported from this process are the HTTP layer's and the remote agent calls'
+telemetry.service = "fastapi-agent-app"
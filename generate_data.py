@@ -1,13 +1,36 @@
-import pandas as pd
+"""
+Generates the synthetic sales tables the agents query.
+
+Every table is built as one trend x seasonality x noise matrix (periods x
+geographies x products) with NumPy, instead of row by row, so the same script
+produces the 360-row demo table and multi-million-row load-test datasets.
+
+Examples:
+    python generate_data.py                               # monthly_retail_sales_data.csv, 10 products x 36 months
+    python generate_data.py --table promo                 # weekly_sales_data.csv
+    python generate_data.py --products 5000 --freq daily --format parquet --output sales.parquet
+    python generate_data.py --table promo --products 200 --geographies 40 --seed 7
+"""
+import argparse
+import os
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import random
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Only needed for --format parquet
+    pa = pq = None
 
 # --- Configuration ---
 NUM_PRODUCTS = 10
 START_DATE = datetime(2021, 1, 1)
 END_DATE = datetime(2023, 12, 1) # Including December 2023
 OUTPUT_FILENAME = 'monthly_retail_sales_data.csv'
+PROMO_OUTPUT_FILENAME = 'weekly_sales_data.csv'
+ROWS_PER_CHUNK = 1_000_000
 
 # Define product characteristics for more varied data
 product_configs = [
@@ -23,56 +46,254 @@ product_configs = [
     {"name": "Weighted Blanket", "base_sales": 2500, "sales_std_dev": 400, "growth_rate_per_month": -0.01, "seasonality": {1:1.8, 2:1.5, 3:1.0, 4:0.8, 5:0.7, 6:0.6, 7:0.6, 8:0.7, 9:0.8, 10:1.0, 11:1.3, 12:2.0}}, # Strong winter seasonality, declining overall
 ]
 
-all_sales_data = []
+# --- Promo Table Configuration ---
+PROMO_START_DATE = datetime(2021, 1, 5)
+PROMO_END_DATE = datetime(2023, 12, 26)
+
+promo_product_configs = [
+    {"name": "FACE CREAM", "base_sales": 40000, "sales_std_dev": 5000, "growth_rate_per_month": 0.004, "seasonality": {1:1.2, 2:1.15, 3:1.0, 4:0.95, 5:0.9, 6:0.85, 7:0.85, 8:0.9, 9:1.0, 10:1.05, 11:1.15, 12:1.3}}, # Winter skin care
+    {"name": "MOISTURISER", "base_sales": 30000, "sales_std_dev": 4000, "growth_rate_per_month": 0.002, "seasonality": {1:1.1, 2:1.05, 3:1.0, 4:1.0, 5:1.05, 6:1.1, 7:1.1, 8:1.05, 9:0.95, 10:0.95, 11:1.0, 12:1.15}}, # Summer and gifting peaks
+]
+
+GEOGRAPHIES = [
+    "NORTH EAST", "NORTH WEST", "YORKSHIRE", "EAST MIDLANDS", "WEST MIDLANDS", "EAST OF ENGLAND",
+    "LONDON", "SOUTH EAST", "SOUTH WEST", "WALES", "SCOTLAND", "NORTHERN IRELAND",
+]
+
+# Share of weeks a product runs each promotion, and the sales uplift it gives
+PROMOTIONS = {
+    "is_tpr": {"probability": 0.20, "uplift": 1.35},     # Temporary Price Reduction
+    "is_feature": {"probability": 0.10, "uplift": 1.20}, # Magazine feature
+    "is_display": {"probability": 0.15, "uplift": 1.15}, # In-store display
+}
+
+FREQUENCIES = {"monthly": "MS", "weekly": "7D", "daily": "D"}
+
+
+# --- Products and Periods ---
+
+def id_width(num_products: int) -> int:
+    """Digits of the ProductIds of a new catalogue of `num_products` products (P01, P02, ... up to 99)."""
+    return max(2, len(str(num_products)))
+
+
+def make_products(configs: list, num_products: int, rng, width: int = None) -> dict:
+    """
+    Returns the product parameters as arrays, one entry per product.
+
+    The first products are the hand-written `configs`; any further ones are
+    perturbed copies of them ('Basic T-Shirt 2', ...) so large catalogues keep
+    realistic trends and seasonal shapes. ProductIds are zero-padded to
+    `width` digits (default: `id_width(num_products)`); a catalogue that grows
+    must keep its first width, or every existing product gets a new id.
+    """
+    template = np.arange(num_products) % len(configs)
+    base = np.array([configs[t]["base_sales"] for t in template], dtype=float)
+    std = np.array([configs[t]["sales_std_dev"] for t in template], dtype=float)
+    growth = np.array([configs[t]["growth_rate_per_month"] for t in template], dtype=float)
+    seasonality = np.array([[configs[t]["seasonality"].get(m, 1.0) for m in range(1, 13)] for t in template])
+    names = [configs[t]["name"] for t in template]
+
+    extra = np.arange(num_products) >= len(configs)
+    if extra.any():
+        count = int(extra.sum())
+        scale = rng.lognormal(0.0, 0.5, count)
+        base[extra] *= scale
+        std[extra] *= scale
+        growth[extra] += rng.normal(0.0, 0.003, count)
+        seasonality[extra] *= rng.normal(1.0, 0.05, (count, 12))
+        names = [name if i < len(configs) else f"{name} {i // len(configs) + 1}" for i, name in enumerate(names)]
+
+    width = width or id_width(num_products)
+    return {
+        "id": np.array([f"P{i + 1:0{width}d}" for i in range(num_products)]), # P01, P02, etc.
+        "name": np.array(names),
+        "base_sales": base,
+        "sales_std_dev": std,
+        "growth_rate_per_month": growth,
+        "seasonality": seasonality,
+    }
+
+
+def period_dates(start: datetime, end: datetime, freq: str) -> pd.DatetimeIndex:
+    """First day of every period between `start` and `end` (inclusive)."""
+    return pd.date_range(start, end, freq=FREQUENCIES[freq])
+
+
+def months_since(dates: pd.DatetimeIndex, origin: datetime) -> np.ndarray:
+    """Months elapsed from `origin` to each date, with the day as a fraction of its month."""
+    whole = (dates.year - origin.year) * 12 + (dates.month - origin.month)
+    return np.asarray(whole + (dates.day - 1) / dates.days_in_month, dtype=float)
+
+
+def period_share(dates: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    """Fraction of a month's sales that falls into each period."""
+    if freq == "monthly":
+        return np.ones(len(dates))
+    days = 7 if freq == "weekly" else 1
+    return days / np.asarray(dates.days_in_month, dtype=float)
+
+
+def sales_matrix(products: dict, dates: pd.DatetimeIndex, origin: datetime, freq: str, noise_rng,
+                 geography_scale=None) -> np.ndarray:
+    """
+    Sales of every product in every period, shape (periods, geographies, products).
+
+    `geography_scale` (one factor per geography) splits each product's sales
+    across geographies; without it there is a single geography axis of size 1.
+    """
+    if geography_scale is None:
+        geography_scale = np.ones(1)
+    # Apply overall growth/decline trend
+    trend = 1 + products["growth_rate_per_month"][None, :] * months_since(dates, origin)[:, None]
+    # Apply seasonality based on month
+    seasonal = products["seasonality"][:, dates.month - 1].T
+    expected = products["base_sales"][None, :] * trend * seasonal * period_share(dates, freq)[:, None]
+    expected = expected[:, None, :] * geography_scale[None, :, None]
+
+    # Add some random noise, never letting sales drop below 80% of the expected value
+    relative_std = products["sales_std_dev"] / products["base_sales"]
+    noise = 1 + noise_rng.standard_normal(expected.shape) * relative_std[None, None, :]
+    return np.maximum(0, expected * np.maximum(0.8, noise))
+
+
+def geography_names(num_geographies: int) -> np.ndarray:
+    extra = [f"REGION {i + 1:03d}" for i in range(len(GEOGRAPHIES), num_geographies)]
+    return np.array((GEOGRAPHIES + extra)[:num_geographies])
+
+
+# --- Tables ---
+
+def monthly_sales_frame(products: dict, dates: pd.DatetimeIndex, origin: datetime, freq: str, noise_rng) -> pd.DataFrame:
+    """Rows of the `artificial_sales` table (Date, ProductId, ProductName, SalesRevenue) for `dates`."""
+    sales = sales_matrix(products, dates, origin, freq, noise_rng)[:, 0, :]
+    num_products = len(products["id"])
+    return pd.DataFrame({
+        "Date": np.repeat(dates.strftime("%Y-%m-%d").to_numpy(), num_products), # YYYY-MM-DD format
+        "ProductId": np.tile(products["id"], len(dates)),
+        "ProductName": np.tile(products["name"], len(dates)),
+        "SalesRevenue": np.rint(sales).astype(np.int64).ravel(),
+    })
+
+
+def promo_sales_frame(products: dict, geographies: np.ndarray, geography_scale: np.ndarray, dates: pd.DatetimeIndex,
+                      origin: datetime, freq: str, noise_rng, promo_rngs: dict) -> pd.DataFrame:
+    """Rows of the `weekly_sales_data` table, with the promotion flags and their sales uplift, for `dates`."""
+    sales = sales_matrix(products, dates, origin, freq, noise_rng, geography_scale)
+    flags = {}
+    for column, promotion in PROMOTIONS.items():
+        flags[column] = promo_rngs[column].random(sales.shape) < promotion["probability"]
+        sales = np.where(flags[column], sales * promotion["uplift"], sales)
+
+    num_products, num_geographies = len(products["id"]), len(geographies)
+    return pd.DataFrame({
+        "date": np.repeat(dates.strftime("%Y-%m-%d").to_numpy(), num_geographies * num_products),
+        "retailer_banner_geography": np.tile(np.repeat(geographies, num_products), len(dates)),
+        "promoted_group": np.tile(products["name"], len(dates) * num_geographies),
+        "daily_weekly_value_sales": np.round(sales, 2).ravel(),
+        **{column: flag.astype(np.int8).ravel() for column, flag in flags.items()},
+    })
+
+
+def generate_frames(table: str, num_products: int, num_geographies: int, start: datetime, end: datetime,
+                    freq: str, seed=None, rows_per_chunk: int = ROWS_PER_CHUNK, origin: datetime = None,
+                    id_width: int = None):
+    """
+    Yields the rows of `table` ('sales' or 'promo') as DataFrames of about `rows_per_chunk` rows, in date order.
+
+    Each random stream (product catalogue, noise, each promotion) has its own
+    generator seeded from `seed`, so a given seed produces the same data
+    whatever the chunk size.
 
-current_date = START_DATE
-month_index = 0 # To track overall month progression for growth rate
+    `origin` is the table's first period (default: `start`). Trends grow from
+    it, so a later `start` continues an existing table: the catalogue is the
+    same for the same seed, and the noise and promotion streams are seeded
+    from `start` as well, so every appended batch is new but reproducible.
+    `id_width` is the ProductId width of the table being continued.
+    """
+    origin = origin or start
+    sequence = np.random.SeedSequence(seed)
+    streams = sequence.spawn(2 + len(PROMOTIONS))
+    if start != origin:
+        offset = (start - origin).days
+        streams[1:] = [np.random.SeedSequence(sequence.entropy, spawn_key=(i, offset)) for i in range(1, len(streams))]
+    catalogue_rng, noise_rng, *flag_rngs = (np.random.default_rng(s) for s in streams)
+    promo_rngs = dict(zip(PROMOTIONS, flag_rngs))
 
-while current_date <= END_DATE:
-    for i, config in enumerate(product_configs):
-        product_id = f"P{i+1:02d}" # P01, P02, etc.
-        product_name = config["name"]
+    configs = product_configs if table == "sales" else promo_product_configs
+    products = make_products(configs, num_products, catalogue_rng, id_width)
+    if table == "promo":
+        geographies = geography_names(num_geographies)
+        geography_scale = catalogue_rng.uniform(0.5, 1.5, num_geographies)
+    else:
+        num_geographies = 1
 
-        # Calculate base sales for the current month
-        base_sales = config["base_sales"]
+    dates = period_dates(start, end, freq)
+    periods_per_chunk = max(1, rows_per_chunk // (num_products * num_geographies))
+    for first in range(0, len(dates), periods_per_chunk):
+        chunk = dates[first:first + periods_per_chunk]
+        if table == "sales":
+            yield monthly_sales_frame(products, chunk, origin, freq, noise_rng)
+        else:
+            yield promo_sales_frame(products, geographies, geography_scale, chunk, origin, freq, noise_rng, promo_rngs)
 
-        # Apply overall growth/decline trend
-        trend_factor = 1 + (config["growth_rate_per_month"] * month_index)
-        trend_sales = base_sales * trend_factor
 
-        # Apply seasonality based on month
-        month = current_date.month
-        seasonality_factor = config["seasonality"].get(month, 1.0) # Default to 1.0 if month not specified
-        seasonal_sales = trend_sales * seasonality_factor
+def write_frames(frames, path: str, file_format: str):
+    """Writes the DataFrames from `frames` to one CSV or Parquet file, a chunk at a time. Returns (rows, first, last)."""
+    rows, first, last, writer = 0, None, None, None
+    try:
+        for frame in frames:
+            if file_format == "parquet":
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                frame.to_csv(path, index=False, mode="w" if first is None else "a", header=first is None)
+            rows += len(frame)
+            if first is None:
+                first = frame
+            last = frame
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows, first, last
 
-        # Add some random noise
-        random_noise = random.normalvariate(1, config["sales_std_dev"] / base_sales) # ~10-20% std dev
-        daily_sales = seasonal_sales * max(0.8, random_noise) # Ensure sales don't go too low
 
-        # Ensure sales are non-negative
-        daily_sales = max(0, round(daily_sales))
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", choices=["sales", "promo"], default="sales",
+                        help="'sales' for the monthly retail table, 'promo' for the weekly promotion table.")
+    parser.add_argument("--products", type=int, help=f"Number of products (default: {NUM_PRODUCTS} for sales, 2 for promo).")
+    parser.add_argument("--geographies", type=int, default=len(GEOGRAPHIES), help="Number of geographies (promo table only).")
+    parser.add_argument("--freq", choices=list(FREQUENCIES), help="Period length (default: monthly for sales, weekly for promo).")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="First period, YYYY-MM-DD.")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Last period, YYYY-MM-DD (inclusive).")
+    parser.add_argument("--seed", type=int, help="Random seed, for reproducible data.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--rows-per-chunk", type=int, default=ROWS_PER_CHUNK, help="Rows generated and written at a time.")
+    parser.add_argument("--output", help="Output file (default: the file the local backend loads for the table).")
+    args = parser.parse_args()
+    if args.format == "parquet" and pa is None:
+        parser.error("--format parquet requires pyarrow (pip install pyarrow)")
 
-        all_sales_data.append({
-            "Date": current_date.strftime("%Y-%m-%d"), # YYYY-MM-DD format
-            "ProductId": product_id,
-            "ProductName": product_name,
-            "SalesRevenue": daily_sales
-        })
-    current_date += relativedelta(months=1)
-    month_index += 1
+    sales = args.table == "sales"
+    num_products = args.products or (NUM_PRODUCTS if sales else len(promo_product_configs))
+    freq = args.freq or ("monthly" if sales else "weekly")
+    start = args.start or (START_DATE if sales else PROMO_START_DATE)
+    end = args.end or (END_DATE if sales else PROMO_END_DATE)
+    output = args.output or os.path.splitext(OUTPUT_FILENAME if sales else PROMO_OUTPUT_FILENAME)[0] + "." + args.format
 
-# Create a Pandas DataFrame
-df = pd.DataFrame(all_sales_data)
+    frames = generate_frames(args.table, num_products, args.geographies, start, end, freq, args.seed, args.rows_per_chunk)
+    rows, first, last = write_frames(frames, output, args.format)
 
-# Sort by Date and ProductId for better readability
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.sort_values(by=['Date', 'ProductId']).reset_index(drop=True)
+    print(f"Generated {rows} rows of data and saved to {output}")
+    if rows:
+        print("\nFirst 5 rows:")
+        print(first.head())
+        print(f"\nLast 5 rows:")
+        print(last.tail())
 
-# Save to CSV
-df.to_csv(OUTPUT_FILENAME, index=False)
 
-print(f"Generated {len(df)} rows of data and saved to {OUTPUT_FILENAME}")
-print("\nFirst 5 rows:")
-print(df.head())
-print(f"\nLast 5 rows:")
-print(df.tail())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Incrementally loads the sales tables into a month-partitioned Parquet store.
+
+Instead of regenerating and rewriting the whole history, each run appends only
+the periods after the last one loaded for every product:
+
+    <store>/<table>/month=YYYY-MM/part-<version>.parquet
+    <store>/<table>/_version.json
+
+The first run loads the full default history (as generate_data.py does).
+Later runs generate the next --periods periods (or up to --end) with the same
+catalogue and trends, or ingest new rows from --input, skipping rows that are
+already loaded. Existing files are never rewritten: new rows go to new part
+files, and a period can be spread over several parts.
+
+`_version.json` is replaced last, atomically. Its `version` is bumped on
+every load that adds rows, and lists the part files in load order, so readers
+(the local query backend, and through it the result cache and rollups) can
+load just the new files when it changes. It also keeps the ProductId width
+of the first load, so growing the catalogue (say past 99 products) adds
+P100 instead of renaming P01 to P001 and loading its history again.
+
+Examples:
+    python load_data.py                                # initial load, or the next month
+    python load_data.py --periods 3                    # the next three months
+    python load_data.py --table promo --end 2024-06-25
+    python load_data.py --input new_sales.csv          # ingest exported rows
+"""
+import argparse
+import json
+import os
+import secrets
+from datetime import datetime
+
+import pandas as pd
+
+import generate_data
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+VERSION_MARKER = "_version.json" # Also read by LocalBackend (agents/common/backends.py)
+
+# Store directory (the local backend's table name), date and product key column of each table
+STORE_TABLES = {
+    "sales": {"directory": "artificial_sales", "date": "Date", "key": "ProductId", "freq": "monthly",
+              "origin": generate_data.START_DATE, "end": generate_data.END_DATE,
+              "products": generate_data.NUM_PRODUCTS},
+    "promo": {"directory": "weekly_sales_data", "date": "date", "key": "promoted_group", "freq": "weekly",
+              "origin": generate_data.PROMO_START_DATE, "end": generate_data.PROMO_END_DATE,
+              "products": len(generate_data.promo_product_configs)},
+}
+
+
+# --- Version Marker ---
+
+def read_marker(table_dir: str):
+    """Returns the store's version marker, or None for an empty store."""
+    try:
+        with open(os.path.join(table_dir, VERSION_MARKER)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_marker(table_dir: str, marker: dict):
+    """Replaces the marker atomically, so readers see either the old or the new version, never a partial one."""
+    path = os.path.join(table_dir, VERSION_MARKER)
+    with open(path + ".tmp", "w") as f:
+        json.dump(marker, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+# --- New Rows ---
+
+def next_period(date: datetime, freq: str) -> datetime:
+    return (pd.Timestamp(date) + pd.tseries.frequencies.to_offset(generate_data.FREQUENCIES[freq])).to_pydatetime()
+
+
+def generated_rows(table: str, marker: dict, end: datetime):
+    """
+    Yields the generated rows of every product after its last loaded period, up to `end`.
+
+    Products are grouped by their last loaded period, so each group is
+    generated from its own next period only; products new to the store start
+    at the table's origin.
+    """
+    spec = STORE_TABLES[table]
+    origin = datetime.fromisoformat(marker["origin"])
+    starts = {}
+    for key in _product_keys(table, marker["products"], marker["id_width"]):
+        last = marker["last_loaded"].get(key)
+        start = next_period(datetime.fromisoformat(last), marker["freq"]) if last else origin
+        if start <= end:
+            starts.setdefault(start, []).append(key)
+    for start, keys in sorted(starts.items()):
+        frames = generate_data.generate_frames(table, marker["products"], marker["geographies"], start, end,
+                                               marker["freq"], marker["seed"], origin=origin,
+                                               id_width=marker["id_width"])
+        for frame in frames:
+            if len(keys) < marker["products"]:
+                frame = frame[frame[spec["key"]].isin(keys)]
+            yield frame
+
+
+def _product_keys(table: str, num_products: int, width: int) -> list:
+    """The key of every product generate_data.py builds for `table`, in catalogue order."""
+    if table == "sales":
+        return [f"P{i + 1:0{width}d}" for i in range(num_products)]
+    configs = generate_data.promo_product_configs
+    return [configs[i % len(configs)]["name"] + (f" {i // len(configs) + 1}" if i >= len(configs) else "")
+            for i in range(num_products)]
+
+
+def ingested_rows(table: str, marker: dict, path: str) -> pd.DataFrame:
+    """Reads exported rows from a CSV or Parquet file, without the rows at or before their product's last loaded period."""
+    spec = STORE_TABLES[table]
+    frame = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    dates = pd.to_datetime(frame[spec["date"]])
+    last = pd.to_datetime(frame[spec["key"]].astype(str).map(marker["last_loaded"]))
+    return frame[last.isna() | (dates > last)]
+
+
+# --- Store ---
+
+def append_partitions(table_dir: str, table: str, frame: pd.DataFrame, version: int) -> list:
+    """Writes `frame` as one new part file per month it covers; returns the files written, relative to `table_dir`."""
+    spec = STORE_TABLES[table]
+    frame = frame.assign(**{spec["date"]: pd.to_datetime(frame[spec["date"]]).dt.date})
+    months = pd.to_datetime(frame[spec["date"]]).dt.strftime("%Y-%m")
+    written = []
+    for month, rows in frame.groupby(months, sort=True):
+        relative = os.path.join(f"month={month}", f"part-{version:06d}.parquet")
+        os.makedirs(os.path.join(table_dir, f"month={month}"), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), os.path.join(table_dir, relative))
+        written.append(relative)
+    return written
+
+
+def load(store: str, table: str, end: datetime = None, periods: int = 1, input_path: str = None,
+         products: int = None, geographies: int = None, seed: int = None) -> dict:
+    """
+    Appends the new rows of `table` to the store under `store` and returns the new version marker.
+
+    Without `input_path`, rows are generated: the full history up to the
+    table's default end on the first load, then `periods` more periods per
+    product (or up to `end`). `products` adds products to the catalogue; they
+    are loaded from the table's origin.
+    """
+    spec = STORE_TABLES[table]
+    table_dir = os.path.join(store, spec["directory"])
+    os.makedirs(table_dir, exist_ok=True)
+    marker = read_marker(table_dir) or {
+        "version": 0, "table": table, "freq": spec["freq"], "origin": spec["origin"].date().isoformat(),
+        "seed": seed if seed is not None else secrets.randbits(32), "products": products or spec["products"],
+        "geographies": geographies or len(generate_data.GEOGRAPHIES), "rows": 0, "last_loaded": {}, "files": [],
+    }
+    if "id_width" not in marker:
+        # Stores loaded before the width was recorded: it is that of their shortest ProductId
+        keys = list(marker["last_loaded"]) if table == "sales" else []
+        marker["id_width"] = min(len(key) - 1 for key in keys) if keys else generate_data.id_width(marker["products"])
+    marker["products"] = max(marker["products"], products or 0)
+
+    if input_path is not None:
+        frames = [ingested_rows(table, marker, input_path)]
+    else:
+        if end is None:
+            if marker["last_loaded"]:
+                end = max(datetime.fromisoformat(date) for date in marker["last_loaded"].values())
+                for _ in range(periods):
+                    end = next_period(end, marker["freq"])
+            else:
+                end = spec["end"]
+        frames = generated_rows(table, marker, end)
+
+    version = marker["version"] + 1
+    new_rows = [frame for frame in frames if len(frame)]
+    if not new_rows:
+        return marker
+    frame = pd.concat(new_rows, ignore_index=True)
+    marker["files"] += append_partitions(table_dir, table, frame, version)
+
+    latest = pd.to_datetime(frame[spec["date"]]).groupby(frame[spec["key"]].astype(str)).max()
+    for key, date in zip(latest.index, latest.dt.strftime("%Y-%m-%d")):
+        marker["last_loaded"][key] = max(date, marker["last_loaded"].get(key, date))
+    marker["version"] = version
+    marker["rows"] += len(frame)
+    marker["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    write_marker(table_dir, marker)
+    return marker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", choices=list(STORE_TABLES), default="sales")
+    parser.add_argument("--store", default=os.environ.get("LOCAL_DATA_DIR", "."),
+                        help="Directory holding the table stores (default: LOCAL_DATA_DIR or the current directory).")
+    parser.add_argument("--periods", type=int, default=1, help="Periods to append after the last one loaded.")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Append every period up to this date instead.")
+    parser.add_argument("--input", help="CSV or Parquet file of new rows to ingest instead of generating them.")
+    parser.add_argument("--products", type=int, help="Grow the catalogue to this many products.")
+    parser.add_argument("--geographies", type=int, help="Number of geographies (promo table, first load only).")
+    parser.add_argument("--seed", type=int, help="Random seed (first load only; later loads reuse it).")
+    args = parser.parse_args()
+    if pa is None:
+        parser.error("load_data.py requires pyarrow (pip install pyarrow)")
+
+    before = read_marker(os.path.join(args.store, STORE_TABLES[args.table]["directory"]))
+    marker = load(args.store, args.table, args.end, args.periods, args.input, args.products, args.geographies, args.seed)
+    added = marker["rows"] - (before["rows"] if before else 0)
+    if not added:
+        print(f"No new rows for {args.table}; still at version {marker['version']}.")
+        return
+    print(f"Appended {added} rows to {args.table}: version {marker['version']}, {marker['rows']} rows, "
+          f"last period {max(marker['last_loaded'].values())}.")
+
+
+if __name__ == "__main__":
+    main()
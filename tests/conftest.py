@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The agents' `common` package, the app's modules and the data scripts, as the benchmarks import them
+sys.path.append(os.path.join(ROOT, "agents"))
+sys.path.append(os.path.join(ROOT, "fastapi-agent-app", "app"))
+sys.path.append(ROOT)
+
+
+@pytest.fixture
+def sales_store(tmp_path):
+    """A load_data.py store of the monthly sales table (8 products, 2021-2023), served by a LocalBackend."""
+    import generate_data
+    import load_data
+    from common.backends import LocalBackend
+
+    load_data.load(str(tmp_path), "sales", end=generate_data.END_DATE, products=8, seed=3)
+    return str(tmp_path), LocalBackend(data_dir=str(tmp_path))
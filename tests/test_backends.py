@@ -0,0 +1,22 @@
+import pytest
+
+from common.schema import MONTHLY_SALES
+
+
+@pytest.mark.parametrize("sql_query, headers", [
+    (f"SELECT MAX(Date), COUNT(*) FROM `{MONTHLY_SALES.name}`", ["f0_", "f1_"]),
+    (f"SELECT ProductName, SUM(SalesRevenue), SUM(SalesRevenue) AS total, MIN(Date) FROM `{MONTHLY_SALES.name}` "
+     f"GROUP BY ProductName", ["ProductName", "f0_", "total", "f1_"]),
+    (f"SELECT s.ProductName, COUNT(*) FROM `{MONTHLY_SALES.name}` AS s GROUP BY s.ProductName", ["ProductName", "f0_"]),
+    # Not parsed: the names DuckDB gives expressions are recognised
+    (f"WITH s AS (SELECT * FROM `{MONTHLY_SALES.name}`) SELECT ProductName, MAX(Date) FROM s GROUP BY ProductName",
+     ["ProductName", "f0_"]),
+])
+def test_unnamed_columns_named_like_bigquery(sales_store, sql_query, headers):
+    _, backend = sales_store
+    assert backend.run(sql_query, 1)[0] == headers
+
+
+def test_star_keeps_column_names(sales_store):
+    _, backend = sales_store
+    assert backend.run(f"SELECT * FROM `{MONTHLY_SALES.name}`", 1)[0] == [column.name for column in MONTHLY_SALES.columns]
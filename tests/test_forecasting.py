@@ -0,0 +1,52 @@
+import numpy as np
+
+import load_data
+from common.forecasting import SalesForecaster
+
+
+def _forecaster(backend):
+    return SalesForecaster(lambda: backend, path="")
+
+
+def _assert_same_model(model, expected):
+    assert model["products"] == expected["products"]
+    assert model["first_month"] == expected["first_month"]
+    np.testing.assert_array_equal(model["history"], expected["history"])
+
+
+def test_new_periods_are_appended(sales_store):
+    path, backend = sales_store
+    forecaster = _forecaster(backend)
+    forecaster.refresh()
+    load_data.load(path, "sales", periods=2)
+    model = forecaster.refresh()
+
+    assert forecaster.fits == {"full": 1, "incremental": 1}
+    _assert_same_model(model, _forecaster(backend).refresh())
+
+
+def test_new_products_trigger_full_fit(sales_store):
+    # A new product's history goes back before the last fitted month; appending would leave it NaN
+    path, backend = sales_store
+    forecaster = _forecaster(backend)
+    forecaster.refresh()
+    load_data.load(path, "sales", products=12, periods=1)
+    model = forecaster.refresh()
+
+    assert forecaster.fits == {"full": 2, "incremental": 0}
+    assert not np.isnan(model["history"]).any()
+    _assert_same_model(model, _forecaster(backend).refresh())
+
+
+def test_restated_history_triggers_full_fit(sales_store):
+    path, backend = sales_store
+    forecaster = _forecaster(backend)
+    model = forecaster.refresh()
+    restated = {**model, "history": model["history"].copy(), "version": "restated"}
+    restated["history"][0, 0] += 1
+    forecaster._model = restated
+    load_data.load(path, "sales", periods=1)
+    model = forecaster.refresh()
+
+    assert forecaster.fits == {"full": 2, "incremental": 0}
+    _assert_same_model(model, _forecaster(backend).refresh())
@@ -0,0 +1,46 @@
+import pytest
+
+from common.query_guard import QueryGuard
+from common.schema import MONTHLY_SALES
+from common.sql_parsing import parse_select, strip_comments
+
+TABLE = MONTHLY_SALES.name
+
+
+def guard():
+    return QueryGuard(backend_getter=None, max_rows=100, dry_run=False)
+
+
+@pytest.mark.parametrize("comment", ["-- latest first", "# latest first", "/* latest first */"])
+def test_comment_does_not_swallow_later_clauses(sales_store, comment):
+    _, backend = sales_store
+    sql = (f"SELECT Date, SalesRevenue FROM `{TABLE}` WHERE ProductId = 'P01' {comment}\n"
+           f"ORDER BY Date DESC LIMIT 3")
+    rewritten, _ = guard().rewrite(sql)
+    _, rows = backend.run(rewritten, None)
+    assert len(rows) == 3
+    assert rows[0][0] > rows[-1][0]
+
+
+def test_guard_clauses_survive_a_trailing_comment():
+    rewritten, _ = guard().rewrite(f"SELECT * FROM `{TABLE}` WHERE EXTRACT(YEAR FROM Date) = 2023 -- only 2023")
+    assert "--" not in rewritten
+    assert "Date BETWEEN '2023-01-01' AND '2023-12-31'" in rewritten
+    assert rewritten.endswith("LIMIT 100")
+
+
+def test_unparsed_query_gets_its_limit_after_a_comment():
+    rewritten, _ = guard().rewrite(f"SELECT a FROM `{TABLE}` x JOIN `{TABLE}` y USING (Date) -- join")
+    assert rewritten.endswith("LIMIT 100") and "--" not in rewritten
+
+
+def test_comment_markers_in_strings_and_names_are_kept():
+    sql = "SELECT '-- not a comment', \"#1\" FROM `p.d.t` /* gone */ WHERE x = '/* kept */'"
+    assert strip_comments(sql) == "SELECT '-- not a comment', \"#1\" FROM `p.d.t`   WHERE x = '/* kept */'"
+
+
+def test_parsed_clauses_have_no_comments():
+    query = parse_select(f"SELECT Date -- the month\nFROM `{TABLE}` # table\nWHERE ProductId = 'P01' /* one */ LIMIT 5")
+    assert query.items[0].expression == "Date"
+    assert query.where == "ProductId = 'P01'"
+    assert query.limit == 5
@@ -0,0 +1,43 @@
+import datetime
+
+from common.result_encoding import encode_rows
+
+MONTHS = [datetime.date(2023, month, 1) for month in range(1, 13)]
+
+
+def test_long_repeated_values_are_encoded():
+    rows = [(name, month, month.month) for name in ("Basic T-Shirt", "Wireless Headphones") for month in MONTHS]
+    text = encode_rows(["ProductName", "Date", "SalesRevenue"], rows, token_budget=10_000)
+
+    assert "ProductName codes: A=Basic T-Shirt, B=Wireless Headphones" in text
+    assert "\nA,2023-01-01,1\n" in text
+
+
+def test_identifier_columns_stay_verbatim():
+    rows = [(f"P0{i}", name, month, month.month) for i, name in enumerate(("Basic T-Shirt", "Wireless Headphones"), 1)
+            for month in MONTHS]
+    text = encode_rows(["ProductId", "ProductName", "Date", "SalesRevenue"], rows, token_budget=10_000)
+
+    assert "ProductId codes" not in text
+    assert "\nP01,A,2023-01-01,1\n" in text
+    assert "\nP02,B,2023-01-01,1\n" in text
+
+
+def test_identifier_values_stay_verbatim():
+    rows = [(sku, month) for sku in ("SKU-101", "SKU-102") for month in MONTHS]
+    text = encode_rows(["sku", "Date"], rows, token_budget=10_000)
+
+    assert "codes" not in text
+    assert "\nSKU-101,2023-01-01\n" in text
+
+
+def test_values_as_short_as_a_code_are_kept():
+    # "Mug" is one token, no longer than a code; the code for "Weighted Blanket" must not be "B" when "B" is a value
+    names = ("Mug", "B", "Weighted Blanket")
+    rows = [(name, month) for name in names for month in MONTHS]
+    text = encode_rows(["ProductName", "Date"], rows, token_budget=10_000)
+
+    assert "ProductName codes: A=Weighted Blanket" in text
+    assert "\nMug,2023-01-01\n" in text
+    assert "\nB,2023-01-01\n" in text
+    assert "\nA,2023-01-01\n" in text
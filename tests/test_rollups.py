@@ -0,0 +1,51 @@
+import load_data
+from common.rollups import CUBES, RollupStore
+from common.schema import MONTHLY_SALES
+
+SALES_CUBES = tuple(spec for spec in CUBES if spec.table is MONTHLY_SALES)
+
+
+def _cube_totals(store, name):
+    cube = store.cube(name)
+    return sum(measures[1] for measures in cube.values()), sum(measures[2] for measures in cube.values())
+
+
+def _table_totals(backend):
+    _, rows = backend.run(f"SELECT COUNT(SalesRevenue), SUM(SalesRevenue) FROM `{MONTHLY_SALES.name}`", 1)
+    return rows[0][0], rows[0][1]
+
+
+def test_refresh_appends_new_periods(sales_store, capsys):
+    path, backend = sales_store
+    store = RollupStore(lambda: backend, SALES_CUBES)
+    store.refresh()
+    load_data.load(path, "sales", periods=2)
+    store.refresh()
+
+    assert "appended" in capsys.readouterr().out
+    for spec in SALES_CUBES:
+        assert _cube_totals(store, spec.name) == _table_totals(backend)
+
+
+def test_refresh_rebuilds_when_earlier_rows_change(sales_store, capsys):
+    # New products bring their whole history along with the new period, so appending after the old max misses rows
+    path, backend = sales_store
+    store = RollupStore(lambda: backend, SALES_CUBES)
+    store.refresh()
+    load_data.load(path, "sales", products=12, periods=1)
+    store.refresh()
+
+    assert capsys.readouterr().out.splitlines()[-1].startswith("Rollups: rebuilt")
+    for spec in SALES_CUBES:
+        assert _cube_totals(store, spec.name) == _table_totals(backend)
+
+
+def test_refresh_failure_printed_once(tmp_path, capsys):
+    from common.backends import LocalBackend
+
+    backend = LocalBackend(data_dir=str(tmp_path))
+    store = RollupStore(lambda: backend, SALES_CUBES)
+    store.refresh()
+    store.refresh()
+
+    assert capsys.readouterr().out.count("could not refresh") == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from semantic_cache import SemanticCache
+
+
+def test_version_read_outside_lock():
+    locked = []
+    versions = iter([1, 1, 2])
+
+    def version_source():
+        locked.append(cache._lock.locked())
+        return next(versions)
+
+    cache = SemanticCache(version_source=version_source, version_check_interval=0)
+    cache.put("Total sales of Smartwatch in 2023", "42")
+    assert cache.get("Total sales of Smartwatch in 2023") == "42"
+    # The data changed: every answer is dropped
+    assert cache.get("Total sales of Smartwatch in 2023") is None
+    assert locked == [False, False, False]
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Smartwatch sales from 2021 to 2023", "Smartwatch sales in 2021 and 2023"),
+    ("Smartwatch sales in 2021 and 2023", "Smartwatch sales from 2021 to 2023"),
+    ("Smartwatch sales in 2023 compared to 2022", "Smartwatch sales in 2022 compared to 2023"),
+    ("Which products sold more in 2023 than in 2022?", "Which products sold more in 2022 than in 2023?"),
+    ("Coffee Maker revenue between 2021 and 2022", "Coffee Maker revenue in 2021 and 2022"),
+])
+def test_near_misses_not_answered(cached, asked):
+    cache = SemanticCache()
+    cache.put(cached, "cached answer")
+    assert cache.get(asked) is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What was the total revenue of Smartwatch in 2023?", "Smartwatch total sales 2023"),
+    ("Total revenue of Running Shoes per year", "Give me the total revenue per year of Running Shoes"),
+    ("Smartwatch sales from 2021 to 2023", "Smartwatch revenue from 2021 to 2023"),
+])
+def test_paraphrases_answered(cached, asked):
+    cache = SemanticCache()
+    cache.put(cached, "cached answer")
+    assert cache.get(asked) == "cached answer"
@@ -0,0 +1,61 @@
+import pytest
+
+from common.schema import MONTHLY_SALES, WEEKLY_PROMO_SALES
+from common.sql_templates import TemplateEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return TemplateEngine(enabled=True)
+
+
+@pytest.mark.parametrize("question, template, table, fragments", [
+    ("What was the total revenue of Smartwatch in 2023?", "total", MONTHLY_SALES,
+     ["ProductName = 'Smartwatch'", "EXTRACT(YEAR FROM Date) = 2023"]),
+    ("Smartwatch sales in Q4 2023", "total", MONTHLY_SALES,
+     ["ProductName = 'Smartwatch'", "Date BETWEEN '2023-10-01' AND '2023-12-31'"]),
+    ("how much did the Coffee Maker make in March 2022", "total", MONTHLY_SALES,
+     ["ProductName = 'Coffee Maker'", "Date BETWEEN '2022-03-01' AND '2022-03-31'"]),
+    ("Top 3 products by revenue in 2022", "top_products", MONTHLY_SALES,
+     ["EXTRACT(YEAR FROM Date) = 2022", "ORDER BY total_revenue DESC LIMIT 3"]),
+    ("Which product had the highest sales in 2022?", "top_products", MONTHLY_SALES, ["DESC LIMIT 1"]),
+    ("Which region sells the most FACE CREAM?", "top_geography", WEEKLY_PROMO_SALES,
+     ["promoted_group = 'FACE CREAM'", "GROUP BY retailer_banner_geography"]),
+    ("Does TPR increase FACE CREAM sales?", "tpr_vs_non_tpr", WEEKLY_PROMO_SALES,
+     ["promoted_group = 'FACE CREAM'", "GROUP BY is_tpr"]),
+])
+def test_matches(engine, question, template, table, fragments):
+    match = engine.match(question)
+    assert match is not None
+    assert (match.template.name, match.table) == (template, table)
+    for fragment in fragments:
+        assert fragment in match.sql
+
+
+@pytest.mark.parametrize("question", [
+    "Smartwatch sales in 2022 and 2023",                        # Two periods
+    "Compare Smartwatch and Coffee Maker revenue in 2023",      # Two products
+    "Why did Smartwatch sales drop in 2023?",                   # Not a template's shape
+    "Top 3 products by revenue in 2022 compared to 2021",
+    "What was the total revenue of Smartwatch in NORTH EAST?",  # Geography of another table
+    "What was the total revenue in 2023?",                      # No product
+])
+def test_does_not_match(engine, question):
+    assert engine.match(question) is None
+
+
+def test_sql_answers_on_local_backend(sales_store, engine):
+    _, backend = sales_store
+    match = engine.match("What was the total revenue of Smartwatch in 2023?")
+    headers, rows = backend.run(match.sql, None)
+    _, expected = backend.run(
+        f"SELECT SUM(SalesRevenue) FROM `{MONTHLY_SALES.name}` WHERE ProductName = 'Smartwatch' "
+        f"AND Date BETWEEN '2023-01-01' AND '2023-12-31'", None
+    )
+    assert headers == ["total_revenue"]
+    assert rows == expected and rows[0][0] is not None
+    assert match.template.answer(match.table, match.entities, headers, rows).startswith("The total revenue of Smartwatch in 2023 was")
+
+    match = engine.match("Top 3 products by revenue in 2022")
+    headers, rows = backend.run(match.sql, None)
+    assert len(rows) == 3 and [row[1] for row in rows] == sorted((row[1] for row in rows), reverse=True)